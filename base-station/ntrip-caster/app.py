@@ -2,191 +2,264 @@
 NTRIP Caster Application.
 
 This script initializes a GPS device, performs auto-calibration via PPP, and
-starts the `gnssserver` process to broadcast GNSS data as an NTRIP caster.
+runs an in-process NTRIP caster that broadcasts the receiver's RTCM3 stream.
 
 The application performs the following steps:
 1. Initializes a GPS reader to communicate with the GNSS device.
 2. Reads the base station configuration from `BS_Config.txt` and sends it to the device.
 3. Starts a `read_messages_thread` to log raw UBX data for PPP and send telemetry to InfluxDB.
-4. Starts a `ConfigServer` (Flask app) for dynamic remote configuration.
-5. Starts a `PPPProcessor` to automatically determine the fixed position.
-6. Constructs and executes a `gnssserver` command to start the NTRIP caster.
+4. Starts an `NTRIPCaster` that serves RTCM3 frames straight from the serial pipeline.
+5. Starts a `ConfigServer` (Flask app) for dynamic remote configuration.
+6. Starts a `PPPProcessor` to automatically determine the fixed position.
 """
 
 from queue import Queue
 from threading import Event, Thread
 from ppp_processor import PPPProcessor
-import subprocess
-import pty
+from ntrip_caster import NTRIPCaster
+from raw_logger import RawLogger
+import signal
+import time
 import sys
 import os
 
-from pyubx2 import UBXReader, protocol, RTCM3_PROTOCOL, UBX_PROTOCOL
-from pyubx2.ubxhelpers import gnss2str
-from influxdb_client_3 import Point
+from pyubx2 import RTCM3_PROTOCOL, UBX_PROTOCOL
 try:
     from common.ubx_config import UBXConfig
+    from common.config_compiler import compile_config_file
+    from common.message_profiles import apply_profile, apply_profile_when, profile_override
     from common.gps_reader import GPSReader
     from common.influx_client import InfluxWriter
     from common.config_server import ConfigServer
+    from common.nav_sat import SatelliteStats
+    from common.line_protocol import StationTelemetryEncoder
+    from common.serial_pipeline import SerialPipeline
+    from common.ubx_framer import UBXDispatcher
 except ImportError:
     sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
     from ubx_config import UBXConfig
+    from config_compiler import compile_config_file
+    from message_profiles import apply_profile, apply_profile_when, profile_override
     from gps_reader import GPSReader
     from influx_client import InfluxWriter
     from config_server import ConfigServer
+    from nav_sat import SatelliteStats
+    from line_protocol import StationTelemetryEncoder
+    from serial_pipeline import SerialPipeline
+    from ubx_framer import UBXDispatcher
 
-def read_messages_thread(ubx_config, rtcm_fd, latest_pos, ppp_done, stop_event):
+def read_messages_thread(pipeline, ubx_config, raw_logger, latest_pos, ppp_done, stop_event, gps=None):
     """
     Reads UBX messages from the GPS device.
     
-    This thread performs three main functions:
-    1. Forwards RTCM3 messages to the pty for the NTRIP caster.
-    2. Logs raw UBX messages to a file for the PPP Processor to use.
-    3. Sends telemetry data (satellite counts, position) to InfluxDB.
+    A `SerialPipeline` reader thread drains the serial port and frames raw
+    UBX and RTCM3 messages into bounded rings. RTCM3 frames are consumed by
+    the `NTRIPCaster`; this thread consumes the UBX frames and performs two
+    main functions:
+    1. Logs raw UBX messages to rotating segments (`RawLogger`) for the PPP
+       Processor to use.
+    2. Sends telemetry data (satellite counts, position, serial pipeline
+       counters) to InfluxDB.
+
+    Additional receivers run the same thread without a raw logger or
+    position queue and only report telemetry, tagged by serial number.
     """
     
     print(f"{'read_messages_thread':<20}: Starting...")
     
-    def get_repeated_field(parsed_data, field_name, index):
-        return getattr(parsed_data, f"{field_name}_{index+1:02d}")
+    ubx_frames = pipeline.ring(UBX_PROTOCOL)
+    serial_number = gps.serial_number if gps is not None else None
+    encoder = StationTelemetryEncoder(serial_number)
+    sat_stats = SatelliteStats("station_telemetry", {"serial": serial_number})
+    PIPELINE_STATS_INTERVAL = 10  # seconds
+    last_stats_time = time.time()
+
+    def on_nav_pvt(parsed_data):
+        # Use for debugging purposes
+        InfluxWriter.batch_write(encoder.nav_pvt(parsed_data))
+        if latest_pos is None:
+            return
+        # Pass latest position to PPP processor
+        if latest_pos.full():
+            latest_pos.get_nowait()
+        latest_pos.put((parsed_data.lat, parsed_data.lon, parsed_data.height))
+
+    def on_nav_sat(raw_data):
+        # Overall counts (SBAS excluded) plus one row per constellation,
+        # computed straight from the raw satellite blocks.
+        totals, rows = sat_stats.nav_sat(raw_data)
+        InfluxWriter.batch_write([encoder.sat_counts(*totals), *rows])
+
+    def on_nav_sig(raw_data):
+        # Only received when NAV-SIG output is enabled on the receiver.
+        InfluxWriter.batch_write(sat_stats.nav_sig(raw_data))
 
-    if os.path.exists("./shared/station.ubx"):
-        os.remove("./shared/station.ubx")
+    # Only messages with a handler are fully parsed. RXM-RAWX and RXM-SFRBX
+    # are only logged to file for the PPP processor and stay raw bytes.
+    dispatcher = UBXDispatcher()
+    dispatcher.register('ACK-ACK', ubx_config.set_ack)
+    dispatcher.register('ACK-NAK', ubx_config.set_nack)
+    dispatcher.register('CFG-VALGET', ubx_config.set_valget, raw=True)
+    dispatcher.register('NAV-PVT', on_nav_pvt)
+    dispatcher.register('NAV-SAT', on_nav_sat, raw=True)
+    dispatcher.register('NAV-SIG', on_nav_sig, raw=True)
 
-    ubr = UBXReader(ubx_config.ser)
     while not stop_event.is_set():
-        raw_data, parsed_data = ubr.read()
-        if raw_data:
-            if protocol(raw_data) == RTCM3_PROTOCOL:
-                os.write(rtcm_fd, raw_data)
-            if protocol(raw_data) == UBX_PROTOCOL:
-                # print(parsed_data.identity)
-                if not ppp_done.is_set():
-                    with open("./shared/station.ubx", "ab") as f:
-                        f.write(raw_data)
-                else:
-                    os.remove("./shared/station.ubx")
-                match parsed_data.identity:
-                    case 'ACK-ACK':
-                        ubx_config.set_ack()
-                    case 'ACK-NAK':
-                        ubx_config.set_nack()
-                    case 'RXM-RAWX':
-                        # Already logged to file
-                        pass
-                    case 'RXM-SFRBX':
-                        # Already logged to file
-                        pass
-                    case 'NAV-PVT':
-                        # Use for debugging purposes
-                        point = Point("station_telemetry").field("latitude", parsed_data.lat) \
-                                                          .field("longitude", parsed_data.lon) \
-                                                          .field("height", parsed_data.height)
-                        InfluxWriter.batch_write(point)
-                        # Pass latest position to PPP processor
-                        if latest_pos.full():
-                            latest_pos.get_nowait()
-                        latest_pos.put((parsed_data.lat, parsed_data.lon, parsed_data.height))
-                    case 'NAV-SAT':
-                        # Use for debugging purposes            
-                        num_sats = 0
-                        num_sats_visible = 0
-                        num_sats_code_locked = 0
-                        num_sats_carrier_locked = 0
-                        for i in range(parsed_data.numSvs):
-                            constellation = gnss2str(get_repeated_field(parsed_data, "gnssId", i))
-                            qualityInd = get_repeated_field(parsed_data, "qualityInd", i)
-                            if constellation != "SBAS":
-                                if qualityInd >= 5:
-                                    num_sats_carrier_locked += 1
-                                if qualityInd >= 4:
-                                    num_sats_code_locked += 1
-                                if qualityInd >= 2:
-                                    num_sats_visible += 1
-                            num_sats += 1
-                        point = Point("station_telemetry") \
-                            .field("num_sats_tracked", int(num_sats)) \
-                            .field("num_sats_visible", int(num_sats_visible)) \
-                            .field("num_sats_code_locked", int(num_sats_code_locked)) \
-                            .field("num_sats_carrier_locked", int(num_sats_carrier_locked))
-                        InfluxWriter.batch_write(point)
-                        # print(f"{'read_messages_thread':<20}:  Visible: {num_sats_visible}/{num_sats}, Code Locked: {num_sats_code_locked}/{num_sats_visible}, Carrier Locked: {num_sats_carrier_locked}/{num_sats_visible}")
+        if time.time() >= last_stats_time + PIPELINE_STATS_INTERVAL:
+            last_stats_time = time.time()
+            stats = pipeline.get_stats()
+            if raw_logger is not None:
+                stats.update(raw_logger.get_stats())
+            if gps is not None:
+                stats.update(gps.ser.get_stats())
+            InfluxWriter.batch_write(encoder.encode_dict(stats, int(last_stats_time*1e9)))
+        frame = ubx_frames.get(timeout=1)
+        if frame is None:
+            continue
+        raw_data = frame[1]
+        if raw_logger is None:
+            pass
+        elif not ppp_done.is_set():
+            raw_logger.write(raw_data)
+        elif not raw_logger.closed:
+            # The fixed position is final, the raw log is no longer needed
+            raw_logger.close(remove=True)
+        try:
+            dispatcher.dispatch(raw_data)
+        except Exception as e:
+            print(f"{'read_messages_thread':<20}: Ignoring unparsable frame: {e}")
     
     print(f"{'read_messages_thread':<20}: Stopping...")
 
+def configure_station(ubx_config, config_msg, ppp_done):
+    """
+    Sends the keys that differ from the receiver's current base station
+    configuration, then the output profile: raw observations while PPP
+    needs them, afterwards only what is reported. Also called when the
+    receiver comes back after being unplugged, with the fixed position or
+    survey-in that was last sent, if any.
+    """
+    success, msg = ubx_config.send_config(config_msg)
+    if success:
+        print(f"\n\nBase station configured successfully: {msg}\n\n")
+    else:
+        print(f"\n\nFailed to configure base station: {msg}\n\n")
+    restored = ubx_config.restore_station_mode()
+    if restored is not None and not restored[0]:
+        print(f"{'configure_station':<20}: Failed to restore the station mode: {restored[1]}")
+    apply_profile(ubx_config, profile_override() or ("operational" if ppp_done.is_set() else "survey"))
+
+def start_auxiliary_receiver(gps, ppp_done, stop_event):
+    """
+    Reads an additional receiver (e.g. a backup) on its own pipeline and
+    reports its telemetry. It keeps its own flash configuration and only
+    gets the output profile.
+    """
+    ubx_config = UBXConfig(gps.ser)
+    pipeline = SerialPipeline(gps.ser, stop_event, protocols=UBX_PROTOCOL)
+    pipeline.start()
+    Thread(
+        target=read_messages_thread,
+        args=(pipeline, ubx_config, None, None, ppp_done, stop_event, gps),
+        daemon=True
+    ).start()
+    configure = lambda: apply_profile(ubx_config, profile_override() or "operational")
+    configure()
+    def on_reconnect(device):
+        ubx_config.forget_values()
+        Thread(target=configure, daemon=True).start()
+    gps.ser.add_listener(on_reconnect)
+
+def raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
 def main():
     """
-    Initializes the GPS, gets the IP address, and starts the gnssserver.
+    Initializes the GPS, starts the NTRIP caster and the PPP calibration.
     """
     
     print("Starting Polaris NTRIP Caster...")
     
-    # Initialize GPS Reader and serial connection
-    gps = GPSReader()
-    fds = []
-    rtcm_fd, rtcm_slave_fd = pty.openpty()
-    rtcm_port = os.ttyname(rtcm_slave_fd)
-    print(f"Forwarding RTCM to: {rtcm_port}")
-    fds.append(rtcm_fd)
-    fds.append(rtcm_slave_fd)
+    # `docker stop` sends SIGTERM, shut down like on CTRL-C so buffered data is written
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+    
+    # Spool telemetry to disk while the Lighthouse is unreachable
+    InfluxWriter.enable_spool("./shared/influx_spool")
+
+    # Open every connected receiver. The first one is the reference station,
+    # any others, also those plugged in later, only report telemetry.
+    receivers = GPSReader.all()
+    gps = receivers[0]
     
     # Initialize UBX Config
     ubx_config = UBXConfig(gps.ser)
+    raw_logger = RawLogger("./shared/raw_ubx")
     latest_pos = Queue(maxsize=1)
     ppp_done = Event()
     stop_event = Event()
+    pipeline = SerialPipeline(gps.ser, stop_event, protocols=UBX_PROTOCOL | RTCM3_PROTOCOL)
+    pipeline.start()
     read_thread = Thread(
         target=read_messages_thread, 
-        args=(ubx_config, rtcm_fd, latest_pos, ppp_done, stop_event), 
+        args=(pipeline, ubx_config, raw_logger, latest_pos, ppp_done, stop_event, gps), 
         daemon=True
     )
     read_thread.start()
     
-    # Send base station configuration
-    config_msg = ubx_config.convert_u_center_config('BS_Config.txt')
-    success, msg = ubx_config.send_config(config_msg)
-    if success:
-        print("\n\nBase station configured successfully.\n\n")
-    else:
-        print(f"\n\nFailed to configure base station: {msg}\n\n")
+    # Serve RTCM3 straight from the serial pipeline. The lite mountpoint is
+    # meant for rovers on metered links.
+    caster = NTRIPCaster(
+        pipeline.ring(RTCM3_PROTOCOL), stop_event,
+        host="0.0.0.0", port=2101,
+        mountpoints={"pygnssutils": "full", "pygnssutils-lite": "MSM4-lite"},
+        user="polaris", password="none",
+    )
+    caster.start()
+    
+    # Configure the receiver, again whenever it is replugged
+    config_msg = compile_config_file('BS_Config.txt')
+    configure_station(ubx_config, config_msg, ppp_done)
+    if profile_override() is None:
+        apply_profile_when(ppp_done, ubx_config, "operational", stop_event)
+    # The station mode is left to the PPP processor after startup, so a replug
+    # does not reset it to the file's default or rewrite it in flash
+    reconnect_msg = config_msg.without("CFG_TMODE_")
+    def on_reconnect(device):
+        ubx_config.forget_values()
+        Thread(target=configure_station, args=(ubx_config, reconnect_msg, ppp_done), daemon=True).start()
+    gps.ser.add_listener(on_reconnect)
+    for receiver in receivers[1:]:
+        start_auxiliary_receiver(receiver, ppp_done, stop_event)
+    def on_new_receiver(receiver):
+        receivers.append(receiver)
+        Thread(target=start_auxiliary_receiver, args=(receiver, ppp_done, stop_event), daemon=True).start()
+    GPSReader.watch(on_new_receiver, receivers)
     
     # Start the config server thread
     ppp_stop_event = Event()
     ConfigServer(ubx_config, is_base_station=True, ppp_stop_event=ppp_stop_event).run()
     
     # Start PPP manager
-    PPPProcessor(ubx_config, latest_pos, ppp_done, ppp_stop_event).run()
-    
-    # Start the gnssserver NTRIP caster process
-    process = subprocess.Popen([
-        "gnssserver",
-        "--inport", rtcm_port,
-        "--timeout", "10",
-        "--hostip", "0.0.0.0",   # Bind to all interfaces
-        "--outport", "2101",
-        "--ntripmode", "1",      # NTRIP Caster mode
-        "--protfilter", "4",     
-        "--format", "2",         # Raw binary
-        "--ntripuser", "polaris",
-        "--ntrippassword", "none",
-        "--verbosity", "2",      # Verbose output
-    ])
+    ppp = PPPProcessor(ubx_config, latest_pos, ppp_done, ppp_stop_event, raw_logger)
+    ppp.start()
     
-    # Wait for the process to complete
+    # Wait for the caster to exit
     print("Base station running - press CTRL-C to terminate...")
     try:
-        process.wait()
+        while caster.is_alive():
+            caster.join(1)
     except KeyboardInterrupt:
-        print("\nStopping gnssserver...")
-        process.terminate()
+        print("\nStopping NTRIP caster...")
         stop_event.set()
         ppp_stop_event.set()
+        caster.join()
         read_thread.join()
+        ppp.join()
     finally:
-        for fd in fds:
-            os.close(fd)
-        gps.close_serial()
+        raw_logger.close()
+        InfluxWriter.close()
+        for receiver in receivers:
+            receiver.close_serial()
         
 if __name__ == "__main__":
     main()
@@ -0,0 +1,486 @@
+from base64 import b64encode
+from collections import deque
+from email.utils import formatdate
+import threading
+import asyncio
+import socket
+import time
+import sys
+import os
+
+from rtcm_scheduler import RTCMScheduler, rtcm_message_type
+try:
+    from common.influx_client import InfluxWriter
+    from common.line_protocol import LineProtocolEncoder
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+    from influx_client import InfluxWriter
+    from line_protocol import LineProtocolEncoder
+
+REQUEST_TIMEOUT = 10        # Seconds allowed for a client to send its request
+MAX_REQUEST_BYTES = 4096    # Larger request headers are rejected
+STATUS_INTERVAL = 60        # Seconds between per-client status lines
+METRICS_INTERVAL = 10       # Seconds between station_telemetry rows
+WRITE_BUFFER_HIGH = 8192    # Transport buffer level at which a client's sender waits
+SOCKET_SEND_BUFFER = 16384  # Kernel send buffer per client, keeps stale data out of the OS
+
+class NTRIPClient:
+    """
+    State, send queue and counters of a connected rover.
+
+    Frames are queued as shared memoryviews in a bounded deque. When the
+    queue is full the oldest frame is dropped, so a slow link only ever
+    loses whole frames and always receives the most recent corrections.
+    """
+
+    def __init__(self, writer, address, mountpoint, ntrip_version, max_queue_frames):
+        self.writer = writer
+        self.transport = writer.transport
+        self.host = address[0] if address else "unknown"
+        self.address = f"{address[0]}:{address[1]}" if address else "unknown"
+        self.mountpoint = mountpoint
+        self.ntrip_version = ntrip_version
+        self.queue = deque(maxlen=max_queue_frames)
+        self.ready = asyncio.Event()
+        self.encoder = LineProtocolEncoder("station_telemetry", {"mountpoint": mountpoint, "client": self.host})
+        self.connected_at = time.monotonic()
+        self.last_sent_received = self.connected_at
+        self.over_budget_since = None
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.dropped_frames = 0
+        self.stale_frames = 0
+        self.bytes_saved = 0        # Bytes the mountpoint's scheduler did not forward
+        self.max_queue_depth = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.last_bytes_sent = 0
+
+    def enqueue(self, received, view):
+        """
+        Queues a frame, dropping the oldest queued frame if the queue is full.
+
+        Args:
+            received (float): Monotonic time the frame left the serial port.
+            view (memoryview): The RTCM3 frame, shared by all clients.
+        """
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped_frames += 1
+        self.queue.append((received, view))
+        self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+        self.ready.set()
+
+    def latency(self, now) -> float:
+        """
+        Returns how far behind the client is. With frames waiting this is the
+        age of the newest data it has been sent, which keeps growing while
+        its socket is stalled even though its queue only holds fresh frames.
+        """
+        return now - self.last_sent_received if self.queue else self.last_latency
+
+    def send(self, received, view, latency):
+        """
+        Hands a frame to the socket. NTRIP v2 streams use HTTP chunked
+        transfer encoding, so the frame is framed by a chunk header and
+        trailer instead of being copied into a new buffer.
+
+        Args:
+            received (float): Monotonic time the frame left the serial port.
+            view (memoryview): The RTCM3 frame, shared by all clients.
+            latency (float): Seconds since the frame left the serial port.
+        """
+        if self.ntrip_version == 2:
+            self.transport.writelines((b"%x\r\n" % len(view), view, b"\r\n"))
+        else:
+            self.transport.write(view)
+        self.last_sent_received = received
+        self.frames_sent += 1
+        self.bytes_sent += len(view)
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    def get_stats(self) -> dict:
+        """
+        Returns the client counters.
+
+        Returns:
+            dict: Frames and bytes sent, bytes saved by the RTCM scheduler,
+                  dropped and stale frames, queue depth, hand-off latency
+                  (last, mean, max) and the number of bytes still buffered
+                  for the socket.
+        """
+        return {
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved": self.bytes_saved,
+            "dropped_frames": self.dropped_frames,
+            "stale_frames": self.stale_frames,
+            "queue_depth": len(self.queue),
+            "queue_max_depth": self.max_queue_depth,
+            "latency_last_s": self.last_latency,
+            "latency_mean_s": self.total_latency / self.frames_sent if self.frames_sent else 0.0,
+            "latency_max_s": self.max_latency,
+            "backlog_bytes": self.transport.get_write_buffer_size(),
+            "connected_s": time.monotonic() - self.connected_at,
+        }
+
+class Mountpoint:
+    """
+    A mountpoint, its RTCM scheduler profile and its connected clients.
+    """
+
+    def __init__(self, name, profile):
+        """
+        Args:
+            name (str): The mountpoint name, without the leading slash.
+            profile (str | dict): The `RTCMScheduler` profile.
+        """
+        self.name = name
+        self.scheduler = RTCMScheduler(profile)
+        self.clients = set()
+        self.encoder = LineProtocolEncoder("station_telemetry", {"mountpoint": name, "profile": self.scheduler.name})
+        self.closed_bytes_sent = 0      # Totals of clients that have since disconnected
+        self.closed_dropped_frames = 0
+        self.last_bytes_sent = 0
+        self.evicted_clients = 0
+
+class NTRIPCaster(threading.Thread):
+    """
+    In-process NTRIP v1/v2 caster serving the base station's RTCM3 stream.
+
+    Runs an asyncio event loop on its own thread. RTCM3 frames are taken
+    straight from the serial pipeline's ring and queued for every connected
+    rover as a single shared `memoryview`, without a pty hop or a second
+    RTCM parser. Each mountpoint applies its own `RTCMScheduler` profile,
+    which only looks at the 12-bit message number of each frame to decide
+    whether it is forwarded. Each client has its own bounded queue and
+    sender task, so a rover on a poor link only loses its own (oldest)
+    frames. Frames older than the latency budget are discarded instead of
+    sent, and clients that stay over the budget are disconnected.
+    Per-mountpoint and per-client metrics are written to InfluxDB as
+    "station_telemetry" rows.
+    """
+
+    def __init__(self, rtcm_frames, stop_event, host="0.0.0.0", port=2101, mountpoints=None,
+                 user="polaris", password="none", max_queue_frames=64, latency_budget=2.0, evict_after=10.0):
+        """
+        Args:
+            rtcm_frames (FrameRing): Ring of (receive time, raw RTCM3 frame) tuples.
+            stop_event (Event): Signals the caster to shut down.
+            host (str): Address to listen on.
+            port (int): TCP port to listen on.
+            mountpoints (dict): Mountpoint names mapped to `RTCMScheduler`
+                                profiles. Defaults to {"pygnssutils": "full"}.
+            user (str): NTRIP user name.
+            password (str): NTRIP password.
+            max_queue_frames (int): Capacity of each client's send queue.
+            latency_budget (float): Seconds after which a frame is too old to send.
+            evict_after (float): Seconds a client may stay over the latency
+                                 budget before it is disconnected.
+        """
+        self.rtcm_frames = rtcm_frames
+        self.stop_event = stop_event
+        self.host = host
+        self.port = port
+        self.mountpoints = {
+            name: Mountpoint(name, profile)
+            for name, profile in (mountpoints or {"pygnssutils": "full"}).items()
+        }
+        self.credentials = b64encode(f"{user}:{password}".encode()).decode()
+        self.max_queue_frames = max_queue_frames
+        self.latency_budget = latency_budget
+        self.evict_after = evict_after
+        self.clients = set()
+        self.handlers = set()
+        self.frames_received = 0
+        super().__init__(name="ntrip_caster", daemon=True)
+
+    def run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        """
+        Accepts clients and broadcasts RTCM3 frames until `stop_event` is set.
+        """
+        server = await asyncio.start_server(self._handle_client, self.host, self.port, limit=MAX_REQUEST_BYTES)
+        for mountpoint in self.mountpoints.values():
+            print(f"{'ntrip_caster':<20}: Serving /{mountpoint.name} ({mountpoint.scheduler.name}) on {self.host}:{self.port}")
+        pump = asyncio.create_task(self._pump())
+        last_status = last_metrics = time.monotonic()
+        while not self.stop_event.is_set() and not pump.done():
+            await asyncio.sleep(0.5)
+            now = time.monotonic()
+            self._evict_slow_clients(now)
+            if now >= last_metrics + METRICS_INTERVAL:
+                self._write_metrics(now - last_metrics)
+                last_metrics = now
+            if now >= last_status + STATUS_INTERVAL:
+                last_status = now
+                self._log_status()
+        pump.cancel()
+        server.close()
+        for client in list(self.clients):
+            client.transport.abort()
+        # Let the handlers see the closed connections and finish
+        if self.handlers:
+            await asyncio.wait(self.handlers, timeout=2)
+        await server.wait_closed()
+        print(f"{'ntrip_caster':<20}: Stopped.")
+
+    def _next_frames(self) -> list:
+        """
+        Blocks briefly for the next frame, then drains whatever else is queued.
+        Runs in the default executor so the event loop never blocks.
+        """
+        frame = self.rtcm_frames.get(timeout=0.5)
+        if frame is None:
+            return []
+        frames = [frame]
+        while (frame := self.rtcm_frames.get(timeout=0)) is not None:
+            frames.append(frame)
+        return frames
+
+    async def _pump(self):
+        """
+        Moves frames from the serial pipeline ring to the connected clients.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            for received, raw_data in await loop.run_in_executor(None, self._next_frames):
+                self.frames_received += 1
+                self._broadcast(received, raw_data)
+
+    def _broadcast(self, received, raw_data):
+        """
+        Queues one frame as a single shared memoryview for every client of
+        each mountpoint whose schedule lets it through.
+        """
+        msg_type = rtcm_message_type(raw_data)
+        view = memoryview(raw_data)
+        for mountpoint in self.mountpoints.values():
+            # Schedulers run without clients too, so their state stays current
+            if mountpoint.scheduler.accept(msg_type, received, raw_data):
+                for client in mountpoint.clients:
+                    client.enqueue(received, view)
+            else:
+                for client in mountpoint.clients:
+                    client.bytes_saved += len(view)
+
+    async def _send_loop(self, client):
+        """
+        Sends a client's queued frames, waiting for its socket to drain
+        between frames so data backs up in the bounded queue rather than in
+        an unbounded transport buffer.
+        """
+        client.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        sock = client.transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SEND_BUFFER)
+        try:
+            while True:
+                await client.ready.wait()
+                while client.queue:
+                    received, view = client.queue.popleft()
+                    latency = time.monotonic() - received
+                    if latency > self.latency_budget:
+                        # Stale corrections are worse than none
+                        client.stale_frames += 1
+                        continue
+                    client.send(received, view, latency)
+                    await client.writer.drain()
+                client.ready.clear()
+        except ConnectionError:
+            client.writer.close()
+
+    def _evict_slow_clients(self, now):
+        """
+        Disconnects clients that have been over the latency budget for longer
+        than `evict_after` seconds.
+        """
+        for client in list(self.clients):
+            if client.latency(now) <= self.latency_budget:
+                client.over_budget_since = None
+            elif client.over_budget_since is None:
+                client.over_budget_since = now
+            elif now - client.over_budget_since >= self.evict_after:
+                print(f"{'ntrip_caster':<20}: Evicting {client.address}, {client.latency(now):.1f} s behind "
+                      f"for {now - client.over_budget_since:.0f} s.")
+                self.mountpoints[client.mountpoint].evicted_clients += 1
+                self.clients.discard(client)
+                client.transport.abort()
+
+    def _write_metrics(self, elapsed):
+        """
+        Writes one station_telemetry row per client and one per mountpoint.
+        """
+        timestamp_ns = int(time.time()*1e9)
+        rows = []
+        for mountpoint in self.mountpoints.values():
+            bytes_sent = mountpoint.closed_bytes_sent
+            dropped_frames = mountpoint.closed_dropped_frames
+            for client in mountpoint.clients:
+                stats = client.get_stats()
+                stats["bytes_per_s"] = (client.bytes_sent - client.last_bytes_sent) / elapsed
+                client.last_bytes_sent = client.bytes_sent
+                del stats["connected_s"]
+                rows.append(client.encoder.encode_dict(stats, timestamp_ns))
+                bytes_sent += client.bytes_sent
+                dropped_frames += client.dropped_frames + client.stale_frames
+            rows.append(mountpoint.encoder.encode_dict({
+                **mountpoint.scheduler.get_stats(),
+                "num_clients": len(mountpoint.clients),
+                "frames_received": self.frames_received,
+                "bytes_per_s": (bytes_sent - mountpoint.last_bytes_sent) / elapsed,
+                "dropped_frames": dropped_frames,
+                "evicted_clients": mountpoint.evicted_clients,
+            }, timestamp_ns))
+            mountpoint.last_bytes_sent = bytes_sent
+        InfluxWriter.batch_write(rows)
+
+    def _log_status(self):
+        for client in self.clients:
+            stats = client.get_stats()
+            saved = stats['bytes_saved'] / (stats['bytes_saved'] + stats['bytes_sent']) if stats['bytes_sent'] else 0.0
+            print(f"{'ntrip_caster':<20}: {client.address} /{client.mountpoint} sent {stats['frames_sent']} frames / "
+                  f"{stats['bytes_sent']} bytes ({saved:.0%} saved by schedule), "
+                  f"latency {stats['latency_mean_s']*1000:.1f} ms mean / {stats['latency_max_s']*1000:.1f} ms max, "
+                  f"queue {stats['queue_depth']}, dropped {stats['dropped_frames']} + {stats['stale_frames']} stale, "
+                  f"backlog {stats['backlog_bytes']} bytes")
+
+    async def _handle_client(self, reader, writer):
+        """
+        Answers a single NTRIP request and, for an authorized stream request,
+        keeps the connection registered until the rover disconnects.
+        """
+        address = writer.get_extra_info("peername")
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        task.add_done_callback(self.handlers.discard)
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        lines = request.decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ")
+        headers = {}
+        for line in lines[1:]:
+            key, sep, value = line.partition(":")
+            if sep:
+                headers[key.strip().lower()] = value.strip()
+        ntrip_version = 2 if "ntrip/2" in headers.get("ntrip-version", "").lower() else 1
+        path = parts[1] if len(parts) > 1 and parts[0] == "GET" else None
+
+        mountpoint = self.mountpoints.get(path[1:]) if path else None
+        if path is None:
+            writer.write(self._response(ntrip_version, "400 Bad Request"))
+        elif mountpoint is None and (path in ("", "/") or ntrip_version == 1):
+            writer.write(self._sourcetable(ntrip_version))
+        elif mountpoint is None:
+            writer.write(self._response(ntrip_version, "404 Not Found"))
+        elif headers.get("authorization", "") != f"Basic {self.credentials}":
+            writer.write(self._response(ntrip_version, "401 Unauthorized",
+                                        f'WWW-Authenticate: Basic realm="{path}"\r\n'))
+        else:
+            await self._stream(reader, writer, address, mountpoint, ntrip_version)
+            return
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _stream(self, reader, writer, address, mountpoint, ntrip_version):
+        """
+        Registers the client for the mountpoint's RTCM3 stream and discards
+        anything it sends (e.g. GGA sentences) until it disconnects.
+        """
+        if ntrip_version == 2:
+            writer.write(self._response(2, "200 OK", "Content-Type: gnss/data\r\nTransfer-Encoding: chunked\r\n"))
+        else:
+            writer.write(b"ICY 200 OK\r\n\r\n")
+        client = NTRIPClient(writer, address, mountpoint.name, ntrip_version, self.max_queue_frames)
+        # Station position and biases describe the station rather than an
+        # epoch, so they are re-stamped to pass the staleness check.
+        for _, raw_data in mountpoint.scheduler.initial_frames():
+            client.enqueue(time.monotonic(), memoryview(raw_data))
+        sender = asyncio.create_task(self._send_loop(client))
+        self.clients.add(client)
+        mountpoint.clients.add(client)
+        print(f"{'ntrip_caster':<20}: {client.address} connected to /{mountpoint.name} (NTRIP v{ntrip_version}), "
+              f"{len(self.clients)} clients.")
+        try:
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            mountpoint.clients.discard(client)
+            sender.cancel()
+            writer.close()
+            mountpoint.closed_bytes_sent += client.bytes_sent
+            mountpoint.closed_dropped_frames += client.dropped_frames + client.stale_frames
+            stats = client.get_stats()
+            print(f"{'ntrip_caster':<20}: {client.address} disconnected after {stats['connected_s']:.0f} s, "
+                  f"{stats['frames_sent']} frames sent, {len(self.clients)} clients.")
+
+    def _response(self, ntrip_version, status, extra_headers="") -> bytes:
+        """
+        Formats a response header for the client's NTRIP version.
+        """
+        if ntrip_version == 2:
+            return (
+                f"HTTP/1.1 {status}\r\n"
+                "Ntrip-Version: Ntrip/2.0\r\n"
+                "Server: Polaris_NTRIP_Caster\r\n"
+                f"Date: {formatdate(usegmt=True)}\r\n"
+                "Cache-Control: no-store, no-cache, max-age=0\r\n"
+                "Connection: close\r\n"
+                f"{extra_headers}\r\n"
+            ).encode()
+        return f"HTTP/1.0 {status}\r\n{extra_headers}Connection: close\r\n\r\n".encode()
+
+    def _sourcetable(self, ntrip_version) -> bytes:
+        """
+        Formats the sourcetable listing every mountpoint.
+        """
+        sourcetable = "".join(
+            f"STR;{name};{name.upper()};RTCM 3.3;;2;GPS+GLO+GAL+BDS;POLARIS;USA;0.00;0.00;0;0;"
+            f"Polaris;none;B;N;0;\r\n"
+            for name in self.mountpoints
+        ) + "ENDSOURCETABLE\r\n"
+        if ntrip_version == 2:
+            header = self._response(2, "200 OK", f"Content-Type: gnss/sourcetable\r\nContent-Length: {len(sourcetable)}\r\n")
+        else:
+            header = (
+                "SOURCETABLE 200 OK\r\n"
+                "Server: Polaris_NTRIP_Caster\r\n"
+                "Content-Type: text/plain\r\n"
+                f"Content-Length: {len(sourcetable)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode()
+        return header + sourcetable.encode()
+
+    def get_stats(self) -> dict:
+        """
+        Returns the caster and per-client counters.
+
+        Returns:
+            dict: Frames received from the pipeline, the number of clients,
+                  per-mountpoint scheduler counters and evicted clients, and
+                  a dict of client stats keyed by client address.
+        """
+        clients = list(self.clients)
+        return {
+            "frames_received": self.frames_received,
+            "num_clients": len(clients),
+            "mountpoints": {
+                name: {**mountpoint.scheduler.get_stats(), "evicted_clients": mountpoint.evicted_clients}
+                for name, mountpoint in self.mountpoints.items()
+            },
+            "clients": {client.address: client.get_stats() for client in clients},
+        }
@@ -0,0 +1,211 @@
+"""
+Reading and summarizing RTKLIB .pos solution files.
+
+`read_pos()` parses an `rnx2rtkp` output file in chunks of lines into NumPy
+arrays, one value per epoch, so that a multi-day 1 Hz static solution is
+read without holding its text in memory. `summarize()` then reduces the
+epochs to the values used for the calibration: when the filter converged,
+a robust position estimate over the converged epochs and its 3D sigma.
+"""
+
+import numpy as np
+
+CHUNK_BYTES = 4 * 1024 * 1024
+EARTH_RADIUS = 6378137.0        # m, WGS84 semi-major axis
+
+# rnx2rtkp's Q flag, best first: fix, PPP, float, DGPS, SBAS, single
+Q_RANK = {1: 0, 6: 1, 2: 2, 4: 3, 3: 4, 5: 5}
+Q_SINGLE = 5
+
+CONVERGED_SIGMA = 0.10          # m, 3D sigma the filter has to stay below
+UNCONVERGED_TAIL = 0.25         # Share of the last epochs used if it never did
+OUTLIER_MADS = 3.0              # Tail epochs further from the median are ignored
+SIGMA_FLOOR = 1e-4              # m, for the weights of epochs printed with a zero sigma
+
+COLUMNS = ("latitude", "longitude", "height", "q", "ns", "sdn", "sde", "sdu")
+
+class PosSolution:
+    """
+    The epochs of a .pos file as arrays of equal length.
+
+    Attributes:
+        epoch (ndarray): datetime64[ms], in the file's time system (GPST by default).
+        latitude, longitude (ndarray): Degrees.
+        height (ndarray): m, ellipsoidal unless the file says otherwise.
+        q, ns (ndarray): Quality flag and number of satellites.
+        sdn, sde, sdu (ndarray): m, standard deviations north, east and up.
+        malformed (int): Lines that were neither a header nor a solution.
+    """
+
+    def __init__(self, epoch, columns, malformed=0):
+        self.epoch = epoch
+        for name, values in zip(COLUMNS, columns):
+            setattr(self, name, values)
+        self.malformed = malformed
+
+    def __len__(self):
+        return len(self.epoch)
+
+    @property
+    def sigma3d(self) -> np.ndarray:
+        return np.sqrt(self.sdn**2 + self.sde**2 + self.sdu**2)
+
+def _degrees(tokens) -> np.ndarray:
+    """
+    Converts "deg min sec" columns to signed degrees. The sign is taken
+    from the degree string so that e.g. "-0 12 34.5" stays negative.
+    """
+    negative = np.char.startswith(tokens[:, 0], "-")
+    values = np.abs(tokens[:, 0].astype(float)) + tokens[:, 1].astype(float) / 60 + tokens[:, 2].astype(float) / 3600
+    return np.where(negative, -values, values)
+
+def _parse_lines(lines):
+    """
+    Parses solution lines written with degrees (15 columns) or with
+    degrees, minutes and seconds (`-g`, 19 columns).
+
+    Returns:
+        tuple: The epochs, the columns of `COLUMNS` and the number of
+               lines that matched neither layout.
+    """
+    rows = [line.split() for line in lines if line[:1] != "%" and line.strip()]
+    epochs, columns = [], [[] for _ in COLUMNS]
+    for width, angles in ((15, 1), (19, 3)):
+        tokens = np.array([row for row in rows if len(row) == width], dtype=str).reshape(-1, width)
+        if not len(tokens):
+            continue
+        lat_end = 2 + angles
+        lon_end = lat_end + angles
+        epochs.append(np.char.add(np.char.add(np.char.replace(tokens[:, 0], "/", "-"), "T"), tokens[:, 1]).astype("datetime64[ms]"))
+        if angles == 1:
+            columns[0].append(tokens[:, 2].astype(float))
+            columns[1].append(tokens[:, 3].astype(float))
+        else:
+            columns[0].append(_degrees(tokens[:, 2:lat_end]))
+            columns[1].append(_degrees(tokens[:, lat_end:lon_end]))
+        numbers = tokens[:, lon_end:lon_end + 6].astype(float)
+        columns[2].append(numbers[:, 0])
+        columns[3].append(numbers[:, 1].astype(np.int8))
+        columns[4].append(numbers[:, 2].astype(np.int16))
+        for i in range(3):
+            columns[5 + i].append(numbers[:, 3 + i])
+    return epochs, columns, sum(1 for row in rows if len(row) not in (15, 19))
+
+def read_pos(path, chunk_bytes=CHUNK_BYTES) -> PosSolution:
+    """
+    Reads an `rnx2rtkp` solution file in LLH format.
+
+    Args:
+        path (str): The .pos file.
+        chunk_bytes (int): Approximate size of the text parsed at once.
+
+    Returns:
+        PosSolution: The epochs in file order.
+    """
+    epochs, columns = [], [[] for _ in COLUMNS]
+    malformed = 0
+    with open(path, "r") as f:
+        while lines := f.readlines(chunk_bytes):
+            chunk_epochs, chunk_columns, chunk_malformed = _parse_lines(lines)
+            epochs += chunk_epochs
+            for column, chunk_column in zip(columns, chunk_columns):
+                column += chunk_column
+            malformed += chunk_malformed
+    dtypes = (float, float, float, np.int8, np.int16, float, float, float)
+    return PosSolution(
+        np.concatenate(epochs) if epochs else np.array([], dtype="datetime64[ms]"),
+        [np.concatenate(column) if column else np.array([], dtype=dtype) for column, dtype in zip(columns, dtypes)],
+        malformed
+    )
+
+def _weighted_mean(values, sigmas) -> float:
+    """
+    Inverse variance weighted mean of the values within `OUTLIER_MADS`
+    median absolute deviations of their median.
+    """
+    median = np.median(values)
+    mad = 1.4826 * np.median(np.abs(values - median))
+    keep = np.abs(values - median) <= OUTLIER_MADS * mad if mad > 0 else np.ones(len(values), dtype=bool)
+    weights = 1.0 / sigmas[keep]**2
+    return float(np.sum(values[keep] * weights) / np.sum(weights))
+
+def summarize(solution) -> dict | None:
+    """
+    Reduces a solution to one position.
+
+    The filter counts as converged from the first epoch after which its 3D
+    sigma stays below `CONVERGED_SIGMA`. The position is the inverse
+    variance weighted mean of the converged epochs without outliers, or of
+    the last `UNCONVERGED_TAIL` of the epochs if the filter did not
+    converge. Single point epochs are ignored unless there is nothing else.
+
+    The sigma of the estimate is the larger of the filter's 3D sigma at the
+    last epoch and the 3D RMS scatter of the tail around the estimate; the
+    epochs of a Kalman filter are correlated, so averaging them does not
+    shrink the error.
+
+    Returns:
+        dict: "latitude", "longitude", "height", "sd" (3D sigma, m),
+              "sdn"/"sde"/"sdu" of the last epoch, "q" (the best flag in the
+              tail), "ns", "epochs", "converged", "convergence_seconds"
+              (None if not converged) and "tail_epochs", or None if the
+              file holds no solution.
+    """
+    if not len(solution):
+        return None
+    usable = solution.q != Q_SINGLE
+    if not usable.any():
+        usable[:] = True
+    index = np.flatnonzero(usable)
+    sigma3d = solution.sigma3d[index]
+
+    above = np.flatnonzero(sigma3d >= CONVERGED_SIGMA)
+    converged = not len(above) or above[-1] < len(index) - 1
+    if converged:
+        start = above[-1] + 1 if len(above) else 0
+        convergence_seconds = float((solution.epoch[index[start]] - solution.epoch[0]) / np.timedelta64(1, "s"))
+    else:
+        start = min(int(len(index) * (1 - UNCONVERGED_TAIL)), len(index) - 1)
+        convergence_seconds = None
+    tail = index[start:]
+
+    sdn, sde, sdu = (np.maximum(sigma[tail], SIGMA_FLOOR) for sigma in (solution.sdn, solution.sde, solution.sdu))
+    # Only the ratios of the weights matter, so the sigmas need no conversion to degrees
+    latitude = _weighted_mean(solution.latitude[tail], sdn)
+    longitude = _weighted_mean(solution.longitude[tail], sde)
+    height = _weighted_mean(solution.height[tail], sdu)
+
+    cos_lat = np.cos(np.radians(latitude))
+    north = np.radians(solution.latitude[tail] - latitude) * EARTH_RADIUS
+    east = np.radians(solution.longitude[tail] - longitude) * EARTH_RADIUS * cos_lat
+    up = solution.height[tail] - height
+    scatter = float(np.sqrt(np.mean(north**2 + east**2 + up**2)))
+    last = tail[-1]
+    q_values = np.unique(solution.q[tail])
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "height": height,
+        "sd": max(float(solution.sigma3d[last]), scatter),
+        "sdn": float(solution.sdn[last]),
+        "sde": float(solution.sde[last]),
+        "sdu": float(solution.sdu[last]),
+        "q": int(min(q_values, key=lambda q: Q_RANK.get(int(q), len(Q_RANK)))),
+        "ns": int(solution.ns[last]),
+        "epochs": len(solution),
+        "converged": bool(converged),
+        "convergence_seconds": convergence_seconds,
+        "tail_epochs": len(tail),
+    }
+
+if __name__ == "__main__":
+    """
+    Prints the summary of a .pos file.
+    """
+    import sys
+    import time
+
+    start = time.perf_counter()
+    solution = read_pos(sys.argv[1])
+    print(f"Read {len(solution)} epochs ({solution.malformed} malformed lines) in {time.perf_counter() - start:.2f} s")
+    print(summarize(solution))
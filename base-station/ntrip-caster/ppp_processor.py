@@ -1,17 +1,30 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from geopy.distance import geodesic
-from ftplib import FTP
-from tqdm import tqdm
+from product_cache import ProductCache, ProductPrefetcher
+from ppp_scheduler import DONE, PPPScheduler
+from ppp_strategies import StrategyRunner
+from rinex_segments import SegmentConverter
 import subprocess
 import shutil
 import json
-import gzip
+import math
 import time
+import sys
 import os
-import re
 
 import threading
 
+try:
+    from common.influx_client import InfluxWriter
+    from common.line_protocol import LineProtocolEncoder
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+    from influx_client import InfluxWriter
+    from line_protocol import LineProtocolEncoder
+
+POLL_INTERVAL = 30      # Seconds between scheduler polls
+STATS_INTERVAL = 60     # Seconds between scheduler telemetry rows
+
 class PPPProcessor(threading.Thread):
     """
     Background thread that manages the Precise Point Positioning (PPP) process
@@ -20,29 +33,42 @@ class PPPProcessor(threading.Thread):
     It performs the following steps:
     1. Checks for an existing valid calibration.
     2. If no valid calibration exists, starts a survey-in process.
-    3. Periodically takes snapshots of raw UBX data.
-    4. Downloads precise orbital and clock products from the internet.
-    5. Runs RTKLIB's `rnx2rtkp` to calculate a PPP solution.
-    6. Updates the Base Station's fixed position if accuracy improves.
+    3. Solves whenever the `PPPScheduler` decides that enough new
+       observations or better precise products arrived, converting the raw
+       UBX log segments closed since the last run to RINEX and merging them
+       with the ones converted before.
+    4. Gets precise orbital and clock products from the product cache,
+       which a background prefetcher fills ahead of each run.
+    5. Runs RTKLIB's `rnx2rtkp` with several solver configurations in
+       parallel and keeps the most accurate PPP solution.
+    6. Updates the Base Station's fixed position if the 3D sigma of the
+       converged solution improves, and reports every solution to InfluxDB.
     """
     
-    def __init__(self, ubx_config, latest_pos, ppp_done, stop_event):
+    def __init__(self, ubx_config, latest_pos, ppp_done, stop_event, raw_logger):
         self.ubx_config = ubx_config
+        self.raw_logger = raw_logger
         self.latest_pos = latest_pos
         self.ppp_done = ppp_done
         self.stop_event = stop_event
         self.rtklib_path = "./RTKLIB/bin"
-        self.start_time = datetime.now()
-        self.intervals = [
-            5, 15*60, 30*60, 60*60, 2*3600, 4*3600, 6*3600,
-            12*3600, 24*3600, 48*3600, 96*3600, 192*3600, 384*3600
-        ]
-        super().__init__()
+        # Sources from PPP_PRODUCT_SOURCES, or the local directory PPP_PRODUCTS_MIRROR to run offline
+        self.products = ProductCache("./shared/products")
+        self.prefetcher = ProductPrefetcher(self.products, stop_event)
+        self.obs_datetime = None
+        self.rinex = SegmentConverter(self.rtklib_path, "./shared/rinex")
+        self.strategies = StrategyRunner(self.rtklib_path)
+        self.scheduler = PPPScheduler(raw_logger, self.products)
+        self.prev_sd = float('inf')
+        self.encoder = LineProtocolEncoder("ppp_solution")
+        self.stats_encoder = LineProtocolEncoder("ppp_scheduler")
+        super().__init__(name="ppp_processor")
         
     def run(self):
         
+        self.prefetcher.start()
+
         # Check for existing calibration
-        prev_sd = float('inf')
         if os.path.exists("./shared/calibration.json"):
             print("PPP Processor: Found existing calibration file.")
             with open("./shared/calibration.json", "rb") as f:
@@ -51,9 +77,13 @@ class PPPProcessor(threading.Thread):
             cal_lon = calibration_data.get("longitude", 0.0)
             cal_height = calibration_data.get("height", 0.0)
             cal_sd = calibration_data.get("sd", float('inf'))
+            if "converged" not in calibration_data:
+                # Written before the 3D sigma: "sd" is the mean of the north, east and up
+                # sigmas. Their RSS is at least sqrt(3) times that mean.
+                cal_sd *= math.sqrt(3)
             
             # Check if accuracy is within 3 meters after waiting for NAV-PVT
-            time.sleep(5)
+            self.stop_event.wait(5)
             navpvt_lat, navpvt_lon, navpvt_height = self.latest_pos.get()
             horizontal_error = geodesic((cal_lat, cal_lon), (navpvt_lat, navpvt_lon)).meters
             vertical_error = abs(cal_height - navpvt_height)
@@ -61,7 +91,7 @@ class PPPProcessor(threading.Thread):
             # Use previous calibration if still valid
             if horizontal_error <= 2.0 and vertical_error <= 2.0:
                 self.ubx_config.send_fixed(cal_lat, cal_lon, cal_height)
-                prev_sd = cal_sd
+                self.prev_sd = cal_sd
                 print(f"PPP Processor: Sent Fixed Position from Calibration: {cal_lat}, {cal_lon}, {cal_height}")
             else: 
                 print("PPP Processor: Calibration position is no longer valid due to movement.")
@@ -70,68 +100,139 @@ class PPPProcessor(threading.Thread):
             print("PPP Processor: No calibration file found. Starting survey-in.")
             self.ubx_config.send_survey()
             
+        self.prefetcher.schedule(self.scheduler.next_solve_time())
+        last_stats_time = 0.0
+        while not self.stop_event.is_set():
+            decision = self.scheduler.poll()
+            if time.time() >= last_stats_time + STATS_INTERVAL or decision is not None:
+                last_stats_time = time.time()
+                InfluxWriter.batch_write(self.stats_encoder.encode_dict(self.get_stats(), int(last_stats_time*1e9)))
+            if decision == DONE:
+                break
+            if decision is None:
+                self.stop_event.wait(POLL_INTERVAL)
+                continue
+            try:
+                solution, solution_type = self.solve()
+            except Exception as e:
+                # A failed solve must not end the calibration, the next one may succeed
+                print(f"PPP Processor: Solve failed: {e!r}")
+                solution, solution_type = None, None
+            self.scheduler.record(solution, solution_type, self.obs_datetime)
+            self.prefetcher.schedule(self.scheduler.next_solve_time(), self.obs_datetime)
+        self.rinex.clear()
+        self.ppp_done.set()
+
+    def solve(self) -> tuple[dict | None, str | None]:
+        """
+        Converts the new raw log data, solves it and updates the fixed
+        position if the solution is more accurate than the current one.
+
+        Returns:
+            dict: The best solution's summary (see `pos_solution.summarize()`), or None.
+            str: The solution type of the products used, or None.
+        """
         ubx_file = "./temp/station_snapshot.ubx"
         obs_file = "./temp/station_snapshot.obs"
         nav_file = "./temp/station_snapshot.nav"
-        output_file = "./temp/ppp.pos"
-        
-        for interval in self.intervals:
-            try:
-                # Wait for the specified interval
-                print(f"PPP Processor: Waiting for {interval/60:.1f} minutes before next PPP run...")
-                target = self.start_time + timedelta(seconds=interval)
-                while datetime.now() < target and not self.stop_event.is_set():
-                    time.sleep(1)
-                if self.stop_event.is_set():
-                    break
-                 
-                # Take snapshot of UBX data and run PPP   
-                print("PPP Processor: Taking UBX snapshot and running PPP...")
-                os.mkdirs("./temp", exist_ok=True)
-                shutil.copyfile("./shared/station.ubx", ubx_file)
-                self.convert_ubx_to_rinex(ubx_file, obs_file, nav_file)
-                obs_datetime = self.parse_observation_start_time(obs_file)
-                sp3_file, clk_file, solution_type = self.download_precise_products(obs_datetime)
-                self.run_rnx2rtkp_ppp(obs_file, nav_file,sp3_file, clk_file, output_file)
-                
-                # Parse PPP result
-                print("PPP Processor: Parsing PPP result...")
-                if not os.path.exists(output_file):
-                    print("PPP Processor: PPP output file not found. Skipping this iteration.")
-                    continue
-                with open(output_file, 'r') as f:
-                    solution = f.readlines()[-1]
-                parts = solution.split()
-                if len(parts) < 19:
-                    continue
-                lat = int(parts[2]) + int(parts[3])/60 + float(parts[4])/3600
-                if int(parts[5]) >=0:
-                    lon = int(parts[5]) + int(parts[6])/60 + float(parts[7])/3600
-                else:
-                    lon = int(parts[5]) - int(parts[6])/60 - float(parts[7])/3600
-                height = float(parts[8])
-                sd = (float(parts[12]) + float(parts[13]) + float(parts[14])) / 3.0
-                
-                # Only update if accuracy improved
-                if sd < prev_sd:
-                    print(f"PPP Processor: Accuracy improved from {prev_sd:.2f} m to {sd:.2f} m. Updating fixed position.")
-                    prev_sd = sd
-                    self.ubx_config.send_fixed(lat, lon, height)
-                    with open("./shared/calibration.json", "w") as f:
-                        calibration_data = {
-                            "latitude": lat,
-                            "longitude": lon,
-                            "height": height,
-                            "sd": sd
-                        }
-                        json.dump(calibration_data, f)
-                    print(f"PPP Processor: Updated Fixed Position: {lat}, {lon}, {height} (SD: {sd:.2f} m) using {solution_type} products")
-                else:
-                    print(f"PPP Processor: Accuracy did not improve (current SD: {sd:.2f} m). Keeping previous fixed position.")
-            finally:
-                shutil.rmtree("./temp")
-        self.ppp_done.set()
+        try:
+            print("PPP Processor: Converting raw log and running PPP...")
+            os.makedirs("./temp", exist_ok=True)
+            obs_datetime = self.assemble_rinex(ubx_file, obs_file, nav_file)
+            if obs_datetime is None:
+                print("PPP Processor: No observations in the snapshot. Skipping this solve.")
+                return None, None
+            self.obs_datetime = obs_datetime
+            sp3_file, clk_file, solution_type = self.download_precise_products(obs_datetime)
+            if sp3_file is None:
+                print("PPP Processor: No precise products available. Skipping this solve.")
+                return None, None
+            observation_seconds = (datetime.now() - obs_datetime).total_seconds()
+            best = self.run_rnx2rtkp_ppp(obs_file, nav_file, sp3_file, clk_file, "./temp", observation_seconds)
+            if best is None:
+                print("PPP Processor: No strategy produced a PPP solution. Skipping this solve.")
+                return None, solution_type
+            solution = best["solution"]
+            lat, lon, height, sd = solution["latitude"], solution["longitude"], solution["height"], solution["sd"]
+            convergence = f"converged after {solution['convergence_seconds']/60:.1f} min" if solution["converged"] else "not converged"
+            print(f"PPP Processor: {best['strategy']} solution over {solution['epochs']} epochs, {convergence}, 3D SD {sd:.3f} m")
+            InfluxWriter.batch_write(self.encoder.encode_dict({
+                **solution,
+                "improved": sd < self.prev_sd,
+                "strategy": best["strategy"],
+                "products": solution_type,
+            }))
+
+            # Only update if accuracy improved
+            if sd < self.prev_sd:
+                print(f"PPP Processor: Accuracy improved from {self.prev_sd:.2f} m to {sd:.2f} m. Updating fixed position.")
+                self.prev_sd = sd
+                self.ubx_config.send_fixed(lat, lon, height)
+                with open("./shared/calibration.json", "w") as f:
+                    calibration_data = {
+                        "latitude": lat,
+                        "longitude": lon,
+                        "height": height,
+                        "sd": sd,
+                        "sdn": solution["sdn"],
+                        "sde": solution["sde"],
+                        "sdu": solution["sdu"],
+                        "converged": solution["converged"],
+                        "convergence_seconds": solution["convergence_seconds"],
+                        "epochs": solution["epochs"],
+                        "strategy": best["strategy"],
+                        "products": solution_type
+                    }
+                    json.dump(calibration_data, f)
+                print(f"PPP Processor: Updated Fixed Position: {lat}, {lon}, {height} (SD: {sd:.2f} m) using {solution_type} products and the {best['strategy']} strategy")
+            else:
+                print(f"PPP Processor: Accuracy did not improve (current SD: {sd:.2f} m). Keeping previous fixed position.")
+            return solution, solution_type
+        finally:
+            shutil.rmtree("./temp", ignore_errors=True)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the scheduler's state and decisions with the counters of the
+        product cache, the RINEX conversion and the solver strategies.
+        """
+        stats = self.scheduler.get_stats()
+        stats.update(self.products.get_stats())
+        stats.update(self.strategies.get_stats())
+        stats["ppp_rinex_conversions"] = self.rinex.conversions
+        return stats
             
+    def assemble_rinex(self, ubx_file, obs_file, nav_file):
+        """
+        Writes the RINEX files of the raw log, converting only the segments
+        closed since the last run. Falls back to converting a snapshot of
+        the whole log if the cached segments cannot be merged.
+
+        Returns:
+            datetime: The time of the first observation, or None.
+        """
+        segments = self.raw_logger.snapshot()
+        try:
+            return self.rinex.assemble(segments, obs_file, nav_file)
+        except ValueError as e:
+            print(f"PPP Processor: {e}. Converting the whole raw log instead.")
+        self.snapshot_raw_log(ubx_file)
+        self.convert_ubx_to_rinex(ubx_file, obs_file, nav_file)
+        return self.parse_observation_start_time(obs_file)
+
+    def snapshot_raw_log(self, ubx_file):
+        """
+        Concatenates the closed raw log segments into a single UBX file.
+        The segments are complete and no longer written to, so the snapshot
+        is consistent while logging continues.
+        """
+        segments = self.raw_logger.snapshot()
+        with open(ubx_file, "wb") as f_out:
+            for segment in segments:
+                with open(segment, "rb") as f_in:
+                    shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        print(f"PPP Processor: Snapshot of {len(segments)} raw log segments written to {ubx_file}")
+
     def convert_ubx_to_rinex(self, ubx_file, rinex_obs_file, rinex_nav_file):
         convbin_cmd = [
             os.path.join(self.rtklib_path, "convbin"),
@@ -154,190 +255,47 @@ class PPPProcessor(threading.Thread):
         return None
     
     def download_precise_products(self, obs_datetime):
-        
-        # Compute GPS week from obs_datetime
-        def datetime_to_gpsweek(dt):
-            # GPS epoch: 1980-01-06
-            from datetime import datetime
-            gps_epoch = datetime(1980, 1, 6, 0, 0, 0)
-            delta = dt - gps_epoch
-            gps_week = delta.days // 7
-            return gps_week
-
-        # Convert obs_datetime to YYYYDOY
-        def datetime_to_yyyy_doy(dt):
-            year = dt.year
-            doy = dt.timetuple().tm_yday
-            return f"{year}{doy:03d}"
+        """
+        Returns the best available precise products for the observations,
+        from the product cache if the prefetcher already fetched them.
 
-        # FTP download utility
-        def download_file(ftp, file_name):
-            file_path = f"./temp/{file_name}"
-            # Download the file
-            with open(file_path, 'wb') as f, tqdm(desc=f'Downloading {file_name}', unit='B', unit_scale=True) as bar:
-                def callback(data):
-                    f.write(data)
-                    bar.update(len(data))
-                ftp.retrbinary(f'RETR {file_name}', callback)
-
-            # If the file is a .gz, extract it
-            if file_path.endswith(".gz"):
-                extracted_path = file_path[:-6] + file_path[-6:-3].lower()  # remove '.gz' and adjust extension
-                with gzip.open(file_path, 'rb') as f_in:
-                    with open(extracted_path, 'wb') as f_out, tqdm(desc=f'Extracting  {file_name}', unit='B', unit_scale=True) as bar:
-                        chunk_size = 1024 * 1024  # 1 MB
-                        while True:
-                            chunk = f_in.read(chunk_size)
-                            if not chunk:
-                                break
-                            f_out.write(chunk)
-                            bar.update(len(chunk))
-                os.remove(file_path)  # Remove the .gz file
-                return extracted_path
-            else:
-                return file_path
-
-        # Best to Worst Products
-        solution_hierarchy = [
-            "FIN",  # Final products
-            "RAP",  # Rapid products
-            "ULT",  # Ultra-rapid products
-            "PREV"  # Previous day ultra-rapid products
-        ]
-        # Best to Worst Analysis Centers
-        analysis_center_priority = [
-            "IGS",   # International GNSS Service (IGS) – Global combination center, highest quality
-            "JPL",   # Jet Propulsion Laboratory (USA) – High-quality, US-based, IGS core analysis center
-            "USN",   # U.S. Naval Observatory (USA) – Reliable, US-based
-            "NGS",   # NOAA/National Geodetic Survey (USA) – US government geodesy agency
-            "SIO",   # Scripps Institution of Oceanography (USA) – High-quality scientific contributions
-            "COD",   # Center for Orbit Determination in Europe (Switzerland) – IGS core center, globally respected
-            "GRG",   # Space geodesy team of CNES (France) – IGS analysis center
-            "ESA",   # European Space Agency (Germany) – high-quality, globally respected
-            "GOP",   # Geodetic Observatory Pecny (Czech Republic) – reliable, but lower priority for US usage
-            "WHU",   # Wuhan University (China) – good data but more latency for US users
-            "JGX",   # Geospatial Information Authority of Japan/JAXA – reliable, farther away
-            "EMR",   # Natural Resources Canada – good but less globally recognized for orbit analysis
-            "GFZ",   # GFZ Helmholtz (Germany) – solid, but usually used as backup
-            "MIT"    # Massachusetts Institute of Technology – contributes, but not a core analysis center
-        ]
-        center_priority_map = {center: i for i, center in enumerate(analysis_center_priority)}
-
-        # Download best available products from FTP server
-        gps_week = datetime_to_gpsweek(obs_datetime)
-        ftp = FTP("garner.ucsd.edu")
-        ftp.login()
-        ftp.cwd(f"/pub/products/{gps_week}")
-        files = ftp.nlst()
-        
-        # Find all matching SP3 and CLK files
-        sp3_file = None
-        clk_file = None
-        date = datetime_to_yyyy_doy(obs_datetime)
-        for solution_type in solution_hierarchy:
-            
-            # Handle previous day ultra-rapid case and week boundary
-            if solution_type == "PREV":
-                solution_type = "ULT"  # Previous day ultra-rapid uses ULT type
-                prev_obs_datetime = obs_datetime - timedelta(days=1)
-                date = datetime_to_yyyy_doy(prev_obs_datetime)
-                gps_week_candidate = datetime_to_gpsweek(prev_obs_datetime)
-                if gps_week_candidate != gps_week:
-                    ftp.cwd(f"/pub/products/{gps_week_candidate}")
-                    files = ftp.nlst()
-            
-            # Find all matching SP3 and CLK files
-            sp3_pattern = re.compile(rf'(\w{{3}})0OPS{solution_type}_{date}(\d{{2}})00_.+.ORB.SP3.gz')
-            clk_pattern = re.compile(rf'(\w{{3}})0OPS{solution_type}_{date}(\d{{2}})00_.+.CLK.CLK.gz')
-            sp3_files = {}
-            clk_files = {}
-            for f in files:
-                # Collect the latest hour files for each analysis center
-                match = sp3_pattern.match(f)
-                if match:
-                    analysis_center = match.group(1)
-                    hours = int(match.group(2))
-                    if analysis_center not in sp3_files or hours > sp3_files[analysis_center][1]:
-                        sp3_files[analysis_center] = (f, hours)
-                    continue
-                match = clk_pattern.match(f)
-                if match:
-                    analysis_center = match.group(1)
-                    hours = int(match.group(2))
-                    if analysis_center not in clk_files or hours > clk_files[analysis_center][1]:
-                        clk_files[analysis_center] = (f, hours)
-
-            # Group files by analysis center
-            file_pairs = {}
-            if sp3_files and clk_files:
-                for analysis_center in sp3_files.keys():
-                    if analysis_center in clk_files.keys():
-                        file_pairs[analysis_center] = (sp3_files[analysis_center][0], clk_files[analysis_center][0])
-
-            # Select the best file pair based on priority
-            print( f"PPP Processor: Found {len(file_pairs)} {solution_type} product pairs for date {date}.")
-            if file_pairs:       
-                best_center = min(
-                    file_pairs.keys(),
-                    key=lambda c: center_priority_map.get(c, float('inf'))
-                )
-                sp3_file_name, clk_file_name = file_pairs[best_center]
-                if os.path.exists(sp3_file_name[:-3]):
-                    sp3_file = sp3_file_name[:-3]
-                else:
-                    sp3_file = download_file(ftp, sp3_file_name)
-                if os.path.exists(clk_file_name[:-3]):
-                    clk_file = clk_file_name[:-3]
-                else:
-                    clk_file = download_file(ftp, clk_file_name)
-                solution_type = solution_type
-                print(f"PPP Processor: Using {solution_type} products from {best_center}: {sp3_file}, {clk_file}")
-                break
-            
-        ftp.quit()  
-        return sp3_file, clk_file, solution_type
+        Returns:
+            tuple: (SP3 path, CLK path, solution type), all None if no
+                   products are available.
+        """
+        return self.products.get_products(obs_datetime)
     
-    def run_rnx2rtkp_ppp(self, rinex_obs_file, rinex_nav_file, sp3_file, clk_file, output_file):
-        rnx2rtkp_cmd = [
-            os.path.join(self.rtklib_path, "rnx2rtkp"),
-            "-p",   "8",          # PPP-Static mode
-            "-m",   "1",          # Elevation mask 
-            # "-sys", "G,R",        # GNSS systems to use
-            # "-f",   "2",          # Frequencies to use
-            # "-v",   "3",          # Validation threshold for integer ambiguity
-            # "-c",               # Combined solution
-            # "-i",               # Instantaneous interger ambiguitiy resolution
-            # "-h",               # Fix and hold integer ambiguity resolution
-            "-x",   "2",          # Verbose trace level
-            # "-e",               # Output ECEF
-            "-g",                 # Output LLH
-            # "-a",               # Output ENU   
-            "-o", output_file,
-            rinex_obs_file,
-            rinex_nav_file,
-            sp3_file,
-            clk_file
-        ]
-        subprocess.Popen(rnx2rtkp_cmd, stdout=subprocess.PIPE, text=True, bufsize=1).wait()
-        print(f"PPP Processor: PPP result written to {output_file}")
+    def run_rnx2rtkp_ppp(self, rinex_obs_file, rinex_nav_file, sp3_file, clk_file, output_dir, observation_seconds=0):
+        """
+        Solves the observations with every PPP strategy in parallel.
+
+        Returns:
+            dict: The best strategy's result (see `StrategyRunner.solve()`),
+                  or None if none produced a solution.
+        """
+        return self.strategies.run([rinex_obs_file, rinex_nav_file, sp3_file, clk_file], output_dir,
+                                   observation_seconds, self.stop_event)
 
 if __name__ == "__main__":
     """
-    Converts UBX to RINEX, extracts observation start time, downloads precise products,
-    and runs rnx2rtkp in PPP mode.
+    Solves recorded UBX files once, outside the base station:
+
+        python ppp_processor.py ./shared/raw_ubx/station-*.ubx
     """
-    
-    rtklib_path = "./RTKLIB/bin"  
-    ubx_file = "station.ubx"
+    from rinex_segments import read_header
+
+    rtklib_path = "./RTKLIB/bin"
+    ubx_files = sys.argv[1:] or ["station.ubx"]
     rinex_obs_file = "station.obs"
     rinex_nav_file = "station.nav"
-    output_file = "ppp.pos"
-    
-    ppp = PPPProcessor(rtklib_path)
-    ppp.convert_ubx_to_rinex(ubx_file, rinex_obs_file, rinex_nav_file)
-    obs_datetime = ppp.parse_observation_start_time(rinex_obs_file)
-    sp3_file, clk_file, solution_type = ppp.download_precise_products(obs_datetime)
-    ppp.run_rnx2rtkp_ppp(rinex_obs_file, rinex_nav_file, sp3_file, clk_file, output_file)
-    with open(output_file, 'r') as f:
-        print(f"PPP Processor: {f.readlines()[-1]}")
-    
\ No newline at end of file
+
+    obs_datetime = SegmentConverter(rtklib_path, "./rinex").assemble(ubx_files, rinex_obs_file, rinex_nav_file)
+    if obs_datetime is None:
+        sys.exit("PPP Processor: No observations in the UBX files.")
+    sp3_file, clk_file, solution_type = ProductCache("./shared/products").get_products(obs_datetime)
+    if sp3_file is None:
+        sys.exit("PPP Processor: No precise products available.")
+    _, info = read_header(rinex_obs_file)
+    observation_seconds = ((info["last"] or info["first"]) - info["first"]).total_seconds()
+    best = StrategyRunner(rtklib_path).run([rinex_obs_file, rinex_nav_file, sp3_file, clk_file], ".", observation_seconds)
+    print(f"PPP Processor: {solution_type} products, best solution: {best}")
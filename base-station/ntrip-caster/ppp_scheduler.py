@@ -0,0 +1,191 @@
+"""
+Decides when the PPP processor solves.
+
+Instead of a fixed ladder of wall clock intervals, a solve is triggered by
+the data and products that actually arrived:
+
+- data: the raw log holds `growth` times the observation time of the last
+  solve (less growth is needed while the filter has not converged), and
+  enough new bytes were logged. Time without new data, e.g. while the
+  receiver is unplugged, does not count.
+- products: a better solution type (e.g. rapid after ultra-rapid) became
+  available for the observation day than the last solve used.
+
+Scheduling ends once a converged solution reaches the target sigma with
+rapid or final products, or the log covers `max_observation` seconds.
+"""
+
+from datetime import datetime, timedelta
+import time
+
+from product_cache import LISTING_TTL, SOLUTION_HIERARCHY
+
+TRIGGER_DATA = "data"
+TRIGGER_PRODUCTS = "products"
+DONE = "done"
+
+FIRST_OBSERVATION = 15 * 60     # Seconds of data before the first solve
+GROWTH = 2.0                    # Data needed for the next solve, as a multiple of the last
+GROWTH_UNCONVERGED = 1.5
+MIN_NEW_BYTES = 256 * 1024      # About 5 minutes of RXM-RAWX at 1 Hz
+TARGET_SD = 0.05                # m, 3D sigma that ends the calibration
+FINAL_TYPES = ("FIN", "RAP")
+MAX_OBSERVATION = 384 * 3600    # The longest run of the former interval ladder
+
+class PPPScheduler:
+    """
+    Tracks the logged observations and the last solve, and tells the PPP
+    processor when to solve next. `poll()` only reads counters and cached
+    product listings, so it is cheap to call every few seconds.
+    """
+
+    def __init__(self, raw_logger, products, first_observation=FIRST_OBSERVATION, growth=GROWTH,
+                 growth_unconverged=GROWTH_UNCONVERGED, min_new_bytes=MIN_NEW_BYTES, target_sd=TARGET_SD,
+                 max_observation=MAX_OBSERVATION, product_check_interval=LISTING_TTL):
+        """
+        Args:
+            raw_logger (RawLogger): The raw log the observations are read from.
+            products (ProductCache): Where product availability is looked up.
+            first_observation (float): Seconds of data before the first solve.
+            growth (float): Data growth that triggers the next solve.
+            growth_unconverged (float): Same, after a solve that did not converge.
+            min_new_bytes (int): Raw log bytes needed since the last solve.
+            target_sd (float): 3D sigma in m at which scheduling ends.
+            max_observation (float): Seconds of data after which scheduling ends.
+            product_check_interval (float): Seconds between product lookups.
+        """
+        self.raw_logger = raw_logger
+        self.products = products
+        self.first_observation = first_observation
+        self.growth = growth
+        self.growth_unconverged = growth_unconverged
+        self.min_new_bytes = min_new_bytes
+        self.target_sd = target_sd
+        self.max_observation = max_observation
+        self.product_check_interval = product_check_interval
+
+        self.logged_seconds = 0.0
+        self.logged_bytes = 0
+        self.last_sample = time.monotonic()
+        self.solved_seconds = None      # Logged seconds and bytes at the last solve
+        self.solved_bytes = 0
+        self.solution = None
+        self.solution_type = None
+        self.obs_datetime = None
+        self.next_product_check = 0.0
+        self.last_decision = None
+        self.stats = {
+            "ppp_scheduler_solves": 0,
+            "ppp_scheduler_data_triggers": 0,
+            "ppp_scheduler_product_triggers": 0,
+            "ppp_scheduler_product_checks": 0,
+        }
+
+    def _sample(self):
+        """
+        Adds the time since the last sample to the observation time if the
+        raw log grew in between.
+        """
+        now = time.monotonic()
+        written = self.raw_logger.get_stats()["raw_log_bytes_written"]
+        if written > self.logged_bytes:
+            self.logged_seconds += now - self.last_sample
+        self.logged_bytes = written
+        self.last_sample = now
+
+    def required_seconds(self) -> float:
+        """
+        Returns the observation time the next data triggered solve needs.
+        """
+        if self.solved_seconds is None:
+            return self.first_observation
+        growth = self.growth if self.solution is not None and self.solution["converged"] else self.growth_unconverged
+        return min(max(self.solved_seconds * growth, self.first_observation), self.max_observation)
+
+    def next_solve_time(self) -> datetime:
+        """
+        Returns when the next data triggered solve is due if logging
+        continues without gaps, e.g. to prefetch its products.
+        """
+        return datetime.now() + timedelta(seconds=max(self.required_seconds() - self.logged_seconds, 0))
+
+    def done(self) -> bool:
+        if self.solved_seconds is not None and self.solved_seconds >= self.max_observation:
+            return True
+        return (self.solution is not None and self.solution["converged"]
+                and self.solution["sd"] <= self.target_sd and self.solution_type in FINAL_TYPES)
+
+    def _rank(self, solution_type) -> int:
+        return SOLUTION_HIERARCHY.index(solution_type) if solution_type in SOLUTION_HIERARCHY else len(SOLUTION_HIERARCHY)
+
+    def _better_products(self) -> str | None:
+        """
+        Returns a solution type better than the last solve's that is now
+        available for the observation day, looked up at most every
+        `product_check_interval` seconds.
+        """
+        if self.solved_seconds is None or self.obs_datetime is None or self.solution_type == SOLUTION_HIERARCHY[0]:
+            return None
+        now = time.monotonic()
+        if now < self.next_product_check:
+            return None
+        self.next_product_check = now + self.product_check_interval
+        self.stats["ppp_scheduler_product_checks"] += 1
+        hierarchy = SOLUTION_HIERARCHY[:self._rank(self.solution_type)]
+        return self.products.available(self.obs_datetime, hierarchy)
+
+    def poll(self) -> str | None:
+        """
+        Returns `TRIGGER_DATA` or `TRIGGER_PRODUCTS` if a solve is due,
+        `DONE` once no further solve is needed, otherwise None.
+        """
+        if self.done():
+            return self._decide(DONE, "calibration complete")
+        self._sample()
+        new_bytes = self.logged_bytes - self.solved_bytes
+        if self.logged_seconds >= self.required_seconds() and new_bytes >= self.min_new_bytes:
+            self.stats["ppp_scheduler_data_triggers"] += 1
+            return self._decide(TRIGGER_DATA, f"{self.logged_seconds/60:.0f} min of observations, {new_bytes} new bytes")
+        solution_type = self._better_products()
+        if solution_type is not None:
+            self.stats["ppp_scheduler_product_triggers"] += 1
+            return self._decide(TRIGGER_PRODUCTS, f"{solution_type} products available, last solve used {self.solution_type}")
+        return None
+
+    def _decide(self, decision, reason) -> str:
+        if not (decision == DONE and self.last_decision == DONE):
+            print(f"{'ppp_scheduler':<20}: {decision}: {reason}")
+        self.last_decision = decision
+        return decision
+
+    def record(self, solution, solution_type, obs_datetime):
+        """
+        Records a solve, successful or not.
+
+        Args:
+            solution (dict): The best solution's summary (see
+                             `pos_solution.summarize()`), or None.
+            solution_type (str): The products used, or None.
+            obs_datetime (datetime): The first observation, or None.
+        """
+        self.stats["ppp_scheduler_solves"] += 1
+        self.solved_seconds = self.logged_seconds
+        self.solved_bytes = self.logged_bytes
+        self.solution = solution
+        self.solution_type = solution_type
+        self.obs_datetime = obs_datetime or self.obs_datetime
+        self.next_product_check = time.monotonic() + self.product_check_interval
+        print(f"{'ppp_scheduler':<20}: Next solve after {self.required_seconds()/60:.0f} min of observations, "
+              f"about {self.next_solve_time():%Y-%m-%d %H:%M}, or when better products than {solution_type} appear")
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats.update({
+            "ppp_scheduler_logged_seconds": float(self.logged_seconds),
+            "ppp_scheduler_required_seconds": float(self.required_seconds()),
+            "ppp_scheduler_new_bytes": self.logged_bytes - self.solved_bytes,
+            "ppp_scheduler_last_decision": self.last_decision,
+            "ppp_scheduler_solution_type": self.solution_type,
+            "ppp_scheduler_done": self.done(),
+        })
+        return stats
@@ -0,0 +1,193 @@
+"""
+Parallel PPP solving with several `rnx2rtkp` configurations.
+
+Each strategy is one set of solver options (constellations, frequencies,
+elevation mask). All strategies of a run are solved at the same time, each
+in its own `rnx2rtkp` process with a lowered priority, a CPU time limit
+and a wall clock budget, and the solution with the best quality flag and
+smallest 3D sigma is kept.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import resource
+import signal
+import time
+import os
+
+from pos_solution import Q_RANK, read_pos, summarize
+
+# Name -> rnx2rtkp options, in addition to PPP-static mode and LLH output
+STRATEGIES = {
+    "all-1deg":     ["-m", "1"],                    # The former single configuration
+    "all-10deg":    ["-m", "10"],
+    "all-15deg":    ["-m", "15"],
+    "gps-gal":      ["-sys", "G,E", "-m", "10"],
+    "gps":          ["-sys", "G", "-m", "10"],
+    "l1":           ["-f", "1", "-m", "10"],
+}
+
+NICENESS = 10               # Keeps the caster and the receiver readers responsive
+TIME_BUDGET_MIN = 10 * 60   # Wall clock seconds per strategy for a short log...
+TIME_BUDGET_PER_HOUR = 60   # ...plus this per hour of observations...
+TIME_BUDGET_MAX = 4 * 3600  # ...up to this
+
+def read_solution(pos_file) -> dict | None:
+    """
+    Returns the summary of a strategy's output (see `pos_solution.summarize()`),
+    or None if it holds no solution.
+    """
+    if not os.path.exists(pos_file):
+        return None
+    return summarize(read_pos(pos_file))
+
+def best_solution(results) -> dict | None:
+    """
+    Returns the completed result with the best Q flag, and among those
+    the smallest 3D sigma, or None if no strategy produced a solution.
+    """
+    solved = [result for result in results if result["solution"] is not None]
+    if not solved:
+        return None
+    return min(solved, key=lambda result: (Q_RANK.get(result["solution"]["q"], len(Q_RANK)), result["solution"]["sd"]))
+
+def _limit_resources(pid, cpu_seconds):
+    """
+    Lowers the priority of a started solver and limits its CPU time. Set
+    from the parent, since a `preexec_fn` can deadlock the child of a
+    process with other threads before it executes.
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, 0) + NICENESS)
+        # SIGXCPU at the soft limit, SIGKILL shortly after if it is ignored
+        resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    except ProcessLookupError:
+        pass    # Already exited
+
+class StrategyRunner:
+    """
+    Solves the same RINEX input with every strategy in parallel.
+
+    One process per strategy runs at a time on each worker, so by default
+    one core is left for the rest of the base station.
+    """
+
+    def __init__(self, rtklib_path, strategies=STRATEGIES, workers=None):
+        """
+        Args:
+            rtklib_path (str): Directory holding `rnx2rtkp`.
+            strategies (dict): Strategy name -> rnx2rtkp options.
+            workers (int): Strategies solved at once, by default one less
+                           than the number of cores.
+        """
+        self.rtklib_path = rtklib_path
+        self.strategies = strategies
+        self.workers = workers or max(1, min(len(strategies), (os.cpu_count() or 2) - 1))
+        self.runs = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.last_results = []
+
+    def time_budget(self, observation_seconds) -> int:
+        """
+        Returns the wall clock seconds a strategy may take for a log of the
+        given length. The CPU time limit is the same, since `rnx2rtkp`
+        is single threaded.
+        """
+        budget = TIME_BUDGET_MIN + TIME_BUDGET_PER_HOUR * observation_seconds / 3600
+        return int(min(budget, TIME_BUDGET_MAX))
+
+    def solve(self, name, inputs, output_file, budget, stop_event=None) -> dict:
+        """
+        Runs one strategy.
+
+        Returns:
+            dict: "strategy", "output", "status" (ok, timeout, cpu-limit,
+                  failed or stopped), "seconds" and "solution" (see
+                  `read_solution()`, None unless the run completed).
+        """
+        rnx2rtkp_cmd = [
+            os.path.join(self.rtklib_path, "rnx2rtkp"),
+            "-p", "8",                  # PPP-Static mode
+            *self.strategies[name],
+            "-g",                       # Output LLH
+            "-o", output_file,
+            *inputs
+        ]
+        start = time.monotonic()
+        process = subprocess.Popen(rnx2rtkp_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        _limit_resources(process.pid, budget)
+        status = None
+        while status is None:
+            try:
+                returncode = process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                if stop_event is not None and stop_event.is_set():
+                    status = "stopped"
+                elif time.monotonic() - start > budget:
+                    status = "timeout"
+                else:
+                    continue
+                process.kill()
+                process.wait()
+                break
+            if returncode == 0:
+                status = "ok"
+            elif returncode == -signal.SIGXCPU or returncode == -signal.SIGKILL:
+                status = "cpu-limit"
+            else:
+                status = "failed"
+        seconds = time.monotonic() - start
+        return {
+            "strategy": name,
+            "output": output_file,
+            "status": status,
+            "seconds": seconds,
+            "solution": read_solution(output_file) if status == "ok" else None,
+        }
+
+    def run(self, inputs, output_dir, observation_seconds=0, stop_event=None) -> dict | None:
+        """
+        Solves the input with every strategy.
+
+        Args:
+            inputs (list): Observation, navigation, SP3 and CLK files.
+            output_dir (str): Where the .pos file of each strategy is written.
+            observation_seconds (float): Length of the observations, which
+                                         scales the time budget.
+            stop_event (Event): Kills the running solvers when set.
+
+        Returns:
+            dict: The best result (see `solve()`), or None.
+        """
+        budget = self.time_budget(observation_seconds)
+        print(f"{'ppp_strategies':<20}: Solving {len(self.strategies)} strategies on {self.workers} workers, {budget} s budget each")
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = [
+                pool.submit(self.solve, name, inputs, os.path.join(output_dir, f"ppp_{name}.pos"), budget, stop_event)
+                for name in self.strategies
+            ]
+            results = [future.result() for future in futures]
+
+        for result in results:
+            self.runs += 1
+            self.timeouts += result["status"] in ("timeout", "cpu-limit")
+            self.failures += result["status"] == "failed" or (result["status"] == "ok" and result["solution"] is None)
+            solution = result["solution"]
+            summary = f"Q={solution['q']} ns={solution['ns']} SD={solution['sd']:.3f} m converged={solution['converged']}" if solution else "no solution"
+            print(f"{'ppp_strategies':<20}: {result['strategy']:<12} {result['status']:<9} {result['seconds']:7.1f} s  {summary}")
+        self.last_results = results
+        best = best_solution(results)
+        if best is not None:
+            print(f"{'ppp_strategies':<20}: Best strategy: {best['strategy']}")
+        return best
+
+    def get_stats(self) -> dict:
+        stats = {
+            "ppp_strategy_runs": self.runs,
+            "ppp_strategy_timeouts": self.timeouts,
+            "ppp_strategy_failures": self.failures,
+        }
+        for result in self.last_results:
+            stats[f"ppp_strategy_{result['strategy']}_seconds"] = float(result["seconds"])
+        return stats
@@ -0,0 +1,472 @@
+"""
+Local cache of IGS precise orbit (SP3) and clock (CLK) products for PPP.
+
+Products are kept under ./shared/products/<GPS week>/<YYYYDOY>/<analysis
+center>/<solution type>/, so they survive restarts and later PPP runs of
+the same day start without downloading anything. Directory listings of
+the product servers are cached with a TTL, and the least recently used
+products are evicted once the cache exceeds its size cap.
+
+The servers are `ProductSource`s from product_sources.py. A local mirror
+directory laid out like the servers (<mirror>/<GPS week>/<product>.gz)
+can replace them, e.g. to test PPP offline.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Event, Lock, RLock, Thread
+from ftplib import all_errors
+from tqdm import tqdm
+import requests
+import json
+import time
+import zlib
+import os
+import re
+
+from product_sources import CHUNK_SIZE, GunzipWriter, rank_sources, sources_from_env
+
+LISTING_TTL = 30 * 60       # Seconds a directory listing is trusted
+PREFETCH_LEAD = 10 * 60     # Seconds before a PPP run that its products are fetched
+
+# Best to Worst Products
+SOLUTION_HIERARCHY = [
+    "FIN",  # Final products
+    "RAP",  # Rapid products
+    "ULT",  # Ultra-rapid products
+    "PREV"  # Previous day ultra-rapid products
+]
+# Best to Worst Analysis Centers
+ANALYSIS_CENTER_PRIORITY = [
+    "IGS",   # International GNSS Service (IGS) – Global combination center, highest quality
+    "JPL",   # Jet Propulsion Laboratory (USA) – High-quality, US-based, IGS core analysis center
+    "USN",   # U.S. Naval Observatory (USA) – Reliable, US-based
+    "NGS",   # NOAA/National Geodetic Survey (USA) – US government geodesy agency
+    "SIO",   # Scripps Institution of Oceanography (USA) – High-quality scientific contributions
+    "COD",   # Center for Orbit Determination in Europe (Switzerland) – IGS core center, globally respected
+    "GRG",   # Space geodesy team of CNES (France) – IGS analysis center
+    "ESA",   # European Space Agency (Germany) – high-quality, globally respected
+    "GOP",   # Geodetic Observatory Pecny (Czech Republic) – reliable, but lower priority for US usage
+    "WHU",   # Wuhan University (China) – good data but more latency for US users
+    "JGX",   # Geospatial Information Authority of Japan/JAXA – reliable, farther away
+    "EMR",   # Natural Resources Canada – good but less globally recognized for orbit analysis
+    "GFZ",   # GFZ Helmholtz (Germany) – solid, but usually used as backup
+    "MIT"    # Massachusetts Institute of Technology – contributes, but not a core analysis center
+]
+CENTER_PRIORITY = {center: i for i, center in enumerate(ANALYSIS_CENTER_PRIORITY)}
+
+# e.g. COD0OPSRAP_20241230000_01D_05M_ORB.SP3.gz
+PRODUCT_PATTERN = re.compile(r"(\w{3})0OPS(\w{3})_(\d{7})(\d{2})00_.+_(ORB\.SP3|CLK\.CLK)\.gz")
+
+def gps_week(dt) -> int:
+    """
+    Returns the GPS week of a datetime (GPS epoch 1980-01-06).
+    """
+    return (dt - datetime(1980, 1, 6)).days // 7
+
+def yyyy_doy(dt) -> str:
+    """
+    Returns the date as YYYYDOY, as used in IGS long product names.
+    """
+    return f"{dt.year}{dt.timetuple().tm_yday:03d}"
+
+def local_name(file_name) -> str:
+    """
+    Returns the name of a product once decompressed: without ".gz" and with
+    a lower case extension, e.g. "..._ORB.sp3".
+    """
+    return file_name[:-6] + file_name[-6:-3].lower()
+
+def select_products(files, solution_type, date) -> tuple[str, str, str] | None:
+    """
+    Picks the SP3/CLK pair of the preferred analysis center from a listing,
+    taking each center's latest issue of the day.
+
+    Args:
+        files (list): File names of a GPS week directory.
+        solution_type (str): "FIN", "RAP" or "ULT".
+        date (str): YYYYDOY.
+
+    Returns:
+        tuple: (analysis center, SP3 file name, CLK file name), or None.
+    """
+    latest = {"ORB.SP3": {}, "CLK.CLK": {}}
+    for f in files:
+        match = PRODUCT_PATTERN.fullmatch(f)
+        if not match or match.group(2) != solution_type or match.group(3) != date:
+            continue
+        analysis_center, hours, kind = match.group(1), int(match.group(4)), match.group(5)
+        if analysis_center not in latest[kind] or hours > latest[kind][analysis_center][1]:
+            latest[kind][analysis_center] = (f, hours)
+    file_pairs = {
+        analysis_center: (sp3[0], latest["CLK.CLK"][analysis_center][0])
+        for analysis_center, sp3 in latest["ORB.SP3"].items()
+        if analysis_center in latest["CLK.CLK"]
+    }
+    if not file_pairs:
+        return None
+    best_center = min(file_pairs, key=lambda c: CENTER_PRIORITY.get(c, float('inf')))
+    return (best_center, *file_pairs[best_center])
+
+class ProductCache:
+    """
+    Finds, downloads and keeps precise products.
+
+    Products come from the first of several `ProductSource`s (see
+    `rank_sources()`) that has them. The orbit and clock files of a lookup
+    download concurrently and are decompressed while they arrive. The
+    compressed bytes are kept in a partial file until the product is
+    complete, so a download that fails resumes from the same source next
+    time. Two lookups never download the same file twice: the later one
+    waits and then finds it in the cache.
+    """
+
+    def __init__(self, directory="./shared/products", max_total_bytes=1024 * 1024 * 1024,
+                 listing_ttl=LISTING_TTL, sources=None):
+        """
+        Args:
+            directory (str): Root of the cache.
+            max_total_bytes (int): Cap on the size of the cached products.
+            listing_ttl (float): Seconds before a directory listing is fetched again.
+            sources (list): `ProductSource`s, by default from `sources_from_env()`.
+        """
+        self.directory = directory
+        self.max_total_bytes = max_total_bytes
+        self.listing_ttl = listing_ttl
+        self.sources = sources if sources is not None else sources_from_env()
+        self.lock = RLock()
+        self.file_locks = {}    # Product path -> Lock, held while it downloads
+        self.listings = {}      # GPS week -> (fetched at, file names)
+        self.stats = {
+            "product_cache_hits": 0,
+            "product_cache_misses": 0,
+            "product_cache_bytes_downloaded": 0,
+            "product_cache_bytes_resumed": 0,
+            "product_cache_source_fallbacks": 0,
+            "product_cache_evictions": 0,
+            "product_cache_listing_errors": 0,
+        }
+        os.makedirs(os.path.join(self.directory, "listings"), exist_ok=True)
+
+    def _count(self, stat, value=1):
+        with self.lock:
+            self.stats[stat] += value
+
+    def _listing_path(self, week) -> str:
+        return os.path.join(self.directory, "listings", f"{week}.json")
+
+    def _product_dir(self, file_name, week) -> str:
+        match = PRODUCT_PATTERN.fullmatch(file_name)
+        analysis_center, solution_type, date = match.group(1), match.group(2), match.group(3)
+        return os.path.join(self.directory, str(week), date, analysis_center, solution_type)
+
+    def listing(self, week) -> list[str]:
+        """
+        Returns the product file names of a GPS week.
+
+        A listing younger than the TTL is used as is, also across restarts.
+        If no source can be reached, an outdated listing (or, without one,
+        the products already in the cache) is used instead.
+        """
+        with self.lock:
+            fetched, files = self.listings.get(week, (0, None))
+            if files is None and os.path.exists(self._listing_path(week)):
+                with open(self._listing_path(week), "r") as f:
+                    saved = json.load(f)
+                fetched, files = saved["fetched"], saved["files"]
+                self.listings[week] = (fetched, files)
+        if files is not None and time.time() - fetched < self.listing_ttl:
+            return files
+
+        # Listed without the lock, so a slow server does not block the downloads
+        for source in rank_sources(self.sources):
+            try:
+                listed = source.list(week)
+                break
+            except (OSError, requests.RequestException, *all_errors) as e:
+                source.record_failure()
+                self._count("product_cache_listing_errors")
+                print(f"{'product_cache':<20}: Could not list GPS week {week} on {source.name}: {e}")
+        else:
+            if files is None:
+                files = self._cached_names(week)
+            print(f"{'product_cache':<20}: No source reachable, using {len(files)} known products of GPS week {week}")
+            return files
+
+        with self.lock:
+            fetched, files = time.time(), listed
+            self.listings[week] = (fetched, files)
+            tmp_path = self._listing_path(week) + ".part"
+            with open(tmp_path, "w") as f:
+                json.dump({"fetched": fetched, "files": files}, f)
+            os.replace(tmp_path, self._listing_path(week))
+        return files
+
+    def _cached_names(self, week) -> list[str]:
+        """
+        Returns the server names of the products of a GPS week in the cache.
+        """
+        names = []
+        for root, _, files in os.walk(os.path.join(self.directory, str(week))):
+            names += [f[:-3] + f[-3:].upper() + ".gz" for f in files if not f.endswith(".part")]
+        return names
+
+    def fetch(self, file_name, week) -> str:
+        """
+        Returns the path of a decompressed product, downloading it if it is
+        not cached yet. Sources are tried in `rank_sources()` order.
+
+        Args:
+            file_name (str): The server name, e.g. "..._ORB.SP3.gz".
+            week (int): The GPS week directory holding it.
+
+        Raises:
+            ConnectionError: If no source could provide the product.
+        """
+        product_dir = self._product_dir(file_name, week)
+        path = os.path.join(product_dir, local_name(file_name))
+        with self.lock:
+            file_lock = self.file_locks.setdefault(path, Lock())
+        with file_lock:
+            if os.path.exists(path):
+                self._count("product_cache_hits")
+                os.utime(path)      # Mark as recently used
+                return path
+            self._count("product_cache_misses")
+            os.makedirs(product_dir, exist_ok=True)
+            errors = []
+            for i, source in enumerate(rank_sources(self.sources)):
+                if i:
+                    self._count("product_cache_source_fallbacks")
+                try:
+                    self._download(source, week, file_name, path)
+                    break
+                except (OSError, EOFError, zlib.error, requests.RequestException, *all_errors) as e:
+                    source.record_failure()
+                    errors.append(f"{source.name}: {e}")
+                    print(f"{'product_cache':<20}: Download of {file_name} from {source.name} failed: {e}")
+            else:
+                raise ConnectionError(f"No source could provide {file_name} ({'; '.join(errors)})")
+
+            # A newer ultra-rapid issue replaces the older one of the same kind
+            kind = file_name[-6:-3]
+            for other in os.listdir(product_dir):
+                if other != os.path.basename(path) and other[-3:].upper() == kind:
+                    os.remove(os.path.join(product_dir, other))
+            return path
+
+    def _download(self, source, week, file_name, path):
+        """
+        Downloads and decompresses a product from one source, resuming a
+        partial download from that source.
+        """
+        gz_part = f"{path}.gz.{source.name}.part"
+        offset = os.path.getsize(gz_part) if os.path.exists(gz_part) else 0
+        start_time = time.monotonic()
+        start, chunks = source.open(week, file_name, offset)
+        size = 0
+        try:
+            with open(gz_part, "r+b" if offset else "w+b") as raw, open(path + ".part", "wb") as out, \
+                    tqdm(desc=f'Downloading {file_name}', unit='B', unit_scale=True, initial=start) as bar:
+                gunzip = GunzipWriter(out)
+                raw.truncate(start)
+                # Rebuild the decompressor's state from the bytes kept last time
+                while data := raw.read(CHUNK_SIZE):
+                    gunzip.write(data)
+                for data in chunks:
+                    raw.write(data)
+                    gunzip.write(data)
+                    size += len(data)
+                    bar.update(len(data))
+                gunzip.close()
+        except BaseException as e:
+            # The decompressed part is rebuilt from the compressed one on resume
+            os.remove(path + ".part")
+            if isinstance(e, (EOFError, zlib.error)):
+                # Corrupt or not what the source advertised, start over next time
+                os.remove(gz_part)
+            raise
+        finally:
+            self._count("product_cache_bytes_downloaded", size)
+        os.replace(path + ".part", path)
+        source.record_download(size, time.monotonic() - start_time)
+        if start:
+            self._count("product_cache_bytes_resumed", start)
+            print(f"{'product_cache':<20}: Resumed {file_name} from {source.name} at {start} bytes")
+        for other in os.listdir(os.path.dirname(path)):
+            if other.startswith(os.path.basename(path) + ".gz."):
+                os.remove(os.path.join(os.path.dirname(path), other))
+
+    def _evict(self, keep=()):
+        """
+        Deletes the least recently used products until the cache is within
+        its size cap. Must be called with `lock` held.
+
+        Args:
+            keep (tuple): Paths in use, never evicted.
+        """
+        products = []
+        listings = os.path.join(self.directory, "listings")
+        busy = {path for path, file_lock in self.file_locks.items() if file_lock.locked()}
+        for root, _, files in os.walk(self.directory):
+            if root == listings:
+                continue
+            for f in files:
+                path = os.path.join(root, f)
+                if path.split(".gz.")[0].removesuffix(".part") in busy:
+                    continue
+                st = os.stat(path)
+                products.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in products)
+        for _, size, path in sorted(products):
+            if total <= self.max_total_bytes:
+                break
+            if path in keep:
+                continue
+            os.remove(path)
+            total -= size
+            self.stats["product_cache_evictions"] += 1
+            print(f"{'product_cache':<20}: Cache over {self.max_total_bytes} bytes, evicted {os.path.basename(path)}")
+            for directory in (os.path.dirname(path), *self._parents(path)):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+
+    def _parents(self, path):
+        """
+        Yields the directories between a product's directory and the cache root.
+        """
+        directory = os.path.dirname(os.path.dirname(path))
+        while os.path.abspath(directory) != os.path.abspath(self.directory):
+            yield directory
+            directory = os.path.dirname(directory)
+
+    def get_products(self, obs_datetime, hierarchy=SOLUTION_HIERARCHY) -> tuple[str | None, str | None, str | None]:
+        """
+        Returns the best available SP3 and CLK files for a day of observations.
+
+        Args:
+            obs_datetime (datetime): The time of the first observation.
+            hierarchy (list): Solution types to try, best first. "PREV" is
+                              the previous day's ultra-rapid products.
+
+        Returns:
+            tuple: (SP3 path, CLK path, solution type), all None if no
+                   product pair is available or could be downloaded.
+        """
+        for solution_type in hierarchy:
+            day = obs_datetime
+            if solution_type == "PREV":
+                # Previous day ultra-rapid, possibly in the previous GPS week
+                solution_type = "ULT"
+                day = obs_datetime - timedelta(days=1)
+            week, date = gps_week(day), yyyy_doy(day)
+            selected = select_products(self.listing(week), solution_type, date)
+            if selected is None:
+                print(f"{'product_cache':<20}: Found no {solution_type} product pairs for date {date}.")
+                continue
+            best_center, sp3_file_name, clk_file_name = selected
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="product_download") as executor:
+                sp3_future = executor.submit(self.fetch, sp3_file_name, week)
+                clk_future = executor.submit(self.fetch, clk_file_name, week)
+                try:
+                    sp3_file, clk_file = sp3_future.result(), clk_future.result()
+                except ConnectionError as e:
+                    print(f"{'product_cache':<20}: Could not get {solution_type} products from {best_center}: {e}")
+                    continue
+            with self.lock:
+                self._evict(keep=(sp3_file, clk_file))
+            print(f"{'product_cache':<20}: Using {solution_type} products from {best_center}: {sp3_file}, {clk_file}")
+            return sp3_file, clk_file, solution_type
+        return None, None, None
+
+    def available(self, obs_datetime, hierarchy=SOLUTION_HIERARCHY) -> str | None:
+        """
+        Returns the best solution type in `hierarchy` listed for a day of
+        observations, without downloading anything.
+        """
+        for solution_type in hierarchy:
+            day = obs_datetime - timedelta(days=1) if solution_type == "PREV" else obs_datetime
+            if select_products(self.listing(gps_week(day)), "ULT" if solution_type == "PREV" else solution_type, yyyy_doy(day)):
+                return solution_type
+        return None
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return dict(self.stats)
+
+class ProductPrefetcher(Thread):
+    """
+    Downloads the products of the next PPP run ahead of time.
+
+    Final products are only published about two weeks after the fact, so
+    the rapid and ultra-rapid products that a run will use are fetched
+    `lead` seconds before it is due, and the run finds them in the cache.
+    """
+
+    def __init__(self, cache, stop_event, lead=PREFETCH_LEAD, hierarchy=("RAP", "ULT", "PREV")):
+        """
+        Args:
+            cache (ProductCache): The cache to fill.
+            stop_event (Event): Stops the thread when set.
+            lead (float): Seconds before the run to prefetch.
+            hierarchy (list): Solution types to prefetch, best first.
+        """
+        super().__init__(name="product_prefetcher", daemon=True)
+        self.cache = cache
+        self.stop_event = stop_event
+        self.lead = lead
+        self.hierarchy = hierarchy
+        self.wakeup = Event()
+        self.due = None         # (prefetch time, observation datetime)
+
+    def schedule(self, run_time, obs_datetime=None):
+        """
+        Prefetches the products for a PPP run.
+
+        Args:
+            run_time (datetime): When the run starts (local time).
+            obs_datetime (datetime): The first observation of the run, or
+                                     None for today (UTC).
+        """
+        self.due = (run_time - timedelta(seconds=self.lead), obs_datetime)
+        self.wakeup.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            due = self.due
+            if due is None or datetime.now() < due[0]:
+                timeout = 60 if due is None else min(60, (due[0] - datetime.now()).total_seconds())
+                self.wakeup.wait(max(timeout, 0))
+                self.wakeup.clear()
+                continue
+            if self.due is due:
+                self.due = None
+            obs_datetime = due[1] or datetime.now(timezone.utc).replace(tzinfo=None)
+            try:
+                sp3_file, _, solution_type = self.cache.get_products(obs_datetime, self.hierarchy)
+                if sp3_file is None:
+                    print(f"{'product_prefetcher':<20}: No products available yet for {yyyy_doy(obs_datetime)}")
+                else:
+                    print(f"{'product_prefetcher':<20}: Prefetched {solution_type} products for {yyyy_doy(obs_datetime)}")
+            except Exception as e:
+                print(f"{'product_prefetcher':<20}: Prefetch failed: {e}")
+
+if __name__ == "__main__":
+    """
+    Fetches the products for a date (YYYY-MM-DD, default today) into the
+    cache, e.g. to fill it or to check a mirror: product_cache.py [date] [source URL]
+    """
+    import sys
+
+    from product_sources import parse_source
+
+    day = datetime.strptime(sys.argv[1], "%Y-%m-%d") if len(sys.argv) > 1 else datetime.now(timezone.utc).replace(tzinfo=None)
+    cache = ProductCache(sources=[parse_source(sys.argv[2])] if len(sys.argv) > 2 else None)
+    start = time.monotonic()
+    print(cache.get_products(day))
+    print(f"First lookup: {time.monotonic() - start:.2f} s")
+    start = time.monotonic()
+    print(cache.get_products(day))
+    print(f"Cached lookup: {time.monotonic() - start:.3f} s, {cache.get_stats()}")
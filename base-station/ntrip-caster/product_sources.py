@@ -0,0 +1,269 @@
+"""
+Servers and mirrors that precise products are downloaded from.
+
+Every source lists the products of a GPS week and streams a product from
+a byte offset, so that an interrupted download continues where it
+stopped: FTP with REST, HTTPS with a Range request and local directories
+with a seek. Each source measures its download throughput, and
+`rank_sources()` orders the mirrors by it so the fastest one is tried first.
+"""
+
+from ftplib import FTP
+from urllib.parse import unquote, urlparse
+import requests
+import time
+import zlib
+import os
+import re
+
+CHUNK_SIZE = 64 * 1024
+TIMEOUT = 30                # Seconds to connect or wait for data
+RETRY_MIN = 60              # Seconds a failed source is tried last
+RETRY_MAX = 3600
+
+# Used unless PPP_PRODUCT_SOURCES lists others
+DEFAULT_SOURCES = (
+    "ftp://garner.ucsd.edu/pub/products",
+    "https://igs.bkg.bund.de/root_ftp/IGS/products",
+)
+
+class ProductSource:
+    """
+    A place with IGS products in one directory per GPS week.
+
+    Subclasses implement `list()` and `open()`.
+    """
+
+    def __init__(self, name):
+        """
+        Args:
+            name (str): Identifies the source in logs and partial file names.
+        """
+        self.name = re.sub(r"[^\w.-]+", "_", name)
+        self.throughput = None      # Bytes/s, moving average over downloads
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def list(self, week) -> list[str]:
+        """
+        Returns the file names of a GPS week directory.
+        """
+        raise NotImplementedError
+
+    def open(self, week, file_name, offset=0):
+        """
+        Starts streaming a file.
+
+        Args:
+            week (int): The GPS week directory.
+            file_name (str): The file to download.
+            offset (int): Bytes already downloaded.
+
+        Returns:
+            int: The offset the data starts at, 0 if the source cannot resume.
+            iterator: The file's bytes in chunks.
+        """
+        raise NotImplementedError
+
+    def record_download(self, size, seconds):
+        """
+        Updates the throughput with a completed download.
+        """
+        if seconds <= 0:
+            return
+        rate = size / seconds
+        self.throughput = rate if self.throughput is None else 0.5 * self.throughput + 0.5 * rate
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def record_failure(self):
+        """
+        Moves the source to the back of the ranking for a while, longer
+        after every consecutive failure.
+        """
+        self.failures += 1
+        self.retry_at = time.monotonic() + min(RETRY_MIN * 2 ** (self.failures - 1), RETRY_MAX)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name})"
+
+class FTPSource(ProductSource):
+    """
+    An anonymous FTP server. Every transfer uses its own session, so
+    several products download at once.
+    """
+
+    def __init__(self, host, root):
+        super().__init__(f"ftp-{host}")
+        self.host = host
+        self.root = root.rstrip("/")
+
+    def _login(self) -> FTP:
+        ftp = FTP(self.host, timeout=TIMEOUT)
+        ftp.login()
+        return ftp
+
+    def list(self, week) -> list[str]:
+        ftp = self._login()
+        try:
+            ftp.cwd(f"{self.root}/{week}")
+            return ftp.nlst()
+        finally:
+            ftp.close()
+
+    def open(self, week, file_name, offset=0):
+        ftp = self._login()
+        try:
+            ftp.voidcmd("TYPE I")
+            conn = ftp.transfercmd(f"RETR {self.root}/{week}/{file_name}", rest=offset or None)
+        except BaseException:
+            ftp.close()
+            raise
+
+        def chunks():
+            try:
+                with conn:
+                    while data := conn.recv(CHUNK_SIZE):
+                        yield data
+                ftp.voidresp()
+            finally:
+                ftp.close()
+        return offset, chunks()
+
+class HTTPSSource(ProductSource):
+    """
+    A web server with directory index pages, e.g. a data center's HTTPS
+    mirror of its FTP archive.
+    """
+
+    def __init__(self, base_url):
+        super().__init__(f"https-{urlparse(base_url).netloc}")
+        self.base_url = base_url.rstrip("/")
+
+    def list(self, week) -> list[str]:
+        response = requests.get(f"{self.base_url}/{week}/", timeout=TIMEOUT)
+        response.raise_for_status()
+        names = (unquote(href).rsplit("/", 1)[-1] for href in re.findall(r'href="([^"?#]+)"', response.text))
+        return sorted({name for name in names if name})
+
+    def open(self, week, file_name, offset=0):
+        # Products are gzip files themselves, a server must not encode them again
+        headers = {"Accept-Encoding": "identity"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        response = requests.get(f"{self.base_url}/{week}/{file_name}", headers=headers, stream=True, timeout=TIMEOUT)
+        try:
+            response.raise_for_status()
+        except BaseException:
+            response.close()
+            raise
+        # A server that ignores the range sends the whole file
+        start = offset if response.status_code == 206 else 0
+
+        def chunks():
+            # Undecoded, since servers may still send .gz files with Content-Encoding: gzip
+            with response:
+                yield from response.raw.stream(CHUNK_SIZE, decode_content=False)
+        return start, chunks()
+
+class LocalSource(ProductSource):
+    """
+    A local directory laid out like the servers (<directory>/<GPS week>/),
+    e.g. to run PPP offline.
+    """
+
+    def __init__(self, directory):
+        super().__init__(f"local-{os.path.basename(os.path.normpath(directory))}")
+        self.directory = directory
+
+    def list(self, week) -> list[str]:
+        week_dir = os.path.join(self.directory, str(week))
+        return sorted(os.listdir(week_dir)) if os.path.isdir(week_dir) else []
+
+    def open(self, week, file_name, offset=0):
+        f = open(os.path.join(self.directory, str(week), file_name), "rb")
+        f.seek(offset)
+
+        def chunks():
+            with f:
+                while data := f.read(CHUNK_SIZE):
+                    yield data
+        return offset, chunks()
+
+class GunzipWriter:
+    """
+    Decompresses gzip data as it arrives and writes the result to a file,
+    so a product is usable as soon as its download completes. Handles
+    files of several concatenated gzip members.
+    """
+
+    def __init__(self, out):
+        """
+        Args:
+            out (file): Binary file the decompressed data is written to.
+        """
+        self.out = out
+        self.inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.in_member = False
+        self.size = 0
+
+    def write(self, data):
+        """
+        Raises:
+            zlib.error: If the data is not valid gzip.
+        """
+        while data:
+            self.in_member = True
+            output = self.inflater.decompress(data)
+            self.out.write(output)
+            self.size += len(output)
+            if not self.inflater.eof:
+                return
+            data = self.inflater.unused_data
+            self.inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            self.in_member = False
+
+    def close(self):
+        """
+        Raises:
+            EOFError: If the gzip stream ended early.
+        """
+        if self.in_member or not self.size:
+            raise EOFError("Compressed data ended before the end of the gzip stream")
+
+def parse_source(spec) -> ProductSource:
+    """
+    Creates a source from a URL: ftp://host/path, https://host/path, or a
+    local directory (optionally as file:///path).
+    """
+    url = urlparse(spec)
+    if url.scheme == "ftp":
+        return FTPSource(url.hostname, url.path or "/")
+    if url.scheme in ("http", "https"):
+        return HTTPSSource(spec)
+    return LocalSource(url.path if url.scheme == "file" else spec)
+
+def sources_from_env() -> list[ProductSource]:
+    """
+    Returns the sources to use: only the local directory PPP_PRODUCTS_MIRROR
+    if it is set, otherwise the comma-separated URLs of PPP_PRODUCT_SOURCES
+    or `DEFAULT_SOURCES`.
+    """
+    mirror = os.getenv("PPP_PRODUCTS_MIRROR")
+    if mirror:
+        return [LocalSource(mirror)]
+    specs = [spec.strip() for spec in os.getenv("PPP_PRODUCT_SOURCES", "").split(",") if spec.strip()]
+    return [parse_source(spec) for spec in specs or DEFAULT_SOURCES]
+
+def rank_sources(sources) -> list[ProductSource]:
+    """
+    Orders sources for the next download: sources that failed recently
+    last, the rest by measured throughput, fastest first. A source without
+    a measurement yet goes first (in the configured order), so that every
+    mirror is measured once.
+    """
+    now = time.monotonic()
+    def key(source):
+        throughput = float("inf") if source.throughput is None else source.throughput
+        return (source.retry_at > now, -throughput)
+    return sorted(sources, key=key)
@@ -0,0 +1,217 @@
+import os
+import re
+import time
+from threading import Lock
+
+SEGMENT_PATTERN = re.compile(r"station-(\d{6})-\d{8}T\d{6}\.ubx(\.part)?")
+
+class RawLogger:
+    """
+    Buffered, rotating log of raw UBX frames for the PPP processor.
+
+    Frames are appended to a long-lived buffered file handle instead of
+    opening and closing the log for every message. The buffer is flushed and
+    fsynced periodically, and the active segment (suffixed ".part") is closed
+    and renamed on every hour boundary. Closed segments are never modified
+    again, so `snapshot()` can hand the PPP processor a consistent list of
+    files while logging continues. When the total size exceeds its cap the
+    oldest closed segments are deleted.
+    """
+
+    def __init__(self, directory="./shared/raw_ubx", segment_seconds=3600, fsync_interval=5.0,
+                 max_total_bytes=1024 * 1024 * 1024, buffer_size=256 * 1024, keep_existing=False):
+        """
+        Args:
+            directory (str): Directory that holds the segment files.
+            segment_seconds (int): Segment length, aligned to the wall clock.
+            fsync_interval (float): Seconds between flush + fsync of the active segment.
+            max_total_bytes (int): Cap on the total size of all segments.
+            buffer_size (int): Size of the write buffer in bytes.
+            keep_existing (bool): Keep segments from a previous run instead of
+                                  deleting them, e.g. if the station has not moved.
+        """
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.fsync_interval = fsync_interval
+        self.max_total_bytes = max_total_bytes
+        self.buffer_size = buffer_size
+
+        self.lock = Lock()
+        self.segments = []          # Closed segment paths, oldest first
+        self.segment_sizes = {}
+        self.next_seq = 0
+        self.active_file = None
+        self.active_path = None
+        self.active_size = 0
+        self.segment_end = 0.0
+        self.last_fsync = time.monotonic()
+        self.closed = False
+        self.stats = {
+            "raw_log_bytes_written": 0,
+            "raw_log_frames_written": 0,
+            "raw_log_fsyncs": 0,
+            "raw_log_write_errors": 0,
+            "raw_log_dropped_segments": 0,
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name in sorted(os.listdir(self.directory)):
+            match = SEGMENT_PATTERN.fullmatch(name)
+            if not match:
+                continue
+            path = os.path.join(self.directory, name)
+            if not keep_existing:
+                os.remove(path)
+                continue
+            if match.group(2):
+                # Left open by a previous run; it is complete up to its last fsync.
+                os.rename(path, path[:-len(".part")])
+                path = path[:-len(".part")]
+            self.segments.append(path)
+            self.segment_sizes[path] = os.path.getsize(path)
+            self.next_seq = int(match.group(1)) + 1
+        if self.segments:
+            print(f"{'raw_logger':<20}: Kept {len(self.segments)} segments from a previous run.")
+
+    def _open_segment(self, now):
+        """
+        Opens a new active segment. Must be called with `lock` held.
+        """
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))
+        self.active_path = os.path.join(self.directory, f"station-{self.next_seq:06d}-{stamp}.ubx.part")
+        self.active_file = open(self.active_path, "ab", buffering=self.buffer_size)
+        self.active_size = 0
+        self.next_seq += 1
+        self.segment_end = (now // self.segment_seconds + 1) * self.segment_seconds
+
+    def _fsync(self):
+        """
+        Flushes the write buffer and fsyncs the active segment.
+        Must be called with `lock` held.
+        """
+        self.active_file.flush()
+        os.fsync(self.active_file.fileno())
+        self.last_fsync = time.monotonic()
+        self.stats["raw_log_fsyncs"] += 1
+
+    def _rotate(self):
+        """
+        Closes the active segment and adds it to the closed segment list.
+        Must be called with `lock` held.
+        """
+        if self.active_file is None:
+            return
+        try:
+            self._fsync()
+        finally:
+            self.active_file.close()
+            self.active_file = None
+        path = self.active_path[:-len(".part")]
+        os.rename(self.active_path, path)
+        self.active_path = None
+        size, self.active_size = self.active_size, 0
+        if size:
+            self.segments.append(path)
+            self.segment_sizes[path] = size
+        else:
+            os.remove(path)
+        self._enforce_cap()
+
+    def _enforce_cap(self):
+        """
+        Deletes the oldest closed segments until the log is within its size cap.
+        Must be called with `lock` held.
+        """
+        while self.segments and sum(self.segment_sizes.values()) > self.max_total_bytes:
+            path = self.segments.pop(0)
+            self.segment_sizes.pop(path)
+            self.stats["raw_log_dropped_segments"] += 1
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"{'raw_logger':<20}: Could not remove segment {path}: {e}")
+            print(f"{'raw_logger':<20}: Raw log over {self.max_total_bytes} bytes, discarded oldest segment {path}.")
+
+    def write(self, raw_data):
+        """
+        Appends a raw frame to the active segment, rotating and fsyncing as due.
+
+        Args:
+            raw_data (bytes): A complete UBX frame.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                now = time.time()
+                if self.active_file is not None and now >= self.segment_end:
+                    self._rotate()
+                if self.active_file is None:
+                    self._open_segment(now)
+                self.active_file.write(raw_data)
+                self.active_size += len(raw_data)
+                self.stats["raw_log_bytes_written"] += len(raw_data)
+                self.stats["raw_log_frames_written"] += 1
+                if time.monotonic() - self.last_fsync >= self.fsync_interval:
+                    self._fsync()
+            except OSError as e:
+                self.stats["raw_log_write_errors"] += 1
+                print(f"{'raw_logger':<20}: Write error: {e}")
+
+    def snapshot(self) -> list[str]:
+        """
+        Closes the active segment and returns every closed segment.
+
+        The returned files are complete and will not be written to again.
+        They stay on disk until the size cap or `close(remove=True)` deletes
+        them, so callers should convert or copy them promptly.
+
+        Returns:
+            list: Segment paths, oldest first.
+        """
+        with self.lock:
+            try:
+                self._rotate()
+            except OSError as e:
+                self.stats["raw_log_write_errors"] += 1
+                print(f"{'raw_logger':<20}: Could not close segment for snapshot: {e}")
+            return list(self.segments)
+
+    def close(self, remove=False):
+        """
+        Closes the active segment and stops logging.
+
+        Args:
+            remove (bool): Also delete all segments, e.g. once PPP is done.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                self._rotate()
+            except OSError as e:
+                print(f"{'raw_logger':<20}: Could not close segment: {e}")
+            if remove:
+                for path in self.segments:
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        print(f"{'raw_logger':<20}: Could not remove segment {path}: {e}")
+                self.segments.clear()
+                self.segment_sizes.clear()
+        print(f"{'raw_logger':<20}: Closed{' and removed raw log' if remove else ''}.")
+
+    def get_stats(self) -> dict:
+        """
+        Returns a snapshot of the logger counters.
+
+        Returns:
+            dict: Bytes and frames written, fsyncs, errors, dropped segments
+                  and the current on-disk size.
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["raw_log_segments"] = len(self.segments) + (self.active_file is not None)
+            stats["raw_log_total_bytes"] = sum(self.segment_sizes.values()) + self.active_size
+        return stats
@@ -0,0 +1,269 @@
+"""
+Incremental UBX to RINEX conversion of the raw log for the PPP processor.
+
+Every closed `RawLogger` segment is converted with RTKLIB's `convbin` once,
+and the resulting observation and navigation files are cached with the
+segment's first and last epoch in ./shared/rinex/. A PPP run then only
+converts the segments closed since the previous run and assembles its
+input by merging the cached files, instead of converting the whole log
+again.
+"""
+
+from datetime import datetime
+from threading import Lock
+import subprocess
+import shutil
+import json
+import os
+
+END_OF_HEADER = "END OF HEADER"
+OBS_TYPES = "SYS / # / OBS TYPES"
+FIELD_WIDTH = 16    # An observation: F14.3, loss of lock and signal strength indicators
+
+def parse_header_time(line) -> datetime:
+    """
+    Parses a TIME OF FIRST/LAST OBS header line.
+    """
+    parts = line.split()
+    year, month, day, hour, minute = map(int, parts[:5])
+    second = float(parts[5])
+    return datetime(year, month, day, hour, minute, int(second))
+
+def read_header(path) -> tuple[list[str], dict]:
+    """
+    Reads the header of a RINEX observation file.
+
+    Returns:
+        list: The header lines, including END OF HEADER.
+        dict: "version" (float), "types" (system -> observation types),
+              "first"/"last" (datetime or None).
+    """
+    lines = []
+    info = {"version": None, "types": {}, "first": None, "last": None}
+    system = None
+    with open(path, "r") as f:
+        for line in f:
+            lines.append(line)
+            label = line[60:].strip()
+            if label == "RINEX VERSION / TYPE":
+                info["version"] = float(line[:9])
+            elif label == OBS_TYPES:
+                if line[0] != " ":
+                    system = line[0]
+                    info["types"][system] = []
+                info["types"][system] += line[7:60].split()
+            elif label == "TIME OF FIRST OBS":
+                info["first"] = parse_header_time(line)
+            elif label == "TIME OF LAST OBS":
+                info["last"] = parse_header_time(line)
+            elif label == END_OF_HEADER:
+                break
+    return lines, info
+
+def obs_types_lines(types) -> list[str]:
+    """
+    Formats SYS / # / OBS TYPES header lines, 13 types per line.
+    """
+    lines = []
+    for system, system_types in types.items():
+        for i in range(0, max(len(system_types), 1), 13):
+            head = f"{system}  {len(system_types):3d}" if i == 0 else " " * 6
+            body = "".join(f" {obs_type:>3}" for obs_type in system_types[i:i + 13])
+            lines.append(f"{head}{body:<54}{OBS_TYPES}\n")
+    return lines
+
+def merge_obs(paths, out_path):
+    """
+    Merges RINEX 3 observation files, in time order, into one.
+
+    Files with the same observation types are concatenated. Otherwise the
+    header lists the union of the types per system and every satellite
+    record is rewritten in that order, leaving missing observations blank.
+
+    Raises:
+        ValueError: For RINEX 2 files with different observation types,
+                    whose records cannot be remapped line by line.
+    """
+    headers = [read_header(path) for path in paths]
+    union = {}
+    for _, info in headers:
+        for system, system_types in info["types"].items():
+            known = union.setdefault(system, [])
+            known += [obs_type for obs_type in system_types if obs_type not in known]
+    remap = any(info["types"] != union for _, info in headers)
+    if remap and any(info["version"] < 3 for _, info in headers):
+        raise ValueError("RINEX 2 segments with different observation types cannot be merged")
+
+    first_lines, _ = headers[0]
+    last_line = next((line for line in headers[-1][0] if line[60:].strip() == "TIME OF LAST OBS"), None)
+    with open(out_path, "w") as out:
+        types_written = False
+        for line in first_lines:
+            label = line[60:].strip()
+            if label == OBS_TYPES:
+                if not types_written:
+                    out.writelines(obs_types_lines(union))
+                    types_written = True
+            elif label == "TIME OF LAST OBS" and last_line is not None:
+                out.write(last_line)
+            else:
+                out.write(line)
+        for path, (lines, info) in zip(paths, headers):
+            with open(path, "r") as f:
+                for _ in lines:
+                    f.readline()
+                if info["types"] == union:
+                    shutil.copyfileobj(f, out, 1024 * 1024)
+                    continue
+                # Position of each of this file's observations in the merged record
+                positions = {
+                    system: [union[system].index(obs_type) for obs_type in system_types]
+                    for system, system_types in info["types"].items()
+                }
+                for line in f:
+                    columns = positions.get(line[0])
+                    if columns is None:
+                        out.write(line)     # Epoch lines (">") and event records
+                        continue
+                    fields = [" " * FIELD_WIDTH] * len(union[line[0]])
+                    record = line.rstrip("\n")
+                    for i, column in enumerate(columns):
+                        field = record[3 + i * FIELD_WIDTH:3 + (i + 1) * FIELD_WIDTH]
+                        fields[column] = field.ljust(FIELD_WIDTH)
+                    out.write((record[:3] + "".join(fields)).rstrip() + "\n")
+
+def merge_nav(paths, out_path):
+    """
+    Concatenates RINEX navigation files under the header of the first.
+    Ephemerides repeated in several files are deduplicated by RTKLIB.
+    """
+    with open(out_path, "w") as out:
+        for i, path in enumerate(paths):
+            with open(path, "r") as f:
+                for line in f:
+                    if i == 0:
+                        out.write(line)
+                    if line[60:].strip() == END_OF_HEADER:
+                        break
+                shutil.copyfileobj(f, out, 1024 * 1024)
+
+class SegmentConverter:
+    """
+    Converts raw log segments to RINEX once and assembles them per PPP run.
+
+    The index (index.json) maps each segment's file name to its size,
+    observation and navigation files and first and last epoch. Segments
+    are never modified once closed, so an entry stays valid until the
+    segment is deleted.
+    """
+
+    def __init__(self, rtklib_path, directory="./shared/rinex"):
+        """
+        Args:
+            rtklib_path (str): Directory holding `convbin`.
+            directory (str): Where the per-segment RINEX files are cached.
+        """
+        self.rtklib_path = rtklib_path
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.lock = Lock()
+        self.index = {}
+        self.conversions = 0
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                self.index = json.load(f)
+
+    def _save_index(self):
+        with open(self.index_path + ".part", "w") as f:
+            json.dump(self.index, f)
+        os.replace(self.index_path + ".part", self.index_path)
+
+    def convert(self, segment) -> dict:
+        """
+        Returns the index entry of a segment, converting it if needed.
+
+        Returns:
+            dict: "size", "obs", "nav", and "first"/"last" as ISO 8601
+                  strings, None for a segment without observations.
+        """
+        name = os.path.basename(segment)
+        size = os.path.getsize(segment)
+        entry = self.index.get(name)
+        if entry is not None and entry["size"] == size and all(
+                path is None or os.path.exists(path) for path in (entry["obs"], entry["nav"])):
+            return entry
+
+        stem = os.path.join(self.directory, os.path.splitext(name)[0])
+        convbin_cmd = [
+            os.path.join(self.rtklib_path, "convbin"),
+            "-o", stem + ".obs.part",
+            "-n", stem + ".nav.part",
+            segment
+        ]
+        subprocess.run(convbin_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.conversions += 1
+        entry = {"size": size, "obs": None, "nav": None, "first": None, "last": None}
+        for kind in ("obs", "nav"):
+            if os.path.exists(f"{stem}.{kind}.part"):
+                os.replace(f"{stem}.{kind}.part", f"{stem}.{kind}")
+                entry[kind] = f"{stem}.{kind}"
+        if entry["obs"] is not None:
+            _, info = read_header(entry["obs"])
+            if info["first"] is not None:
+                entry["first"] = info["first"].isoformat()
+                entry["last"] = (info["last"] or info["first"]).isoformat()
+        self.index[name] = entry
+        return entry
+
+    def prune(self, segments):
+        """
+        Forgets segments that are no longer in the raw log, e.g. after its
+        size cap deleted them.
+        """
+        names = {os.path.basename(segment) for segment in segments}
+        for name in [name for name in self.index if name not in names]:
+            for path in (self.index[name]["obs"], self.index[name]["nav"]):
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+            del self.index[name]
+
+    def assemble(self, segments, obs_file, nav_file) -> datetime | None:
+        """
+        Writes the observations and navigation data of the segments to one
+        RINEX observation and one navigation file, converting only the
+        segments not seen before.
+
+        Args:
+            segments (list): Closed raw log segments, from `RawLogger.snapshot()`.
+            obs_file (str): The merged observation file to write.
+            nav_file (str): The merged navigation file to write.
+
+        Returns:
+            datetime: The time of the first observation, or None if the
+                      segments hold no observations.
+
+        Raises:
+            ValueError: If the segments' RINEX files cannot be merged.
+        """
+        with self.lock:
+            self.prune(segments)
+            conversions = self.conversions
+            entries = [self.convert(segment) for segment in segments]
+            converted = self.conversions - conversions
+            self._save_index()
+        entries = sorted((entry for entry in entries if entry["first"] is not None), key=lambda entry: entry["first"])
+        if not entries:
+            return None
+        merge_obs([entry["obs"] for entry in entries], obs_file)
+        merge_nav([entry["nav"] for entry in entries if entry["nav"] is not None], nav_file)
+        print(f"{'rinex_segments':<20}: Assembled {len(entries)} segments ({converted} newly converted) from {entries[0]['first']} to {entries[-1]['last']}")
+        return datetime.fromisoformat(entries[0]["first"])
+
+    def clear(self):
+        """
+        Deletes every cached file, e.g. once PPP is done.
+        """
+        with self.lock:
+            self.prune([])
+            self._save_index()
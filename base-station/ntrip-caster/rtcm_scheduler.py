@@ -0,0 +1,104 @@
+MSM4 = (1074, 1084, 1094, 1124)
+MSM7 = (1077, 1087, 1097, 1127)
+TOLERANCE = 0.25    # Seconds of epoch jitter tolerated when applying an interval
+
+# Output interval in seconds per RTCM3 message number. 0 forwards every
+# frame, None drops the type. "default" applies to unlisted types.
+PROFILES = {
+    # Everything the receiver emits, at its native rates.
+    "full": {"default": 0},
+    # MSM4 observations every epoch, station metadata and GLONASS biases
+    # decimated, MSM7 and anything else dropped.
+    "MSM4-lite": {
+        **{msg_type: 0 for msg_type in MSM4},
+        1005: 10,   # Stationary RTK reference station ARP
+        1006: 10,   # ARP with antenna height
+        1033: 10,   # Receiver and antenna descriptors
+        1230: 5,    # GLONASS code-phase biases
+        "default": None,
+    },
+}
+
+def rtcm_message_type(raw_data) -> int | None:
+    """
+    Returns the 12-bit message number of a raw RTCM3 frame without decoding
+    anything else, or None if the frame has no payload.
+    """
+    if len(raw_data) < 8:
+        return None
+    return (raw_data[3] << 4) | (raw_data[4] >> 4)
+
+class RTCMScheduler:
+    """
+    Decides per RTCM3 message type whether a frame is forwarded, based on a
+    profile of per-type output intervals.
+
+    The most recent frame of every decimated type is kept so that a client
+    connecting mid-interval can be sent the reference station position and
+    biases straight away instead of waiting for the next scheduled frame.
+    """
+
+    def __init__(self, profile="full"):
+        """
+        Args:
+            profile (str | dict): A name from `PROFILES` or a dict mapping
+                                  message numbers to intervals in seconds.
+
+        Raises:
+            KeyError: If the profile name is unknown.
+        """
+        self.name = profile if isinstance(profile, str) else "custom"
+        self.intervals = PROFILES[profile] if isinstance(profile, str) else profile
+        self.default = self.intervals.get("default", 0)
+        self.last_sent = {}
+        self.latest = {}
+        self.frames_forwarded = 0
+        self.frames_skipped = 0
+        self.bytes_forwarded = 0
+        self.bytes_skipped = 0
+
+    def accept(self, msg_type, received, raw_data) -> bool:
+        """
+        Returns True if the frame should be forwarded.
+
+        Args:
+            msg_type (int): The RTCM3 message number.
+            received (float): Monotonic time the frame left the serial port.
+            raw_data (bytes): The raw RTCM3 frame.
+        """
+        interval = self.intervals.get(msg_type, self.default)
+        if interval == 0:
+            accepted = True
+        elif interval is None:
+            accepted = False
+        else:
+            self.latest[msg_type] = (received, raw_data)
+            last = self.last_sent.get(msg_type)
+            accepted = last is None or received - last >= interval - TOLERANCE
+            if accepted:
+                self.last_sent[msg_type] = received
+        if accepted:
+            self.frames_forwarded += 1
+            self.bytes_forwarded += len(raw_data)
+        else:
+            self.frames_skipped += 1
+            self.bytes_skipped += len(raw_data)
+        return accepted
+
+    def initial_frames(self) -> list:
+        """
+        Returns the most recent frame of each decimated type, oldest first,
+        for a newly connected client.
+        """
+        return sorted(self.latest.values(), key=lambda frame: frame[0])
+
+    def get_stats(self) -> dict:
+        """
+        Returns the forwarded and skipped frame and byte counts.
+        """
+        return {
+            "frames_forwarded": self.frames_forwarded,
+            "frames_skipped": self.frames_skipped,
+            "bytes_forwarded": self.bytes_forwarded,
+            "bytes_skipped": self.bytes_skipped,
+        }
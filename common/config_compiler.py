@@ -0,0 +1,326 @@
+"""
+Compiles u-center configuration files into ready-to-send CFG-VALSET messages.
+
+A u-center "Generation 9" configuration file lists one key per line, each
+prefixed with the layer it belongs in:
+
+    [set]
+      RAM CFG-TMODE-MODE 0          # Optional comment
+    Flash CFG-TMODE-MODE 0
+
+`compile_config()` parses such a file once into typed, range-checked
+`ConfigValue`s for every layer and caches the result by content hash, so
+that posting the same configuration again skips parsing and encoding.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import struct
+
+from pyubx2 import (
+    UBXMessage,
+    SET,
+    SET_LAYER_RAM,
+    SET_LAYER_BBR,
+    SET_LAYER_FLASH,
+    TXN_NONE,
+    TXN_START,
+    TXN_ONGOING,
+    TXN_COMMIT,
+    UBX_CONFIG_DATABASE,
+    atttyp,
+    attsiz,
+    cfgkey2name,
+)
+
+LAYERS = {"RAM": SET_LAYER_RAM, "BBR": SET_LAYER_BBR, "Flash": SET_LAYER_FLASH}
+ALL_LAYERS = SET_LAYER_RAM | SET_LAYER_BBR | SET_LAYER_FLASH
+MAX_VALSET_KEYS = 32        # Keys per CFG-VALSET message (the receiver accepts 64)
+MAX_VALSET_PAYLOAD = 256    # Key/value bytes per CFG-VALSET message
+CACHE_SIZE = 16             # Compiled configurations kept by content hash
+
+class ConfigError(ValueError):
+    """
+    A u-center configuration line that cannot be compiled.
+    """
+
+    def __init__(self, message, line=None):
+        super().__init__(f"line {line}: {message}" if line is not None else message)
+        self.line = line
+
+class ConfigValue:
+    """
+    One configuration key with its value, validated against the key's type
+    and encoded the way CFG-VALSET sends and CFG-VALGET reports it.
+    """
+
+    __slots__ = ("name", "key_id", "type", "size", "value", "raw", "line")
+
+    def __init__(self, name, value, line=None):
+        """
+        Args:
+            name (str): The key name, e.g. "CFG_TMODE_MODE" (dashes are accepted).
+            value (int | float | bytes | str): The value, or its u-center text.
+            line (int): The source line, for error messages.
+
+        Raises:
+            ConfigError: If the key is unknown or the value does not fit its type.
+        """
+        self.name = name.replace("-", "_")
+        try:
+            self.key_id, attribute_type = UBX_CONFIG_DATABASE[self.name]
+        except KeyError:
+            raise ConfigError(f"Unknown configuration key {name}", line) from None
+        self.type = atttyp(attribute_type)
+        self.size = attsiz(attribute_type)
+        self.line = line
+        try:
+            self.value = self._convert(value)
+        except (TypeError, ValueError, OverflowError, struct.error) as e:
+            raise ConfigError(f"Invalid value {value!r} for {self.name} ({attribute_type}): {e}", line) from None
+        self.raw = self._encode()
+
+    @classmethod
+    def from_key(cls, key, value):
+        """
+        Creates a value from a key name or key ID.
+        """
+        return cls(key if isinstance(key, str) else cfgkey2name(key)[0], value)
+
+    def _convert(self, value):
+        bits = self.size * 8
+        if self.type == "R":
+            if isinstance(value, str) and value.strip().lower().startswith("0x"):
+                # u-center writes floats as their IEEE 754 bit pattern
+                value = int(value, 16).to_bytes(self.size, "little")
+                return struct.unpack("<f" if self.size == 4 else "<d", value)[0]
+            return float(value)
+        if self.type == "X":
+            if isinstance(value, (bytes, bytearray)):
+                if len(value) != self.size:
+                    raise ValueError(f"expected {self.size} bytes")
+                return bytes(value)
+            value = int(value, 0) if isinstance(value, str) else int(value)
+            return value.to_bytes(self.size, "little")
+
+        hex_text = isinstance(value, str) and value.strip().lower().startswith("0x")
+        value = int(value, 0) if isinstance(value, str) else value
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise TypeError("expected an integer")
+        if self.type == "I":
+            # Hexadecimal is a two's complement bit pattern, which u-center
+            # sign-extends to 64 bits (e.g. 0xFFFFFFFFC5A3B1F0 for an I4)
+            if hex_text and 1 << 63 <= value < 1 << 64:
+                value -= 1 << 64
+            elif hex_text and 1 << (bits - 1) <= value < 1 << bits:
+                value -= 1 << bits
+            low, high = -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+        elif self.type == "L":
+            low, high = 0, 1
+        else:
+            low, high = 0, (1 << bits) - 1
+        if not low <= value <= high:
+            raise ValueError(f"out of range {low}..{high}")
+        return value
+
+    def _encode(self) -> bytes:
+        if self.type == "R":
+            return struct.pack("<f" if self.size == 4 else "<d", self.value)
+        if self.type == "X":
+            return self.value
+        return self.value.to_bytes(self.size, "little", signed=self.type == "I")
+
+    def __repr__(self):
+        return f"ConfigValue({self.name!r}, {self.value!r})"
+
+def chunk_values(values, max_keys=MAX_VALSET_KEYS, max_payload=MAX_VALSET_PAYLOAD) -> list[list[ConfigValue]]:
+    """
+    Splits values into groups that fit one CFG-VALSET message.
+    """
+    chunks = [[]]
+    size = 0
+    for value in values:
+        item_size = 4 + value.size
+        if chunks[-1] and (len(chunks[-1]) >= max_keys or size + item_size > max_payload):
+            chunks.append([])
+            size = 0
+        chunks[-1].append(value)
+        size += item_size
+    return chunks if chunks[0] else []
+
+def build_valset_frames(values, layers, max_keys=MAX_VALSET_KEYS, max_payload=MAX_VALSET_PAYLOAD) -> list[tuple[bytes, list[ConfigValue]]]:
+    """
+    Encodes values as serialized CFG-VALSET messages. More than one message
+    forms a configuration transaction (begin, continue..., commit).
+
+    Args:
+        values (list): The `ConfigValue`s to write.
+        layers (int): The layers to write, e.g. SET_LAYER_RAM | SET_LAYER_FLASH.
+        max_keys (int): Keys per message.
+        max_payload (int): Key/value bytes per message.
+
+    Returns:
+        list: (UBX frame, values in the frame) per message, in sending order.
+    """
+    chunks = chunk_values(values, max_keys, max_payload)
+    frames = []
+    for i, chunk in enumerate(chunks):
+        if len(chunks) == 1:
+            transaction = TXN_NONE
+        elif i == 0:
+            transaction = TXN_START
+        elif i < len(chunks) - 1:
+            transaction = TXN_ONGOING
+        else:
+            transaction = TXN_COMMIT
+        payload = bytes([0 if transaction == TXN_NONE else 1, layers, transaction, 0])
+        payload += b"".join(value.key_id.to_bytes(4, "little") + value.raw for value in chunk)
+        frames.append((UBXMessage("CFG", "CFG-VALSET", SET, payload=payload).serialize(), chunk))
+    return frames
+
+class CompiledConfig:
+    """
+    The values of a configuration per layer, grouped by the set of layers
+    that share a value so that each group is written with one CFG-VALSET
+    transaction.
+    """
+
+    def __init__(self, layers, digest=None):
+        """
+        Args:
+            layers (dict): SET_LAYER_* -> {key name: ConfigValue}.
+            digest (str): SHA-256 of the source text, if compiled from one.
+        """
+        self.digest = digest
+        self.layers = {layer: values for layer, values in layers.items() if values}
+        groups = {}
+        for layer, values in self.layers.items():
+            for name, value in values.items():
+                # Merge layers that want the same encoded value
+                groups.setdefault((name, value.raw), [0, value])[0] |= layer
+        self.groups = {}
+        for mask, value in groups.values():
+            self.groups.setdefault(mask, []).append(value)
+        self._frames = {}
+        self._frames_lock = Lock()
+
+    @classmethod
+    def from_cfg_data(cls, cfg_data, layers=ALL_LAYERS):
+        """
+        Builds a configuration that writes the same (key, value) pairs to
+        every layer in `layers`.
+        """
+        values = {}
+        for key, value in cfg_data:
+            value = ConfigValue.from_key(key, value)
+            values[value.name] = value
+        return cls({layer: values for layer in LAYERS.values() if layers & layer})
+
+    def cfg_data(self, layer=SET_LAYER_FLASH) -> list[tuple[str, object]]:
+        """
+        Returns the (key name, value) pairs of one layer, for pyubx2.
+        """
+        return [(name, value.value) for name, value in self.layers.get(layer, {}).items()]
+
+    def valset_frames(self, mask, max_keys=MAX_VALSET_KEYS, max_payload=MAX_VALSET_PAYLOAD) -> list[tuple[bytes, list[ConfigValue]]]:
+        """
+        Returns the serialized CFG-VALSET messages that write a whole layer
+        group, encoding them on first use.
+
+        Args:
+            mask (int): A key of `groups`.
+        """
+        with self._frames_lock:
+            key = (mask, max_keys, max_payload)
+            if key not in self._frames:
+                self._frames[key] = build_valset_frames(self.groups[mask], mask, max_keys, max_payload)
+            return self._frames[key]
+
+    def without(self, prefix) -> "CompiledConfig":
+        """
+        Returns the configuration without the keys whose name starts with
+        `prefix`, e.g. "CFG_TMODE_".
+        """
+        return CompiledConfig({
+            layer: {name: value for name, value in values.items() if not name.startswith(prefix)}
+            for layer, values in self.layers.items()
+        })
+
+    def __len__(self):
+        return len({name for values in self.layers.values() for name in values})
+
+def parse_config(config_data_str: str, digest=None) -> CompiledConfig:
+    """
+    Parses u-center configuration text. Use `compile_config()` to benefit
+    from the cache.
+
+    A key given only for the Flash layer is also written to RAM and BBR, so
+    that it takes effect immediately and an older BBR value (which takes
+    precedence over Flash at startup) cannot shadow it.
+
+    Raises:
+        ConfigError: On an unknown layer or key, a malformed line, a value
+                     outside its type's range, or a [del] entry.
+    """
+    layers = {layer: {} for layer in LAYERS.values()}
+    section = "set"
+    for line_no, line in enumerate(config_data_str.splitlines(), start=1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1].strip().lower()
+            continue
+        if section != "set":
+            raise ConfigError(f"Entries in the [{section}] section are not supported", line_no)
+        fields = line.split()
+        if len(fields) != 3:
+            raise ConfigError(f"Expected '<layer> <key> <value>', got {line!r}", line_no)
+        layer_name, name, text = fields
+        if layer_name not in LAYERS:
+            raise ConfigError(f"Unknown layer {layer_name}", line_no)
+        value = ConfigValue(name, text, line_no)
+        layers[LAYERS[layer_name]][value.name] = value
+
+    for name, value in layers[SET_LAYER_FLASH].items():
+        for layer in (SET_LAYER_RAM, SET_LAYER_BBR):
+            layers[layer].setdefault(name, value)
+    return CompiledConfig(layers, digest)
+
+_cache = OrderedDict()
+_cache_lock = Lock()
+
+def compile_config(config_data_str: str) -> CompiledConfig:
+    """
+    Compiles u-center configuration text, returning the cached result for
+    text that was compiled before.
+
+    Args:
+        config_data_str (str): The u-center configuration.
+
+    Returns:
+        CompiledConfig: The typed values per layer.
+
+    Raises:
+        ConfigError: If the configuration is invalid.
+    """
+    digest = hashlib.sha256(config_data_str.encode()).hexdigest()
+    with _cache_lock:
+        compiled = _cache.get(digest)
+        if compiled is not None:
+            _cache.move_to_end(digest)
+            return compiled
+    compiled = parse_config(config_data_str, digest)
+    with _cache_lock:
+        _cache[digest] = compiled
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+def compile_config_file(config_file) -> CompiledConfig:
+    """
+    Compiles a u-center configuration file (.txt).
+    """
+    with open(config_file, "r") as f:
+        return compile_config(f.read())
@@ -1,4 +1,7 @@
 from threading import Thread, Event
+from http import HTTPStatus
+import asyncio
+import json
 import sys
 import os
 
@@ -6,9 +9,37 @@ from flask import Flask, request, jsonify
 
 try:
     from common.ubx_config import UBXConfig
+    from common.config_compiler import ConfigError, compile_config
 except ImportError:
     sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
     from ubx_config import UBXConfig
+    from config_compiler import ConfigError, compile_config
+
+def apply_config(ubx_config: UBXConfig, data: dict) -> tuple[dict, int]:
+    """
+    Compiles the u-center configuration in a /config request body (cached by
+    content hash, so repeated requests skip parsing) and sends the keys that
+    differ from the receiver's current values. Blocks until the receiver
+    acknowledges. The response lists the outcome of every key.
+
+    Returns:
+        tuple: The JSON response body and HTTP status code.
+    """
+    config_data = data.get("config") if isinstance(data, dict) else None
+    if not config_data:
+        return {"error": "Invalid request: 'config' key not found in request body"}, 400
+    try:
+        compiled = compile_config(config_data)
+    except ConfigError as e:
+        return {"error": f"Invalid configuration: {e}"}, 400
+    try:
+        success, msg, results = ubx_config.send_compiled(compiled)
+        if success:
+            return {"message": msg, "keys": results}, 200
+        else:
+            return {"error": f"Failed to apply configuration: {msg}", "keys": results}, 500
+    except Exception as e:
+        return {"error": f"Failed to apply configuration: {e}"}, 500
 
 class ConfigServer:
     """
@@ -30,19 +61,8 @@ class ConfigServer:
     def _config(self) -> tuple[dict[str, str], int]:
         if not request.is_json:
             return jsonify({"error": "Invalid request: Content-Type must be application/json"}), 400
-        data = request.get_json()
-        config_data = data.get("config")
-        if not config_data:
-            return jsonify({"error": "Invalid request: 'config' key not found in request body"}), 400
-        try:
-            config_msg = self.ubx_config.convert_u_center_config_from_string(config_data)
-            success, msg = self.ubx_config.send_config(config_msg)
-            if success:
-                return jsonify({"message": "Configuration applied successfully"}), 200
-            else:
-                return jsonify({"error": f"Failed to apply configuration: {msg}"}), 500
-        except Exception as e:
-            return jsonify({"error": f"Failed to apply configuration: {e}"}), 500
+        body, status = apply_config(self.ubx_config, request.get_json())
+        return jsonify(body), status
         
     def _fixed(self) -> tuple[dict[str, str], int]:
         if not request.is_json:
@@ -64,4 +84,69 @@ class ConfigServer:
                 return jsonify({"error": f"Failed to apply fixed configuration: {msg}"}), 500
         except Exception as e:
             return jsonify({"error": f"Failed to apply fixed configuration: {e}"}), 500
-                
\ No newline at end of file
+
+class AsyncConfigServer:
+    """
+    Asyncio counterpart of `ConfigServer` serving the same POST /config
+    endpoint on an existing event loop, without Flask or a server thread.
+    """
+
+    REQUEST_TIMEOUT = 10        # Seconds allowed for a client to send its request
+    MAX_BODY_BYTES = 256 * 1024
+
+    def __init__(self, ubx_config: UBXConfig, host="0.0.0.0", port=80):
+        self.ubx_config = ubx_config
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"{'config_server':<20}: Listening on {self.host}:{self.port}")
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _read_request(self, reader) -> tuple[str, str, dict, bytes]:
+        method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > self.MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        return method, path, headers, await reader.readexactly(length)
+
+    async def _handle(self, reader, writer):
+        try:
+            method, path, headers, body = await asyncio.wait_for(self._read_request(reader), self.REQUEST_TIMEOUT)
+            if path.split("?")[0] != "/config":
+                response, status = {"error": "Not found"}, 404
+            elif method != "POST":
+                response, status = {"error": "Method not allowed"}, 405
+            elif headers.get("content-type", "").split(";")[0].strip() != "application/json":
+                response, status = {"error": "Invalid request: Content-Type must be application/json"}, 400
+            else:
+                try:
+                    data = json.loads(body)
+                except ValueError:
+                    response, status = {"error": "Invalid request: body is not valid JSON"}, 400
+                else:
+                    # send_config() blocks on the ACK, which is dispatched by the event loop
+                    loop = asyncio.get_running_loop()
+                    response, status = await loop.run_in_executor(None, apply_config, self.ubx_config, data)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            response, status = {"error": "Invalid request"}, 400
+        content = json.dumps(response).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\nConnection: close\r\n\r\n".encode() + content
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
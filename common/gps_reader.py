@@ -1,66 +1,573 @@
 from serial.tools.list_ports import comports
-from serial import Serial
+from serial import Serial, SerialException
+from threading import Condition, Event, Lock, Thread
+import time
+import sys
+import os
 from pyubx2 import (
     UBXMessage,
     SET,
+    POLL,
     SET_LAYER_RAM,
     SET_LAYER_BBR,
     TXN_NONE,
+    UBX_PROTOCOL,
 )
+try:
+    from common.ubx_framer import UBXFramer
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+    from ubx_framer import UBXFramer
 
 # A dictionary mapping USB Product IDs (PIDs) to receiver information.
 # This allows the GPSReader to automatically identify the connected device
-# and configure the serial connection with the correct baud rate.
+# and configure the serial connection with the correct baud rate. For
+# receivers behind a USB-serial bridge ("uart"), the baud rate is only the
+# first guess: the actual rate is probed and then raised up to "max_baud".
+# The CFG-UART1-BAUDRATE of the config files only applies at boot (Flash)
+# and never lowers the negotiated rate (see `UBXConfig.send_compiled()`).
 receiver_by_pid = {
     0x01A7: {"name": "BUDGET",   "model": "u-blox 7",       "vid": 0x1546, "baud":   9600},  
-    0x23A3: {"name": "PREMIUM",  "model": "u-blox M10",     "vid": 0x067B, "baud":  38400},  
+    0x23A3: {"name": "PREMIUM",  "model": "u-blox M10",     "vid": 0x067B, "baud":  38400, "uart": True, "max_baud": 921600},
     0x01A9: {"name": "SPARKFUN", "model": "u-blox ZED-F9P", "vid": 0x1546, "baud":  38400}, 
-    0x7523: {"name": "SPARKFUN", "model": "u-blox ZED-FP9", "vid": 0x1A86, "baud": 460800}, # Through Sparkfun CH340C USB-Serial
+    0x7523: {"name": "SPARKFUN", "model": "u-blox ZED-FP9", "vid": 0x1A86, "baud": 460800, "uart": True, "max_baud": 921600}, # Through Sparkfun CH340C USB-Serial
 }
 
+# Rates tried when probing a UART link, highest first
+BAUD_RATES = (921600, 460800, 230400, 115200, 57600, 38400, 19200, 9600)
+PROBE_TIMEOUT = 0.5     # Seconds to wait for a UBX frame after a poll
+STABLE_PROBES = 3       # Consecutive clean polls before a new rate is kept
+SWITCH_DELAY = 0.1      # Seconds for the receiver to change its rate after CFG-VALSET
+MON_VER_POLL = UBXMessage("MON", "MON-VER", POLL).serialize()
+
+class _UntilDeadline:
+    """
+    Reads from a port until a deadline, then reports a timeout. At a wrong
+    baud rate the receiver's output arrives as endless noise, which would
+    otherwise keep `UBXFramer.read()` waiting for a frame.
+    """
+
+    def __init__(self, ser, deadline):
+        self.ser = ser
+        self.deadline = deadline
+
+    def read(self, size=1) -> bytes:
+        if time.monotonic() >= self.deadline:
+            return b""
+        return self.ser.read(size)
+
+def probe_ubx(ser, timeout=PROBE_TIMEOUT) -> bool:
+    """
+    Polls MON-VER and waits for any valid UBX frame, which can only arrive
+    if the port runs at the receiver's baud rate.
+
+    Args:
+        ser (Serial): An open port. Its buffered input is discarded.
+        timeout (float): Seconds to wait for a frame.
+
+    Returns:
+        bool: True if a frame arrived without checksum errors.
+    """
+    ser.reset_input_buffer()
+    ser.write(MON_VER_POLL)
+    framer = UBXFramer(_UntilDeadline(ser, time.monotonic() + timeout), protocols=UBX_PROTOCOL)
+    return framer.read() is not None and framer.checksum_errors == 0
+
+def uart_baudrate_msg(baud) -> bytes:
+    """
+    Returns a CFG-VALSET that sets the receiver's UART1 rate in RAM only,
+    so a rate that turns out unstable is gone after a power cycle.
+    """
+    return UBXMessage.config_set(SET_LAYER_RAM, TXN_NONE, [("CFG_UART1_BAUDRATE", baud)]).serialize()
+
+def match_receiver(port_info) -> dict | None:
+    """
+    Returns the `receiver_by_pid` entry of a serial port, or None if the
+    port does not belong to a supported receiver.
+
+    Args:
+        port_info (ListPortInfo): A port from `comports()`.
+    """
+    info = receiver_by_pid.get(port_info.pid)
+    if info is None or port_info.vid != info["vid"]:
+        return None
+    return info
+
+class ManagedSerial:
+    """
+    A serial port that outlives its receiver being unplugged.
+
+    Readers, writers and `UBXConfig` keep a reference to this object while
+    the `DeviceManager` opens and closes the underlying `Serial` as the
+    receiver disappears and re-enumerates (possibly under another device
+    path). While disconnected, reads wait up to the timeout and return no
+    data, like a quiet port, and writes are dropped.
+    """
+
+    def __init__(self, serial_number, info, port):
+        """
+        Args:
+            serial_number (str): USB serial number (or USB location if the
+                                 adapter reports none) identifying the receiver.
+            info (dict): The receiver's `receiver_by_pid` entry.
+            port (str): The current device path, e.g. /dev/ttyACM0.
+        """
+        self.serial_number = serial_number
+        self.gps_type = info["name"]
+        self.model = info["model"]
+        self.baud = info["baud"]
+        self.uart = info.get("uart", False)
+        self.max_baud = info.get("max_baud", self.baud)
+        self.failed_bauds = set()   # Rates that were unstable, never tried again
+        self.port = port
+        self.ser = None
+        self.cond = Condition()
+        self._timeout = 1
+        self.closed = False
+        self.listeners = []
+        self.connects = 0
+        self.disconnects = 0
+        self.dropped_write_bytes = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.ser is not None
+
+    @property
+    def is_open(self) -> bool:
+        return not self.closed
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._timeout = value
+        ser = self.ser
+        if ser is not None:
+            ser.timeout = value
+
+    @property
+    def baudrate(self) -> int:
+        return self.baud
+
+    @baudrate.setter
+    def baudrate(self, value):
+        """
+        Changes the host side of the link; the receiver must be switched
+        first, see `UBXConfig.set_baudrate()`.
+        """
+        self.baud = value
+        ser = self.ser
+        if ser is not None:
+            ser.baudrate = value
+
+    def add_listener(self, callback):
+        """
+        Registers `callback(device)`, called on the manager thread after the
+        receiver is reopened following a disconnect. The receiver may have
+        been power cycled, so RAM configuration should be sent again.
+        """
+        self.listeners.append(callback)
+
+    def attach(self, port):
+        """
+        Opens the receiver on `port`. Called by the `DeviceManager`.
+
+        Raises:
+            SerialException: If the port cannot be opened.
+        """
+        ser = Serial(port, self.baud, timeout=self._timeout)
+        if self.uart:
+            try:
+                ser.timeout = 0.1
+                self.baud = self._negotiate(ser)
+                ser.timeout = self._timeout
+            except Exception:
+                ser.close()
+                raise
+        with self.cond:
+            if self.closed:
+                ser.close()
+                return
+            self.ser, self.port = ser, port
+            self.connects += 1
+            self.cond.notify_all()
+        print(f"{'gps_reader':<20}: Connected to {self.gps_type} GPS {self.serial_number} on port {port} at {self.baud} baud.")
+        if self.connects > 1:
+            for callback in self.listeners:
+                try:
+                    callback(self)
+                except Exception as e:
+                    print(f"{'gps_reader':<20}: Reconnect handler failed: {e}")
+
+    def _negotiate(self, ser) -> int:
+        """
+        Finds the rate the receiver's UART runs at and raises it to the
+        highest rate up to `max_baud` that passes `STABLE_PROBES` polls.
+
+        The last working rate is probed first, so a reconnect usually takes
+        a single poll. A receiver that answers at no rate (e.g. still
+        booting) is opened at the last known rate.
+
+        Returns:
+            int: The rate both ends now use.
+
+        Raises:
+            SerialException: If the receiver stopped answering after a
+                             failed switch, so that the manager retries.
+        """
+        current = None
+        for baud in dict.fromkeys((self.baud,) + BAUD_RATES):
+            ser.baudrate = baud
+            if probe_ubx(ser):
+                current = baud
+                break
+        if current is None:
+            print(f"{'gps_reader':<20}: No UBX reply from {self.serial_number} at any baud rate, using {self.baud}")
+            ser.baudrate = self.baud
+            return self.baud
+
+        for baud in BAUD_RATES:
+            if current < baud <= self.max_baud and baud not in self.failed_bauds:
+                if self._switch(ser, current, baud):
+                    print(f"{'gps_reader':<20}: Raised {self.serial_number} from {current} to {baud} baud")
+                    return baud
+        return current
+
+    def _switch(self, ser, old, new) -> bool:
+        """
+        Switches both ends of the link from `old` to `new` baud, going back
+        to `old` if the new rate is not stable.
+        """
+        ser.write(uart_baudrate_msg(new))
+        ser.flush()
+        time.sleep(SWITCH_DELAY)
+        ser.baudrate = new
+        if all(probe_ubx(ser) for _ in range(STABLE_PROBES)):
+            return True
+        self.failed_bauds.add(new)
+        print(f"{'gps_reader':<20}: {new} baud is unstable on {self.serial_number}, staying at {old}")
+        # The receiver may have switched and just lost frames; ask it back either way
+        ser.write(uart_baudrate_msg(old))
+        ser.flush()
+        time.sleep(SWITCH_DELAY)
+        ser.baudrate = old
+        if not probe_ubx(ser):
+            raise SerialException(f"No reply from {self.serial_number} after falling back to {old} baud")
+        return False
+
+    def detach(self, reason, ser=None):
+        """
+        Closes the underlying port after an I/O error or once it disappeared.
+
+        Args:
+            reason (str | Exception): Logged with the disconnect.
+            ser (Serial): Only detach if this is still the open port, so
+                          that two threads failing at once detach it once.
+        """
+        with self.cond:
+            current = self.ser
+            if current is None or (ser is not None and ser is not current):
+                return
+            self.ser = None
+            self.disconnects += 1
+        try:
+            current.close()
+        except Exception:
+            pass
+        print(f"{'gps_reader':<20}: Lost {self.gps_type} GPS {self.serial_number} on port {self.port}: {reason}")
+
+    def wait_connected(self, timeout=None) -> bool:
+        with self.cond:
+            return self.cond.wait_for(lambda: self.ser is not None or self.closed, timeout) and self.ser is not None
+
+    def read(self, size=1) -> bytes:
+        ser = self.ser
+        if ser is None:
+            if self._timeout:
+                self.wait_connected(self._timeout)
+            return b""
+        try:
+            return ser.read(size)
+        except (SerialException, OSError, TypeError) as e:
+            # pyserial raises TypeError when the port is closed under a read
+            self.detach(e, ser)
+            return b""
+
+    @property
+    def in_waiting(self) -> int:
+        ser = self.ser
+        if ser is None:
+            return 0
+        try:
+            return ser.in_waiting
+        except (SerialException, OSError) as e:
+            self.detach(e, ser)
+            return 0
+
+    def write(self, data) -> int:
+        ser = self.ser
+        if ser is None:
+            self.dropped_write_bytes += len(data)
+            return 0
+        try:
+            return ser.write(data)
+        except (SerialException, OSError) as e:
+            self.detach(e, ser)
+            self.dropped_write_bytes += len(data)
+            return 0
+
+    def flush(self):
+        ser = self.ser
+        if ser is not None:
+            try:
+                ser.flush()
+            except (SerialException, OSError) as e:
+                self.detach(e, ser)
+
+    def fileno(self) -> int:
+        """
+        Raises:
+            SerialException: While the receiver is disconnected.
+        """
+        ser = self.ser
+        if ser is None:
+            raise SerialException(f"{self.serial_number} is disconnected")
+        return ser.fileno()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            ser, self.ser = self.ser, None
+            self.cond.notify_all()
+        if ser is not None:
+            ser.close()
+
+    def get_stats(self) -> dict:
+        return {
+            "serial_connects": self.connects,
+            "serial_disconnects": self.disconnects,
+            "serial_dropped_write_bytes": self.dropped_write_bytes,
+        }
+
+    def __repr__(self):
+        return f"ManagedSerial({self.gps_type} {self.serial_number} on {self.port})"
+
+class DeviceManager(Thread):
+    """
+    Watches the serial ports for supported receivers.
+
+    Every scan matches the ports by VID/PID and keys the receivers by USB
+    serial number, so a receiver that re-enumerates under another device
+    path is reattached to the same `ManagedSerial`. Ports that disappear
+    are closed; receivers whose port is present but cannot be opened are
+    retried with exponential backoff. Listeners are told about every
+    receiver that connects for the first time.
+    """
+
+    SCAN_INTERVAL = 1.0     # Seconds between port scans
+    BACKOFF_MIN = 1
+    BACKOFF_MAX = 60
+
+    def __init__(self):
+        super().__init__(name="device_manager", daemon=True)
+        self.devices = {}       # Serial number -> ManagedSerial, in discovery order
+        self.backoff = {}       # Serial number -> (seconds, next attempt)
+        self.announced = set()  # Serial numbers passed to the listeners
+        self.listeners = []     # (callback, serial numbers it already knows)
+        self.lock = Lock()
+        self.changed = Condition(self.lock)
+        self.stop_event = Event()
+
+    def scan(self):
+        """
+        Runs one scan: attaches new and returning receivers and detaches
+        receivers whose port has gone.
+        """
+        present = {}
+        for port_info in comports():
+            info = match_receiver(port_info)
+            if info is not None:
+                serial_number = port_info.serial_number or port_info.location or port_info.device
+                present[serial_number] = (port_info.device, info)
+
+        now = time.monotonic()
+        for serial_number, (port, info) in present.items():
+            with self.lock:
+                device = self.devices.get(serial_number)
+                if device is None:
+                    device = self.devices[serial_number] = ManagedSerial(serial_number, info, port)
+            if device.connected or device.closed:
+                continue
+            delay, next_attempt = self.backoff.get(serial_number, (0, 0))
+            if now < next_attempt:
+                continue
+            try:
+                device.attach(port)
+                self.backoff.pop(serial_number, None)
+            except Exception as e:
+                delay = min(max(delay * 2, self.BACKOFF_MIN), self.BACKOFF_MAX)
+                self.backoff[serial_number] = (delay, now + delay)
+                print(f"{'gps_reader':<20}: Error opening port {port}: {e}, retrying in {delay} s")
+                continue
+            if device.connected:
+                self._announce(device)
+
+        for serial_number, device in list(self.devices.items()):
+            if serial_number not in present and device.connected:
+                device.detach("port disappeared")
+        with self.lock:
+            self.changed.notify_all()
+
+    def _announce(self, device):
+        """
+        Passes a receiver to the listeners the first time it connects.
+        """
+        with self.lock:
+            if device.serial_number in self.announced:
+                return
+            self.announced.add(device.serial_number)
+            listeners = list(self.listeners)
+        for callback, known in listeners:
+            self._notify(callback, known, device)
+
+    @staticmethod
+    def _notify(callback, known, device):
+        if device.serial_number in known:
+            return
+        try:
+            callback(device)
+        except Exception as e:
+            print(f"{'gps_reader':<20}: New receiver handler failed: {e}")
+
+    def add_listener(self, callback, known=()):
+        """
+        Registers `callback(device)`, called on the manager thread once for
+        every receiver that connects for the first time, e.g. one plugged in
+        after startup or one whose first attach failed. Receivers that
+        already connected are passed to it right away.
+
+        Args:
+            callback (callable): Called with the new `ManagedSerial`.
+            known (list): Serial numbers the caller already handles.
+        """
+        known = set(known)
+        with self.lock:
+            self.listeners.append((callback, known))
+            missed = [device for serial_number, device in self.devices.items() if serial_number in self.announced]
+        for device in missed:
+            self._notify(callback, known, device)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"{'gps_reader':<20}: Port scan failed: {e}")
+            self.stop_event.wait(self.SCAN_INTERVAL)
+
+    def wait_for_devices(self, count=1, timeout=None) -> list[ManagedSerial]:
+        """
+        Waits until at least `count` receivers are connected.
+
+        Returns:
+            list: The connected receivers in discovery order; fewer than
+                  `count` if the timeout expired.
+        """
+        connected = lambda: [device for device in self.devices.values() if device.connected]
+        with self.changed:
+            self.changed.wait_for(lambda: len(connected()) >= count, timeout)
+            return connected()
+
+    def stop(self):
+        self.stop_event.set()
+        for device in list(self.devices.values()):
+            device.close()
+
 class GPSReader:
     """
     A generic GPS reader for u-blox devices.
 
     This class automatically detects and connects to a supported u-blox GPS
-    receiver. It iterates through the available serial ports and checks the
-    Vendor ID (VID) and Product ID (PID) to identify the device. Once a
-    matching device is found, it opens a serial connection with the appropriate
-    baud rate.
+    receiver. A shared `DeviceManager` checks the Vendor ID (VID) and
+    Product ID (PID) of the serial ports and opens matching devices with the
+    appropriate baud rate, probing and raising it for UART-connected boards. `ser` is a `ManagedSerial`, which reattaches to
+    the receiver after it is unplugged or re-enumerated, so the app does
+    not need to restart.
     """
-    
+
     ser = None
     port = None
     baud = 9600
     gps_type = None
+    serial_number = None
+    manager = None
+    manager_lock = Lock()
+    STARTUP_TIMEOUT = 10    # Seconds to wait for a receiver to appear
 
-    def __init__(self):
+    def __init__(self, device: ManagedSerial = None):
         """
-        Initializes the GPSReader and connects to the first available GPS 
-        devicebased on the VID and PID.
+        Initializes the GPSReader and connects to the first available GPS
+        device based on the VID and PID.
+
+        Args:
+            device (ManagedSerial): A specific receiver, e.g. from `GPSReader.all()`.
 
         Raises:
             RuntimeError: If no suitable serial port is found.
         """
-        # Check every available port for a matching VID and PID.
-        vid_list = [info["vid"] for info in receiver_by_pid.values()]
-        pid_list = receiver_by_pid.keys()
-        for port in comports():
-            try:
-                # print(f'Vid: {port.vid}, pid: {port.pid}')
-                if (port.vid in vid_list and port.pid in pid_list):
-                    
-                    self.port = port.device
-                    self.baud = receiver_by_pid[port.pid]["baud"]
-                    self.ser = Serial(self.port, self.baud, timeout=1)
-                    self.gps_type = receiver_by_pid[port.pid]["name"]
-                    print(f'Connected to {self.gps_type} GPS on port {self.port} at {self.baud} baud.')
-                    return
-            except Exception as e:
-                print(f"Error opening port {port.device}: {e}")
+        if device is None:
+            devices = self.start_manager().wait_for_devices(1, self.STARTUP_TIMEOUT)
+            if not devices:
+                raise RuntimeError('No serial port found')
+            device = devices[0]
+        self.ser = device
+        self.port = device.port
+        self.baud = device.baud
+        self.gps_type = device.gps_type
+        self.serial_number = device.serial_number
+
+    @classmethod
+    def start_manager(cls) -> DeviceManager:
+        """
+        Returns the shared `DeviceManager`, starting it on first use.
+        """
+        with cls.manager_lock:
+            if cls.manager is None:
+                cls.manager = DeviceManager()
+                cls.manager.scan()
+                cls.manager.start()
+            return cls.manager
 
-        if self.ser is None:
+    @classmethod
+    def all(cls, timeout=STARTUP_TIMEOUT) -> list["GPSReader"]:
+        """
+        Returns a reader for every connected receiver, the first one
+        discovered first. Receivers plugged in later are passed to the
+        callbacks of `watch()` instead.
+
+        Raises:
+            RuntimeError: If no suitable serial port is found.
+        """
+        devices = cls.start_manager().wait_for_devices(1, timeout)
+        if not devices:
             raise RuntimeError('No serial port found')
+        return [cls(device) for device in devices]
+
+    @classmethod
+    def watch(cls, callback, known=()):
+        """
+        Calls `callback(reader)` with a new `GPSReader` for every receiver
+        that connects and is not one of `known`, also later on. Runs on the
+        device manager thread, so the callback must not block.
+
+        Args:
+            callback (callable): Called with the new reader.
+            known (list): The readers the caller already handles, e.g. from `all()`.
+        """
+        cls.start_manager().add_listener(lambda device: callback(cls(device)), [reader.serial_number for reader in known])
 
     def get_nav_pvt_config(self, uart=False) -> UBXMessage:
         """
@@ -87,7 +594,7 @@ class GPSReader:
                 msgID=0x07,        # PVT (Position Velocity Time Solution)
                 rateUSB=1,         # Enable on USB
             )
-        
+
     def close_serial(self):
         """
         Closes the serial connection if it is open.
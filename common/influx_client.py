@@ -1,83 +1,786 @@
+import asyncio
+import gzip
+import ssl
+import sys
 import os
 import time
-from threading import Thread, Lock
+from collections import deque
+from urllib.parse import urlsplit
+from threading import Thread, Lock, Condition
 
 import dotenv
 import requests
 from influxdb_client_3 import Point
 
+try:
+    from common.influx_spool import InfluxSpool, DELIVERED, RETRY, REJECTED
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+    from influx_spool import InfluxSpool, DELIVERED, RETRY, REJECTED
+
+# Overflow policies for the in-memory batch buffer.
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+BLOCK = "block"
+
+def write_endpoint() -> tuple[str, dict]:
+    """
+    Reads the Lighthouse credentials from the environment.
+
+    Returns:
+        tuple: The `write_lp` URL and the headers every write must carry.
+    """
+    dotenv.load_dotenv()
+    LIGHTHOUSE_ADMIN_PASSWORD = os.getenv("LIGHTHOUSE_ADMIN_PASSWORD")
+    if not LIGHTHOUSE_ADMIN_PASSWORD.startswith("apiv3_"):
+        LIGHTHOUSE_ADMIN_PASSWORD = "apiv3_" + LIGHTHOUSE_ADMIN_PASSWORD
+    # INFLUX_WRITE_URL overrides the endpoint, e.g. to point at the replay harness stub
+    url = os.getenv("INFLUX_WRITE_URL") or \
+        f"https://{os.getenv('LIGHTHOUSE_HOSTNAME')}/influx/api/v3/write_lp?db=GPS&precision=nanosecond"
+    headers = {
+        "Authorization": f"Token {LIGHTHOUSE_ADMIN_PASSWORD}",
+        "Content-Type": "text/plain; charset=utf-8",
+        "Content-Encoding": "gzip",
+    }
+    return url, headers
+
 class InfluxWriter:
+    """
+    Writes line protocol records to the Lighthouse InfluxDB instance.
+
+    Records are serialized on the caller's thread into a bounded in-memory
+    buffer. A single long-lived flusher thread owns a keep-alive HTTP session
+    and flushes the buffer whenever the pending batch reaches a record count,
+    byte size or age threshold, whichever comes first. Payloads are
+    gzip-compressed before they are posted, and the flusher keeps latency and
+    byte counters so the savings on cellular links can be observed through
+    `get_stats()`.
+
+    With `enable_spool()`, payloads that fail to post are written to an
+    on-disk spool and replayed once the Lighthouse answers again.
+    """
+
+    BATCH_MAX_RECORDS = 500         # Flush once this many records are pending
+    BATCH_MAX_BYTES = 64 * 1024     # Flush once this many bytes are pending
+    BATCH_FLUSH_TIME = 0.2          # Flush once the oldest record is this old (s)
+    BUFFER_MAX_RECORDS = 10000      # Records held in memory before overflow
+    OVERFLOW_POLICY = DROP_OLDEST
+    WRITE_TIMEOUT = 10              # Seconds per HTTP request
+    GZIP_LEVEL = 6
+
+    _batch_cond = Condition()
+    _batch = deque()                # (enqueue time, line) pairs
+    _batch_bytes = 0
+    _flush_requested = False
+    _in_flight = False
+    _closing = False
+
+    _start_lock = Lock()
+    _flusher_thread = None
+    _session = None
+    _url = None
+    _spool = None
+
+    stats_lock = Lock()
+    stats = {
+        "flushes": 0,
+        "flush_errors": 0,
+        "flush_size": 0,
+        "flush_bytes": 0,
+        "flush_age": 0,
+        "flush_manual": 0,
+        "dropped_records": 0,
+        "records_sent": 0,
+        "bytes_raw": 0,
+        "bytes_sent": 0,
+        "last_flush_latency_s": 0.0,
+        "max_flush_latency_s": 0.0,
+        "total_flush_latency_s": 0.0,
+    }
 
-    batch_lock = Lock()
-    batch_records = []
-    batch_last_flush = 0
-    
     @classmethod
-    def sync_write(cls, records):   
+    def configure(cls, max_batch_records=None, max_batch_bytes=None, max_batch_age=None,
+                  max_buffered_records=None, overflow_policy=None):
         """
-        Worker function to write records to InfluxDB.
+        Overrides the flush thresholds and buffer limits.
 
         Args:
-            records (Point or list): A single Point or a list of Points to write
-                                    to InfluxDB.
-        """
-        dotenv.load_dotenv()
-        LIGHTHOUSE_ADMIN_PASSWORD = os.getenv("LIGHTHOUSE_ADMIN_PASSWORD")
-        if not LIGHTHOUSE_ADMIN_PASSWORD.startswith("apiv3_"):
-            LIGHTHOUSE_ADMIN_PASSWORD = "apiv3_" + LIGHTHOUSE_ADMIN_PASSWORD
-        url = f"https://{os.getenv('LIGHTHOUSE_HOSTNAME')}/influx/api/v3/write_lp?db=GPS&precision=nanosecond"
-        headers = {
-            "Authorization": f"Token {LIGHTHOUSE_ADMIN_PASSWORD}",
-            "Content-Type": "text/plain; charset=utf-8"
-        }
-        try:
-            if type(records) is list:
-                payload = "\n".join([record.to_line_protocol() for record in records])
-            elif type(records) is Point:
-                payload = records.to_line_protocol()
+            max_batch_records (int): Flush once this many records are pending.
+            max_batch_bytes (int): Flush once this many bytes are pending.
+            max_batch_age (float): Flush once the oldest pending record is this
+                                   many seconds old.
+            max_buffered_records (int): Maximum records held in memory.
+            overflow_policy (str): One of "drop-oldest", "drop-newest" or "block".
+
+        Raises:
+            ValueError: If the overflow policy is unknown.
+        """
+        if overflow_policy is not None and overflow_policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        with cls._batch_cond:
+            if max_batch_records is not None:
+                cls.BATCH_MAX_RECORDS = max_batch_records
+            if max_batch_bytes is not None:
+                cls.BATCH_MAX_BYTES = max_batch_bytes
+            if max_batch_age is not None:
+                cls.BATCH_FLUSH_TIME = max_batch_age
+            if max_buffered_records is not None:
+                cls.BUFFER_MAX_RECORDS = max_buffered_records
+            if overflow_policy is not None:
+                cls.OVERFLOW_POLICY = overflow_policy
+            cls._batch_cond.notify_all()
+
+    @classmethod
+    def enable_spool(cls, directory="./shared/influx_spool", segment_max_bytes=1024 * 1024,
+                     max_total_bytes=64 * 1024 * 1024, replay_bytes_per_s=64 * 1024):
+        """
+        Spools undeliverable payloads to disk and replays them when the
+        Lighthouse becomes reachable again.
+
+        Args:
+            directory (str): Directory that holds the spool segment files.
+            segment_max_bytes (int): Size at which a segment is rotated.
+            max_total_bytes (int): Cap on the total on-disk spool size.
+            replay_bytes_per_s (int): Replay rate limit in uncompressed bytes/s.
+        """
+        with cls._start_lock:
+            if cls._spool is None:
+                cls._spool = InfluxSpool(
+                    lambda payload, num_records: cls._send(payload, num_records, spool=False),
+                    directory=directory,
+                    segment_max_bytes=segment_max_bytes,
+                    max_total_bytes=max_total_bytes,
+                    replay_bytes_per_s=replay_bytes_per_s,
+                )
+
+    @classmethod
+    def _load_config(cls):
+        """
+        Reads the Lighthouse credentials once and opens the keep-alive session.
+        """
+        with cls._start_lock:
+            if cls._session is not None:
+                return
+            cls._url, headers = write_endpoint()
+            session = requests.Session()
+            session.headers.update(headers)
+            cls._session = session
+
+    @classmethod
+    def _start_flusher(cls):
+        """
+        Starts the background flusher thread if it is not already running.
+        """
+        with cls._start_lock:
+            if cls._flusher_thread is None or not cls._flusher_thread.is_alive():
+                with cls._batch_cond:
+                    cls._closing = False
+                cls._flusher_thread = Thread(target=cls._flush_loop, name="influx_flusher", daemon=True)
+                cls._flusher_thread.start()
+
+    @staticmethod
+    def _encode_lines(records) -> list[bytes] | None:
+        """
+        Serializes records to individual line protocol lines. Lines without
+        a timestamp get the current time, so that rows spooled during an
+        outage keep the time they were written instead of their replay time.
+
+        Args:
+            records (Point, bytes or list): A single Point or pre-encoded line,
+                                            or a list of them.
+
+        Returns:
+            list: UTF-8 encoded lines, or None if the record type is not supported.
+        """
+        if type(records) is not list:
+            records = [records]
+        now_ns = b" %d" % time.time_ns()
+        lines = []
+        for record in records:
+            if type(record) is bytes:
+                line = record
+            elif type(record) is Point:
+                line = record.to_line_protocol().encode("utf-8")
             else:
                 print(f"{'influx_writer':<20}: Invalid record type for InfluxDB write.")
-                return
-            response = requests.post(url, headers=headers, data=payload)
-            if response.status_code != 204:
+                return None
+            if line:
+                # The timestamp is the only element after the fields that is all digits
+                lines.append(line if line.rpartition(b" ")[2].isdigit() else line + now_ns)
+        return lines
+
+    @classmethod
+    def _post(cls, payload, num_records, spool=True) -> bool:
+        """
+        Compresses and posts a payload over the shared session.
+
+        Args:
+            payload (bytes): Line protocol payload.
+            num_records (int): Number of records contained in the payload.
+            spool (bool): Whether to spool the payload if the write fails for
+                          a reason that may clear up (network or server error).
+
+        Returns:
+            bool: True if InfluxDB accepted the write.
+        """
+        return cls._send(payload, num_records, spool) == DELIVERED
+
+    @classmethod
+    def _send(cls, payload, num_records, spool=True) -> str:
+        """
+        Like `_post()`, but tells a failure that may clear up from a rejected payload.
+
+        Returns:
+            str: `DELIVERED`, `RETRY` or `REJECTED`.
+        """
+        body = gzip.compress(payload, compresslevel=cls.GZIP_LEVEL)
+        start = time.perf_counter()
+        retryable = True
+        try:
+            # Missing credentials fail the write like a network error instead of the flusher thread
+            cls._load_config()
+            response = cls._session.post(cls._url, data=body, timeout=cls.WRITE_TIMEOUT)
+            ok = response.status_code == 204
+            if not ok:
+                retryable = response.status_code >= 500 or response.status_code in (408, 429)
                 print(f"{'influx_writer':<20}: Influx write error: {response.status_code} - {response.text}")
-                return
-            print(f"{'influx_writer':<20}: InfluxDB write successful. {len(payload.encode(encoding='utf-8'))} bytes sent.")
         except Exception as err:
+            ok = False
             print(f"{'influx_writer':<20}: InfluxDB write error: {err}")
+        latency = time.perf_counter() - start
+        if ok:
+            print(f"{'influx_writer':<20}: InfluxDB write successful. {len(body)} bytes sent ({len(payload)} uncompressed) in {latency*1000:.0f} ms.")
+            if cls._spool is not None:
+                cls._spool.notify_online()
+        elif spool and retryable and cls._spool is not None:
+            cls._spool.append(payload)
+
+        with cls.stats_lock:
+            cls.stats["last_flush_latency_s"] = latency
+            cls.stats["max_flush_latency_s"] = max(cls.stats["max_flush_latency_s"], latency)
+            cls.stats["total_flush_latency_s"] += latency
+            if ok:
+                cls.stats["flushes"] += 1
+                cls.stats["records_sent"] += num_records
+                cls.stats["bytes_raw"] += len(payload)
+                cls.stats["bytes_sent"] += len(body)
+            else:
+                cls.stats["flush_errors"] += 1
+        return DELIVERED if ok else RETRY if retryable else REJECTED
+
+    @classmethod
+    def _flush_reason(cls) -> str | None:
+        """
+        Returns why the pending batch should be flushed now, if at all.
+        Must be called with `_batch_cond` held.
+        """
+        if not cls._batch:
+            return None
+        if cls._flush_requested or cls._closing:
+            return "manual"
+        if len(cls._batch) >= cls.BATCH_MAX_RECORDS:
+            return "size"
+        if cls._batch_bytes >= cls.BATCH_MAX_BYTES:
+            return "bytes"
+        if time.monotonic() - cls._batch[0][0] >= cls.BATCH_FLUSH_TIME:
+            return "age"
+        return None
+
+    @classmethod
+    def _take_batch(cls) -> list[bytes]:
+        """
+        Removes up to one batch worth of lines from the buffer.
+        Must be called with `_batch_cond` held.
+        """
+        lines = []
+        num_bytes = 0
+        while cls._batch and len(lines) < cls.BATCH_MAX_RECORDS and num_bytes < cls.BATCH_MAX_BYTES:
+            _, line = cls._batch.popleft()
+            lines.append(line)
+            num_bytes += len(line) + 1
+        cls._batch_bytes -= num_bytes
+        if not cls._batch:
+            cls._flush_requested = False
+        return lines
+
+    @classmethod
+    def _flush_loop(cls):
+        """
+        Waits for a flush threshold to trip and posts the pending batch.
+        Exits once `close()` has been called and the buffer is empty.
+        """
+        while True:
+            with cls._batch_cond:
+                reason = cls._flush_reason()
+                while reason is None:
+                    if cls._closing:
+                        return
+                    timeout = None
+                    if cls._batch:
+                        timeout = max(0.0, cls._batch[0][0] + cls.BATCH_FLUSH_TIME - time.monotonic())
+                    cls._batch_cond.wait(timeout)
+                    reason = cls._flush_reason()
+                lines = cls._take_batch()
+                cls._in_flight = True
+                cls._batch_cond.notify_all()
+            try:
+                cls._post(b"\n".join(lines), len(lines))
+            finally:
+                with cls.stats_lock:
+                    cls.stats[f"flush_{reason}"] += 1
+                with cls._batch_cond:
+                    cls._in_flight = False
+                    cls._batch_cond.notify_all()
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        """
+        Returns a snapshot of the writer counters.
+
+        Returns:
+            dict: Flush counts by trigger, dropped records, latency and
+                  raw/compressed byte totals, plus the derived mean latency,
+                  compression ratio, current buffer occupancy and, when the
+                  spool is enabled, its counters prefixed with "spool_".
+        """
+        with cls.stats_lock:
+            stats = dict(cls.stats)
+        attempts = stats["flushes"] + stats["flush_errors"]
+        stats["mean_flush_latency_s"] = stats["total_flush_latency_s"] / attempts if attempts else 0.0
+        stats["compression_ratio"] = stats["bytes_raw"] / stats["bytes_sent"] if stats["bytes_sent"] else 0.0
+        with cls._batch_cond:
+            stats["buffered_records"] = len(cls._batch)
+            stats["buffered_bytes"] = cls._batch_bytes
+        if cls._spool is not None:
+            for key, value in cls._spool.get_stats().items():
+                stats[f"spool_{key}"] = value
+        return stats
+
+    @classmethod
+    def sync_write(cls, records) -> bool:
+        """
+        Writes records to InfluxDB on the calling thread, bypassing the buffer.
+
+        Args:
+            records (Point, bytes or list): A single Point or pre-encoded line,
+                                            or a list of them.
+
+        Returns:
+            bool: True if the write was accepted.
+        """
+        lines = cls._encode_lines(records)
+        if not lines:
+            return False
+        return cls._post(b"\n".join(lines), len(lines))
 
     @classmethod
     def async_write(cls, records):
         """
-        Initiates a background thread to write records to InfluxDB.
-        
+        Buffers records and asks the flusher to send them immediately.
+
         Args:
-            records (Point or list): A single Point or a list of Points to write
-                                    to InfluxDB.
+            records (Point, bytes or list): A single Point or pre-encoded line,
+                                            or a list of them.
         """
-        Thread(target=cls.sync_write, args=(records,), daemon=True).start()
+        cls.batch_write(records)
+        with cls._batch_cond:
+            cls._flush_requested = True
+            cls._batch_cond.notify_all()
 
     @classmethod
     def batch_write(cls, records):
         """
-        Adds records to a shared batch and flushes every second.
-        
+        Adds records to the shared buffer. The flusher thread sends them once
+        the batch size, byte or age threshold is reached.
+
+        When the buffer is full the configured overflow policy applies:
+        "drop-oldest" discards the oldest buffered record, "drop-newest"
+        discards the incoming record and "block" waits for the flusher to
+        make room.
+
         Args:
-            records (list): A list of Points to add to the batch.
+            records (Point, bytes or list): A single Point or pre-encoded line,
+                                            or a list of them.
         """
+        lines = cls._encode_lines(records)
+        if not lines:
+            return
+        cls._start_flusher()
 
-        BATCH_FLUSH_TIME = 0.2
+        dropped = 0
+        with cls._batch_cond:
+            for line in lines:
+                if len(cls._batch) >= cls.BUFFER_MAX_RECORDS:
+                    if cls.OVERFLOW_POLICY == DROP_NEWEST:
+                        dropped += 1
+                        continue
+                    elif cls.OVERFLOW_POLICY == BLOCK:
+                        while len(cls._batch) >= cls.BUFFER_MAX_RECORDS and not cls._closing:
+                            cls._batch_cond.notify_all()
+                            cls._batch_cond.wait()
+                    else:
+                        _, oldest = cls._batch.popleft()
+                        cls._batch_bytes -= len(oldest) + 1
+                        dropped += 1
+                cls._batch.append((time.monotonic(), line))
+                cls._batch_bytes += len(line) + 1
+            cls._batch_cond.notify_all()
 
-        if not isinstance(records, list):
-            records = [records]
+        if dropped:
+            with cls.stats_lock:
+                cls.stats["dropped_records"] += dropped
+
+    @classmethod
+    def flush(cls, timeout=None) -> bool:
+        """
+        Sends everything currently buffered and waits for it to complete.
+
+        Args:
+            timeout (float): Maximum seconds to wait, or None to wait forever.
+
+        Returns:
+            bool: True if the buffer was drained within the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with cls._batch_cond:
+            if not cls._batch and not cls._in_flight:
+                return True
+            cls._flush_requested = True
+            cls._batch_cond.notify_all()
+            while cls._batch or cls._in_flight:
+                if cls._flusher_thread is None or not cls._flusher_thread.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                cls._batch_cond.wait(remaining)
+        return True
+
+    @classmethod
+    def close(cls, timeout=10):
+        """
+        Flushes the buffer and stops the flusher thread. Call this from the
+        application shutdown path so the tail of a session is not lost.
+
+        Args:
+            timeout (float): Maximum seconds to wait for the final flush.
+        """
+        print(f"{'influx_writer':<20}: Flushing {len(cls._batch)} buffered records before exit...")
+        if not cls.flush(timeout):
+            print(f"{'influx_writer':<20}: Timed out flushing, {len(cls._batch)} records were not sent.")
+        with cls._batch_cond:
+            cls._closing = True
+            cls._batch_cond.notify_all()
+        if cls._flusher_thread is not None:
+            cls._flusher_thread.join(timeout)
+
+class AsyncInfluxWriter:
+    """
+    Asyncio counterpart of `InfluxWriter` for runtimes that run everything
+    on one event loop.
 
-        with cls.batch_lock:
-            cls.batch_records.extend(records)
-            new_time = time.time()
-            if cls.batch_last_flush == 0:
-                cls.batch_last_flush = new_time
-            elif new_time >= cls.batch_last_flush + BATCH_FLUSH_TIME:
-                cls.batch_last_flush = new_time
-                batch_to_write = cls.batch_records
-                cls.batch_records = []
-                cls.async_write(batch_to_write)
\ No newline at end of file
+    Records are buffered by `batch_write()` on the loop thread and flushed
+    by the `run()` task under the same record count, byte size and age
+    thresholds as `InfluxWriter`. Payloads are gzip-compressed and posted
+    over a single keep-alive HTTP/1.1 connection opened with asyncio
+    streams, so no flusher thread or `requests` session is needed. The
+    connection is re-established on the next flush after any error, and
+    a write on a reused connection that the server closed while it was
+    idle is sent once more on a new one.
+    """
+
+    def __init__(self, max_batch_records=InfluxWriter.BATCH_MAX_RECORDS, max_batch_bytes=InfluxWriter.BATCH_MAX_BYTES,
+                 max_batch_age=InfluxWriter.BATCH_FLUSH_TIME, max_buffered_records=InfluxWriter.BUFFER_MAX_RECORDS):
+        """
+        Args:
+            max_batch_records (int): Flush once this many records are pending.
+            max_batch_bytes (int): Flush once this many bytes are pending.
+            max_batch_age (float): Flush once the oldest pending record is this
+                                   many seconds old.
+            max_buffered_records (int): Records held before the oldest is dropped.
+        """
+        self.max_batch_records = max_batch_records
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_age = max_batch_age
+        self.max_buffered_records = max_buffered_records
+
+        self.batch = deque()        # (enqueue time, line) pairs
+        self.batch_bytes = 0
+        self.wakeup = asyncio.Event()
+        self.flushed = asyncio.Event()
+        self.flush_requested = False
+        self.closing = False
+        self.url = None
+        self.headers = None
+        self.reader = None
+        self.writer = None
+        self.loop = None
+        self.spool = None
+        self.spool_args = None
+        self.stats = {key: 0 for key in InfluxWriter.stats}
+        for key in ("last_flush_latency_s", "max_flush_latency_s", "total_flush_latency_s"):
+            self.stats[key] = 0.0
+
+    def enable_spool(self, directory="./shared/influx_spool", segment_max_bytes=1024 * 1024,
+                     max_total_bytes=64 * 1024 * 1024, replay_bytes_per_s=64 * 1024):
+        """
+        Spools undeliverable payloads to disk like `InfluxWriter.enable_spool()`.
+        The spool is opened once `run()` has started; its replay thread posts
+        through this writer's connection on the event loop.
+        """
+        self.spool_args = {
+            "directory": directory,
+            "segment_max_bytes": segment_max_bytes,
+            "max_total_bytes": max_total_bytes,
+            "replay_bytes_per_s": replay_bytes_per_s,
+        }
+
+    def _replay_post(self, payload, num_records) -> str:
+        """
+        Posts a spooled payload from the spool's replay thread.
+
+        Returns:
+            str: `DELIVERED`, `RETRY` or `REJECTED`.
+        """
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._send(payload, num_records, spool=False), self.loop)
+            return future.result(InfluxWriter.WRITE_TIMEOUT * 2)
+        except Exception:
+            return RETRY
+
+    def batch_write(self, records):
+        """
+        Adds records to the buffer. Must be called on the event loop thread.
+        When the buffer is full the oldest records are dropped.
+
+        Args:
+            records (Point, bytes or list): A single Point or pre-encoded line,
+                                            or a list of them.
+        """
+        lines = InfluxWriter._encode_lines(records)
+        if not lines:
+            return
+        now = time.monotonic()
+        for line in lines:
+            if len(self.batch) >= self.max_buffered_records:
+                _, oldest = self.batch.popleft()
+                self.batch_bytes -= len(oldest) + 1
+                self.stats["dropped_records"] += 1
+            self.batch.append((now, line))
+            self.batch_bytes += len(line) + 1
+        if len(self.batch) >= self.max_batch_records or self.batch_bytes >= self.max_batch_bytes:
+            self.wakeup.set()
+
+    def _flush_reason(self) -> str | None:
+        if not self.batch:
+            return None
+        if self.flush_requested or self.closing:
+            return "manual"
+        if len(self.batch) >= self.max_batch_records:
+            return "size"
+        if self.batch_bytes >= self.max_batch_bytes:
+            return "bytes"
+        if time.monotonic() - self.batch[0][0] >= self.max_batch_age:
+            return "age"
+        return None
+
+    def _take_batch(self) -> list[bytes]:
+        lines = []
+        num_bytes = 0
+        while self.batch and len(lines) < self.max_batch_records and num_bytes < self.max_batch_bytes:
+            _, line = self.batch.popleft()
+            lines.append(line)
+            num_bytes += len(line) + 1
+        self.batch_bytes -= num_bytes
+        if not self.batch:
+            self.flush_requested = False
+        return lines
+
+    async def run(self):
+        """
+        Flushes the buffer whenever a threshold trips. Returns once `close()`
+        has been called and the buffer is empty.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.url, self.headers = write_endpoint()
+        if self.spool_args is not None and self.spool is None:
+            self.spool = InfluxSpool(self._replay_post, **self.spool_args)
+        try:
+            while True:
+                reason = self._flush_reason()
+                while reason is None:
+                    if self.closing:
+                        return
+                    self.flushed.set()
+                    timeout = None
+                    if self.batch:
+                        timeout = max(0.0, self.batch[0][0] + self.max_batch_age - time.monotonic())
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    reason = self._flush_reason()
+                self.flushed.clear()
+                lines = self._take_batch()
+                await self._post(b"\n".join(lines), len(lines))
+                self.stats[f"flush_{reason}"] += 1
+        finally:
+            self.flushed.set()
+            self._disconnect()
+
+    async def flush(self, timeout=None) -> bool:
+        """
+        Sends everything currently buffered and waits for it to complete.
+
+        Returns:
+            bool: True if the buffer was drained within the timeout.
+        """
+        if not self.batch and self.flushed.is_set():
+            return True
+        self.flush_requested = True
+        self.flushed.clear()
+        self.wakeup.set()
+        try:
+            await asyncio.wait_for(self.flushed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return not self.batch
+
+    async def close(self, timeout=10):
+        """
+        Flushes the buffer and lets `run()` return.
+        """
+        print(f"{'influx_writer':<20}: Flushing {len(self.batch)} buffered records before exit...")
+        if not await self.flush(timeout):
+            print(f"{'influx_writer':<20}: Timed out flushing, {len(self.batch)} records were not sent.")
+        self.closing = True
+        self.wakeup.set()
+
+    async def _connect(self):
+        url = urlsplit(self.url)
+        secure = url.scheme == "https"
+        self.reader, self.writer = await asyncio.open_connection(
+            url.hostname, url.port or (443 if secure else 80),
+            ssl=ssl.create_default_context() if secure else None,
+        )
+
+    def _disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def _request(self, body) -> tuple[int, bytes, bool]:
+        """
+        Sends one POST on the open connection and reads the response.
+
+        Returns:
+            tuple: Status code, response body and whether the server keeps
+                   the connection open.
+        """
+        url = urlsplit(self.url)
+        head = [f"POST {url.path}?{url.query} HTTP/1.1", f"Host: {url.netloc}", f"Content-Length: {len(body)}"]
+        head += [f"{name}: {value}" for name, value in self.headers.items()]
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by the server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            content = b""
+            while size := int((await self.reader.readline()).split(b";")[0], 16):
+                content += await self.reader.readexactly(size)
+                await self.reader.readline()
+            await self.reader.readline()
+        else:
+            content = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        return status, content, headers.get("connection", "").lower() != "close"
+
+    async def _post(self, payload, num_records, spool=True) -> bool:
+        """
+        Compresses and posts a payload over the shared connection.
+
+        Args:
+            payload (bytes): Line protocol payload.
+            num_records (int): Number of records contained in the payload.
+            spool (bool): Whether to spool the payload if the write fails for
+                          a reason that may clear up (network or server error).
+
+        Returns:
+            bool: True if InfluxDB accepted the write.
+        """
+        return await self._send(payload, num_records, spool) == DELIVERED
+
+    async def _send(self, payload, num_records, spool=True) -> str:
+        """
+        Like `_post()`, but tells a failure that may clear up from a rejected payload.
+
+        Returns:
+            str: `DELIVERED`, `RETRY` or `REJECTED`.
+        """
+        body = gzip.compress(payload, compresslevel=InfluxWriter.GZIP_LEVEL)
+        start = time.perf_counter()
+        retryable = True
+        try:
+            reused = self.writer is not None and not self.writer.is_closing()
+            if not reused:
+                await asyncio.wait_for(self._connect(), InfluxWriter.WRITE_TIMEOUT)
+            try:
+                status, content, keep_alive = await asyncio.wait_for(self._request(body), InfluxWriter.WRITE_TIMEOUT)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                # The server closed the idle keep-alive connection, retry once on a fresh one
+                self._disconnect()
+                await asyncio.wait_for(self._connect(), InfluxWriter.WRITE_TIMEOUT)
+                status, content, keep_alive = await asyncio.wait_for(self._request(body), InfluxWriter.WRITE_TIMEOUT)
+            if not keep_alive:
+                self._disconnect()
+            ok = status == 204
+            if not ok:
+                retryable = status >= 500 or status in (408, 429)
+                print(f"{'influx_writer':<20}: Influx write error: {status} - {content.decode(errors='replace')}")
+        except Exception as err:
+            ok = False
+            self._disconnect()
+            print(f"{'influx_writer':<20}: InfluxDB write error: {err!r}")
+        latency = time.perf_counter() - start
+        if ok:
+            print(f"{'influx_writer':<20}: InfluxDB write successful. {len(body)} bytes sent ({len(payload)} uncompressed) in {latency*1000:.0f} ms.")
+            if self.spool is not None:
+                self.spool.notify_online()
+        elif spool and retryable and self.spool is not None:
+            self.spool.append(payload)
+
+        self.stats["last_flush_latency_s"] = latency
+        self.stats["max_flush_latency_s"] = max(self.stats["max_flush_latency_s"], latency)
+        self.stats["total_flush_latency_s"] += latency
+        if ok:
+            self.stats["flushes"] += 1
+            self.stats["records_sent"] += num_records
+            self.stats["bytes_raw"] += len(payload)
+            self.stats["bytes_sent"] += len(body)
+        else:
+            self.stats["flush_errors"] += 1
+        return DELIVERED if ok else RETRY if retryable else REJECTED
+
+    def get_stats(self) -> dict:
+        """
+        Returns the same counters as `InfluxWriter.get_stats()`.
+        """
+        stats = dict(self.stats)
+        attempts = stats["flushes"] + stats["flush_errors"]
+        stats["mean_flush_latency_s"] = stats["total_flush_latency_s"] / attempts if attempts else 0.0
+        stats["compression_ratio"] = stats["bytes_raw"] / stats["bytes_sent"] if stats["bytes_sent"] else 0.0
+        stats["buffered_records"] = len(self.batch)
+        stats["buffered_bytes"] = self.batch_bytes
+        if self.spool is not None:
+            for key, value in self.spool.get_stats().items():
+                stats[f"spool_{key}"] = value
+        return stats
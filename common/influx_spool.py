@@ -0,0 +1,267 @@
+import os
+import re
+import struct
+import time
+from threading import Thread, Lock, Event
+
+# Each spooled payload is stored as a little-endian length prefix followed by
+# the uncompressed line protocol bytes.
+RECORD_HEADER = struct.Struct("<I")
+SEGMENT_PATTERN = re.compile(r"spool-(\d{10})\.lp")
+QUARANTINE_FILE = "quarantine.lp"
+
+# Outcomes of posting a spooled payload
+DELIVERED = "delivered"
+RETRY = "retry"             # The Lighthouse is unreachable or failed, try again later
+REJECTED = "rejected"       # InfluxDB refused the payload itself, e.g. a parse error
+
+MAX_REPLAY_ATTEMPTS = 5     # Failed posts of one payload before it is quarantined
+
+class InfluxSpool:
+    """
+    Disk-backed write-ahead spool for line protocol payloads.
+
+    Payloads that could not be delivered are appended to size-limited segment
+    files. Once the Lighthouse accepts writes again, a background replay
+    thread posts the spooled payloads in their original order at a limited
+    rate, deleting each segment once it has been fully delivered. When the
+    total spool size exceeds its cap the oldest segments are discarded.
+
+    A payload that InfluxDB rejects, or that failed `MAX_REPLAY_ATTEMPTS`
+    times, is moved to a quarantine file so it does not block the payloads
+    spooled behind it.
+    """
+
+    def __init__(self, post, directory="./shared/influx_spool", segment_max_bytes=1024 * 1024,
+                 max_total_bytes=64 * 1024 * 1024, replay_bytes_per_s=64 * 1024):
+        """
+        Initializes the spool and recovers segments left by a previous run.
+
+        Args:
+            post (callable): Function taking (payload, num_records) that
+                             returns `DELIVERED`, `RETRY` or `REJECTED`.
+            directory (str): Directory that holds the segment files.
+            segment_max_bytes (int): Size at which the active segment is rotated.
+            max_total_bytes (int): Cap on the total size of all segments.
+            replay_bytes_per_s (int): Replay rate limit in uncompressed bytes/s.
+        """
+        self.post = post
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.replay_bytes_per_s = replay_bytes_per_s
+
+        self.lock = Lock()
+        self.online_event = Event()
+        self.segments = []          # Sequence numbers, oldest first
+        self.segment_sizes = {}
+        self.active_file = None
+        self.active_seq = None
+        self.replay_offset = 0      # Bytes already delivered from the oldest segment
+        self.replay_attempts = 0    # Failed posts of the record at replay_offset
+        self.stats = {
+            "spooled_payloads": 0,
+            "spooled_bytes": 0,
+            "dropped_bytes": 0,
+            "replayed_payloads": 0,
+            "replayed_bytes": 0,
+            "quarantined_payloads": 0,
+            "replay_throughput_bps": 0.0,
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name in sorted(os.listdir(self.directory)):
+            match = SEGMENT_PATTERN.fullmatch(name)
+            if match:
+                seq = int(match.group(1))
+                self.segments.append(seq)
+                self.segment_sizes[seq] = os.path.getsize(self._segment_path(seq))
+        if self.segments:
+            print(f"{'influx_spool':<20}: Recovered {len(self.segments)} segments ({self.pending_bytes()} bytes) awaiting replay.")
+
+        self.replay_thread = Thread(target=self._replay_loop, name="influx_replay", daemon=True)
+        self.replay_thread.start()
+
+    def _segment_path(self, seq) -> str:
+        return os.path.join(self.directory, f"spool-{seq:010d}.lp")
+
+    def pending_bytes(self) -> int:
+        """
+        Returns the number of bytes currently held on disk.
+        """
+        with self.lock:
+            return sum(self.segment_sizes.values())
+
+    def _rotate(self):
+        """
+        Closes the active segment so the next append starts a new one.
+        Must be called with `lock` held.
+        """
+        if self.active_file is not None:
+            self.active_file.close()
+            self.active_file = None
+            self.active_seq = None
+
+    def _enforce_cap(self):
+        """
+        Deletes the oldest segments until the spool is within its size cap.
+        Must be called with `lock` held.
+        """
+        while sum(self.segment_sizes.values()) > self.max_total_bytes and len(self.segments) > 1:
+            seq = self.segments.pop(0)
+            size = self.segment_sizes.pop(seq)
+            self.stats["dropped_bytes"] += size - self.replay_offset
+            self.replay_offset = 0
+            self.replay_attempts = 0
+            try:
+                os.remove(self._segment_path(seq))
+            except OSError as e:
+                print(f"{'influx_spool':<20}: Could not remove segment {seq}: {e}")
+            print(f"{'influx_spool':<20}: Spool over {self.max_total_bytes} bytes, discarded oldest segment {seq}.")
+
+    def append(self, payload):
+        """
+        Appends an undelivered payload to the active segment.
+
+        Args:
+            payload (bytes): Uncompressed line protocol payload.
+        """
+        with self.lock:
+            if self.active_file is None or self.segment_sizes[self.active_seq] >= self.segment_max_bytes:
+                self._rotate()
+                self.active_seq = self.segments[-1] + 1 if self.segments else 0
+                self.active_file = open(self._segment_path(self.active_seq), "ab")
+                self.segments.append(self.active_seq)
+                self.segment_sizes[self.active_seq] = 0
+            record = RECORD_HEADER.pack(len(payload)) + payload
+            self.active_file.write(record)
+            self.active_file.flush()
+            self.segment_sizes[self.active_seq] += len(record)
+            self.stats["spooled_payloads"] += 1
+            self.stats["spooled_bytes"] += len(payload)
+            self._enforce_cap()
+
+    def notify_online(self):
+        """
+        Signals that the Lighthouse accepted a write so replay can begin.
+        """
+        if self.segments:
+            self.online_event.set()
+
+    def _next_record(self):
+        """
+        Reads the next undelivered record from the oldest segment.
+
+        Returns:
+            tuple: (segment sequence, offset after the record, payload), or None
+                   if the spool is empty.
+        """
+        with self.lock:
+            while self.segments:
+                seq = self.segments[0]
+                if seq == self.active_seq:
+                    self._rotate()
+                if self.replay_offset < self.segment_sizes[seq]:
+                    with open(self._segment_path(seq), "rb") as f:
+                        f.seek(self.replay_offset)
+                        header = f.read(RECORD_HEADER.size)
+                        if len(header) == RECORD_HEADER.size:
+                            (length,) = RECORD_HEADER.unpack(header)
+                            payload = f.read(length)
+                            if len(payload) == length:
+                                return seq, self.replay_offset + RECORD_HEADER.size + length, payload
+                    print(f"{'influx_spool':<20}: Truncated record in segment {seq}, skipping remainder.")
+                self._finish_segment(seq)
+        return None
+
+    def _finish_segment(self, seq):
+        """
+        Deletes a fully replayed segment.
+        Must be called with `lock` held.
+        """
+        if self.segments and self.segments[0] == seq:
+            self.segments.pop(0)
+            self.segment_sizes.pop(seq, None)
+            self.replay_offset = 0
+            self.replay_attempts = 0
+            try:
+                os.remove(self._segment_path(seq))
+            except OSError as e:
+                print(f"{'influx_spool':<20}: Could not remove segment {seq}: {e}")
+
+    def _quarantine(self, payload):
+        """
+        Keeps an undeliverable payload for inspection, in a file that is
+        never replayed. Once it exceeds a segment's size it replaces the
+        previous quarantine file.
+        Must be called with `lock` held.
+        """
+        path = os.path.join(self.directory, QUARANTINE_FILE)
+        try:
+            if os.path.exists(path) and os.path.getsize(path) >= self.segment_max_bytes:
+                os.replace(path, path + ".1")
+            with open(path, "ab") as f:
+                f.write(RECORD_HEADER.pack(len(payload)) + payload)
+        except OSError as e:
+            print(f"{'influx_spool':<20}: Could not quarantine payload: {e}")
+        self.stats["quarantined_payloads"] += 1
+
+    def _replay_loop(self):
+        """
+        Replays spooled payloads in order whenever the Lighthouse is reachable.
+        """
+        while True:
+            self.online_event.wait()
+            # Cleared before draining, so a notification during the run starts another one
+            self.online_event.clear()
+            start = time.monotonic()
+            replayed = 0
+            while True:
+                record = self._next_record()
+                if record is None:
+                    break
+                seq, next_offset, payload = record
+                outcome = self.post(payload, payload.count(b"\n") + 1)
+                with self.lock:
+                    # The segment may have been discarded by the size cap meanwhile.
+                    current = bool(self.segments) and self.segments[0] == seq
+                    if outcome == DELIVERED:
+                        self.stats["replayed_payloads"] += 1
+                        self.stats["replayed_bytes"] += len(payload)
+                    elif not current:
+                        pass
+                    elif outcome == RETRY and self.replay_attempts + 1 < MAX_REPLAY_ATTEMPTS:
+                        self.replay_attempts += 1
+                        break
+                    else:
+                        print(f"{'influx_spool':<20}: Quarantining a spooled payload of {len(payload)} bytes ({outcome}).")
+                        self._quarantine(payload)
+                    if current:
+                        self.replay_offset = next_offset
+                        self.replay_attempts = 0
+                if outcome != DELIVERED:
+                    continue
+                replayed += len(payload)
+                # Rate limit the replay so live telemetry keeps priority on the link.
+                ahead = replayed / self.replay_bytes_per_s - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+            elapsed = time.monotonic() - start
+            if replayed:
+                with self.lock:
+                    self.stats["replay_throughput_bps"] = replayed / elapsed if elapsed > 0 else 0.0
+                print(f"{'influx_spool':<20}: Replayed {replayed} bytes in {elapsed:.1f} s, {self.pending_bytes()} bytes still spooled.")
+
+    def get_stats(self) -> dict:
+        """
+        Returns a snapshot of the spool counters.
+
+        Returns:
+            dict: Spooled, dropped and replayed totals, the throughput of the
+                  last replay run and the current on-disk backlog.
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["pending_segments"] = len(self.segments)
+            stats["pending_bytes"] = sum(self.segment_sizes.values())
+        return stats
@@ -0,0 +1,291 @@
+"""
+Schema-aware InfluxDB line protocol encoders.
+
+Building an `influxdb_client_3.Point` per epoch and then calling
+`to_line_protocol()` on it dominates the telemetry cost at 10-25 Hz navigation
+rates. The encoders in this module know the measurement, tags and field names
+ahead of time, so they pre-escape everything that is constant and append the
+values straight into a reusable bytearray. The output is byte-identical to
+the `Point` path, including the alphabetical field order, the trimming of
+trailing ".0" on whole floats and the skipping of non-finite values.
+
+Run this module directly to benchmark both paths.
+"""
+
+import math
+import time
+from calendar import timegm
+
+_ESCAPE_MEASUREMENT = str.maketrans({",": r"\,", " ": r"\ ", "\n": r"\n", "\t": r"\t", "\r": r"\r"})
+_ESCAPE_KEY = str.maketrans({",": r"\,", "=": r"\=", " ": r"\ ", "\n": r"\n", "\t": r"\t", "\r": r"\r"})
+_ESCAPE_STRING = str.maketrans({'"': r"\"", "\\": r"\\"})
+
+def _format_value(value) -> bytes | None:
+    """
+    Formats a field value exactly like `Point.to_line_protocol()`.
+
+    Returns:
+        bytes: The encoded value, or None if the field must be skipped.
+    """
+    value_type = type(value)
+    if value_type is float:
+        if not math.isfinite(value):
+            return None
+        s = str(value)
+        if s.endswith(".0"):
+            s = s[:-2]
+        return s.encode()
+    if value_type is int:
+        return b"%di" % value
+    if value_type is bool:
+        return b"true" if value else b"false"
+    if value_type is str:
+        return b'"' + value.translate(_ESCAPE_STRING).encode() + b'"'
+    if value is None:
+        return None
+    raise ValueError(f'Type: "{value_type}" of field is not supported.')
+
+class LineProtocolEncoder:
+    """
+    Encodes rows of a single measurement with a fixed tag set.
+
+    The measurement and tags are escaped once at construction. Field keys are
+    escaped and cached on first use, and each row is assembled in a reusable
+    bytearray.
+    """
+
+    def __init__(self, measurement: str, tags: dict | None = None):
+        """
+        Args:
+            measurement (str): The measurement name.
+            tags (dict): Constant tags added to every row.
+        """
+        prefix = measurement.translate(_ESCAPE_MEASUREMENT)
+        for key in sorted(tags or {}):
+            value = tags[key]
+            if value is None:
+                continue
+            key = str(key).translate(_ESCAPE_KEY)
+            value = str(value).translate(_ESCAPE_KEY)
+            if value.endswith("\\"):
+                value += " "
+            if key and value:
+                prefix += f",{key}={value}"
+        self._prefix = (prefix + " ").encode()
+        self._keys = {}
+        self._buf = bytearray()
+
+    def _key(self, name: str) -> bytes:
+        key = self._keys.get(name)
+        if key is None:
+            key = self._keys[name] = name.translate(_ESCAPE_KEY).encode() + b"="
+        return key
+
+    def encode(self, fields, timestamp_ns: int | None = None) -> bytes:
+        """
+        Encodes a single row.
+
+        Args:
+            fields (iterable): (name, value) pairs sorted by name. Pairs whose
+                               value is None are skipped.
+            timestamp_ns (int): Optional timestamp in nanoseconds.
+
+        Returns:
+            bytes: The encoded line, or b"" if no field had a value.
+        """
+        buf = self._buf
+        del buf[:]
+        buf += self._prefix
+        start = len(buf)
+        for name, value in fields:
+            encoded = _format_value(value)
+            if encoded is None:
+                continue
+            if len(buf) > start:
+                buf += b","
+            buf += self._key(name)
+            buf += encoded
+        if len(buf) == start:
+            return b""
+        if timestamp_ns is not None:
+            buf += b" %d" % timestamp_ns
+        return bytes(buf)
+
+    def encode_dict(self, fields: dict, timestamp_ns: int | None = None) -> bytes:
+        """
+        Encodes a single row from an unordered mapping of field values.
+
+        Args:
+            fields (dict): Field names mapped to values.
+            timestamp_ns (int): Optional timestamp in nanoseconds.
+
+        Returns:
+            bytes: The encoded line, or b"" if no field had a value.
+        """
+        return self.encode(sorted(fields.items()), timestamp_ns)
+
+def nav_pvt_timestamp_ns(parsed_data) -> int:
+    """
+    Returns the NAV-PVT epoch in nanoseconds, or the current time if the
+    receiver has not resolved date and time yet.
+
+    The arithmetic mirrors `datetime.timestamp()` on the UTC epoch so the
+    result matches the previous `datetime` based conversion bit for bit,
+    without building any datetime objects.
+
+    Args:
+        parsed_data (UBXMessage): A parsed NAV-PVT message.
+    """
+    if parsed_data.validTime and parsed_data.validDate:
+        nano = parsed_data.nano
+        seconds = timegm((
+            parsed_data.year, parsed_data.month, parsed_data.day,
+            parsed_data.hour, parsed_data.min, parsed_data.second,
+        ))
+        if nano < 0:
+            seconds -= 1
+            nano += int(1e9)
+        return int((seconds * 10**6 + int(nano/1e3)) / 10**6 * 1e9)
+    return int(time.time()*1e9)
+
+class RoverMetricsEncoder(LineProtocolEncoder):
+    """
+    Encodes the rover "metrics" rows tagged with the receiver type and,
+    if known, its serial number.
+    """
+
+    def __init__(self, device: str, serial: str | None = None):
+        super().__init__("metrics", {"device": device, "serial": serial})
+
+    def nav_pvt(self, parsed_data, save_position: bool) -> bytes:
+        """
+        Encodes a NAV-PVT epoch. Position and accuracy fields are only written
+        while the fix is valid, and latitude/longitude only if `save_position`.
+        """
+        fix_ok = parsed_data.gnssFixOk
+        position = fix_ok and save_position
+        return self.encode((
+            ("altitude_m", parsed_data.hMSL/1000 if fix_ok else None),
+            ("carrier_phase_range_int", int(parsed_data.carrSoln)),
+            ("fix_ok_int", int(fix_ok)),
+            ("fix_type_int", int(parsed_data.fixType)),
+            ("ground_heading_deg", parsed_data.headMot if fix_ok else None),
+            ("ground_speed_ms", parsed_data.gSpeed / 1000 if fix_ok else None),
+            ("heading_accuracy_deg", parsed_data.headAcc if fix_ok else None),
+            ("horizontal_accuracy_m", parsed_data.hAcc/1000 if fix_ok else None),
+            ("last_correction_age_int", int(parsed_data.lastCorrectionAge)),
+            ("latitude", parsed_data.lat if position else None),
+            ("longitude", parsed_data.lon if position else None),
+            ("speed_accuracy_ms", parsed_data.sAcc/1000 if fix_ok else None),
+            ("vertical_accuracy_m", parsed_data.vAcc/1000 if fix_ok else None),
+        ), nav_pvt_timestamp_ns(parsed_data))
+
+    def sat_counts(self, tracked: int, visible: int, code_locked: int, carrier_locked: int) -> bytes:
+        """
+        Encodes the NAV-SAT satellite counts.
+        """
+        return self.encode((
+            ("num_sats_carrier_locked", int(carrier_locked)),
+            ("num_sats_code_locked", int(code_locked)),
+            ("num_sats_tracked", int(tracked)),
+            ("num_sats_visible", int(visible)),
+        ))
+
+    def rtcm_received(self, timestamp_ns: int) -> bytes:
+        """
+        Encodes the periodic RXM-RTCM heartbeat.
+        """
+        return self.encode((("ntrip_client_rtcm_received_int", 1),), timestamp_ns)
+
+class StationTelemetryEncoder(LineProtocolEncoder):
+    """
+    Encodes the base station "station_telemetry" rows, tagged with the
+    receiver's serial number if known.
+    """
+
+    def __init__(self, serial: str | None = None):
+        super().__init__("station_telemetry", {"serial": serial})
+
+    def nav_pvt(self, parsed_data) -> bytes:
+        """
+        Encodes the NAV-PVT position used for debugging.
+        """
+        return self.encode((
+            ("height", parsed_data.height),
+            ("latitude", parsed_data.lat),
+            ("longitude", parsed_data.lon),
+        ))
+
+    def sat_counts(self, tracked: int, visible: int, code_locked: int, carrier_locked: int) -> bytes:
+        """
+        Encodes the NAV-SAT satellite counts.
+        """
+        return self.encode((
+            ("num_sats_carrier_locked", int(carrier_locked)),
+            ("num_sats_code_locked", int(code_locked)),
+            ("num_sats_tracked", int(tracked)),
+            ("num_sats_visible", int(visible)),
+        ))
+
+if __name__ == "__main__":
+    """
+    Microbenchmark comparing the Point path with the schema-aware encoders on
+    a synthetic NAV-PVT epoch, after checking that both produce the same bytes.
+    """
+    import timeit
+
+    from datetime import datetime, timedelta, timezone
+
+    from influxdb_client_3 import Point
+    from pyubx2 import UBXMessage, UBXReader, GET
+
+    parsed_data = UBXReader.parse(UBXMessage(
+        "NAV", "NAV-PVT", GET,
+        year=2025, month=3, day=4, hour=5, min=6, second=7, validDate=1, validTime=1,
+        nano=-12345, fixType=3, gnssFixOk=1, carrSoln=2, lat=30.1234567, lon=-97.7654321,
+        height=180123, hMSL=150123, hAcc=14, vAcc=25, gSpeed=12, headMot=123.45678,
+        sAcc=50, headAcc=12.3, lastCorrectionAge=3,
+    ).serialize())
+
+    def point_path() -> bytes:
+        point = Point("metrics").tag("device", "SPARKFUN")
+        if parsed_data.gnssFixOk:
+            point.field("latitude", parsed_data.lat) \
+                .field("longitude", parsed_data.lon)
+            point.field("altitude_m", parsed_data.hMSL/1000) \
+                .field("ground_speed_ms", parsed_data.gSpeed / 1000) \
+                .field("ground_heading_deg", parsed_data.headMot) \
+                .field("horizontal_accuracy_m", parsed_data.hAcc/1000) \
+                .field("vertical_accuracy_m", parsed_data.vAcc/1000) \
+                .field("speed_accuracy_ms", parsed_data.sAcc/1000) \
+                .field("heading_accuracy_deg", parsed_data.headAcc)
+        point.field("fix_type_int", int(parsed_data.fixType)) \
+            .field("fix_ok_int", int(parsed_data.gnssFixOk)) \
+            .field('carrier_phase_range_int', int(parsed_data.carrSoln)) \
+            .field('last_correction_age_int', int(parsed_data.lastCorrectionAge))
+        nano = parsed_data.nano
+        seconds_to_subtract = 0
+        if nano < 0:
+            seconds_to_subtract = 1
+            nano += int(1e9)
+        dt = datetime(
+            year=parsed_data.year, month=parsed_data.month, day=parsed_data.day,
+            hour=parsed_data.hour, minute=parsed_data.min, second=parsed_data.second,
+            microsecond=int(nano/1e3), tzinfo=timezone.utc
+        )
+        dt = dt - timedelta(seconds=seconds_to_subtract)
+        point.time(int(dt.timestamp()*1e9))
+        return point.to_line_protocol().encode("utf-8")
+
+    encoder = RoverMetricsEncoder("SPARKFUN")
+    def encoder_path() -> bytes:
+        return encoder.nav_pvt(parsed_data, True)
+
+    assert point_path() == encoder_path(), (point_path(), encoder_path())
+    print(encoder_path().decode())
+
+    number = 20000
+    point_s = min(timeit.repeat(point_path, number=number, repeat=5)) / number
+    encoder_s = min(timeit.repeat(encoder_path, number=number, repeat=5)) / number
+    print(f"Point path   : {point_s*1e6:7.2f} us/epoch")
+    print(f"Encoder path : {encoder_s*1e6:7.2f} us/epoch ({point_s/encoder_s:.1f}x faster)")
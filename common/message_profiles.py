@@ -0,0 +1,169 @@
+"""
+Receiver output-rate profiles.
+
+Each profile sets the CFG-MSGOUT rate of the UBX messages the apps consume,
+per port. A rate is the number of navigation epochs between two outputs
+(1 = every epoch, 0 = off); event-driven messages such as RXM-RTCM are only
+on or off. Profiles are written to the RAM layer only, so switching never
+wears the receiver's flash and a power cycle returns to the u-center
+configuration file.
+"""
+
+from threading import Thread
+import sys
+import os
+
+from pyubx2 import SET_LAYER_RAM
+
+PORTS = ("UART1", "USB")
+
+PROFILES = {
+    # Base station while PPP needs raw observations and navigation data.
+    "survey": {
+        "NAV_PVT": 1,
+        "NAV_SAT": 1,
+        "NAV_SIG": 0,
+        "RXM_RAWX": 1,
+        "RXM_SFRBX": 1,
+        "RXM_RTCM": 1,
+    },
+    # Steady state: positions every epoch, satellite counts every 10 epochs.
+    # RXM-RTCM stays on since the rover reports it as its corrections heartbeat.
+    "operational": {
+        "NAV_PVT": 1,
+        "NAV_SAT": 10,
+        "NAV_SIG": 0,
+        "RXM_RAWX": 0,
+        "RXM_SFRBX": 0,
+        "RXM_RTCM": 1,
+    },
+    # Everything the apps can decode, every epoch, including per-signal NAV-SIG.
+    "debug": {
+        "NAV_PVT": 1,
+        "NAV_SAT": 1,
+        "NAV_SIG": 1,
+        "RXM_RAWX": 1,
+        "RXM_SFRBX": 1,
+        "RXM_RTCM": 1,
+    },
+}
+
+def profile_cfg_data(name, ports=PORTS) -> list[tuple[str, int]]:
+    """
+    Returns the CFG-MSGOUT (key, rate) pairs of a profile.
+
+    Args:
+        name (str): A name from `PROFILES`.
+        ports (tuple): The receiver ports to configure.
+
+    Raises:
+        KeyError: If the profile name is unknown.
+    """
+    return [
+        (f"CFG_MSGOUT_UBX_{message}_{port}", rate)
+        for message, rate in PROFILES[name].items()
+        for port in ports
+    ]
+
+def apply_profile(ubx_config, name, ports=PORTS) -> bool:
+    """
+    Switches the receiver to a profile, writing only the rates that differ.
+
+    Args:
+        ubx_config (UBXConfig): The receiver's configuration interface.
+        name (str): A name from `PROFILES`.
+        ports (tuple): The receiver ports to configure.
+
+    Returns:
+        bool: True if the receiver applied the profile.
+    """
+    success, msg, _ = ubx_config.send_changed(profile_cfg_data(name, ports), SET_LAYER_RAM)
+    print(f"{'message_profiles':<20}: {'Switched to' if success else 'Failed to switch to'} '{name}' profile: {msg}")
+    return success
+
+def apply_profile_when(event, ubx_config, name, stop_event, ports=PORTS) -> Thread:
+    """
+    Starts a daemon thread that switches to a profile once `event` is set,
+    e.g. the "operational" profile once PPP calibration is done. The switch
+    cannot happen on the thread that dispatches the receiver's ACKs.
+
+    Args:
+        event (Event): The event to wait for.
+        ubx_config (UBXConfig): The receiver's configuration interface.
+        name (str): A name from `PROFILES`.
+        stop_event (Event): Gives up waiting when set.
+        ports (tuple): The receiver ports to configure.
+
+    Returns:
+        Thread: The started thread.
+    """
+    def wait_and_apply():
+        while not stop_event.is_set():
+            if event.wait(1):
+                apply_profile(ubx_config, name, ports)
+                return
+
+    thread = Thread(target=wait_and_apply, name=f"profile-{name}", daemon=True)
+    thread.start()
+    return thread
+
+def profile_override() -> str | None:
+    """
+    Returns the profile forced with the RECEIVER_PROFILE environment
+    variable (e.g. "debug"), or None to switch profiles automatically.
+
+    Raises:
+        KeyError: If the variable names an unknown profile.
+    """
+    name = os.getenv("RECEIVER_PROFILE") or None
+    if name is not None and name not in PROFILES:
+        raise KeyError(f"Unknown RECEIVER_PROFILE '{name}', expected one of {', '.join(PROFILES)}")
+    return name
+
+if __name__ == "__main__":
+    """
+    Estimates the serial bandwidth of each profile from a recorded capture:
+    the average frame size of every profiled message times its rate.
+    """
+    from collections import defaultdict
+    import glob
+    import io
+
+    from pyubx2 import UBX_PROTOCOL, RTCM3_PROTOCOL
+    try:
+        from common.ubx_framer import UBXFramer
+    except ImportError:
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+        from ubx_framer import UBXFramer
+
+    # By default the oldest segment of the base station's raw UBX log
+    segments = sys.argv[1:2] or sorted(glob.glob("./shared/raw_ubx/station-*.ubx"))[:1]
+    if not segments:
+        sys.exit("Usage: python message_profiles.py <capture.ubx>")
+    capture = segments[0]
+    with open(capture, "rb") as f:
+        framer = UBXFramer(io.BytesIO(f.read()), protocols=UBX_PROTOCOL | RTCM3_PROTOCOL)
+
+    identities = {
+        b"\x01\x07": "NAV_PVT", b"\x01\x35": "NAV_SAT", b"\x01\x43": "NAV_SIG",
+        b"\x02\x15": "RXM_RAWX", b"\x02\x13": "RXM_SFRBX", b"\x02\x32": "RXM_RTCM",
+    }
+    sizes = defaultdict(list)
+    epochs = 0
+    while (frame := framer.read()) is not None:
+        message = identities.get(frame[1][2:4]) if frame[0] == UBX_PROTOCOL else None
+        if message is not None:
+            sizes[message].append(len(frame[1]))
+            epochs += message == "NAV_PVT"
+    if not epochs:
+        sys.exit(f"No NAV-PVT epochs in {capture}")
+
+    print(f"{epochs} epochs in {capture}")
+    for name, rates in PROFILES.items():
+        total = 0.0
+        for message, rate in rates.items():
+            if rate and sizes[message]:
+                # RXM-SFRBX and RXM-RTCM follow the data received, not the epochs
+                divisor = 1 if message in ("RXM_SFRBX", "RXM_RTCM") else rate
+                total += sum(sizes[message]) / epochs / divisor
+        print(f"{name:<12}: {total:8.0f} UBX bytes/epoch")
@@ -0,0 +1,202 @@
+"""
+Vectorized NAV-SAT / NAV-SIG satellite statistics.
+
+The repeated blocks of a NAV-SAT (12 bytes per satellite) or NAV-SIG (16
+bytes per signal) payload are unpacked straight from the raw UBX frame into
+a NumPy structured array with a single `frombuffer` call. Visible,
+code-locked and carrier-locked counts, mean C/N0 and the elevation
+distribution are then computed per constellation (and per signal for
+NAV-SIG) and returned as tagged line protocol rows of the
+"constellation_stats" measurement.
+"""
+
+import sys
+import os
+
+import numpy as np
+from pyubx2 import GNSSLIST, sigid2str
+
+try:
+    from common.line_protocol import LineProtocolEncoder
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+    from line_protocol import LineProtocolEncoder
+
+UBX_HEADER_LEN = 6          # Sync chars, class, ID and length
+NUM_BLOCKS_OFFSET = 5       # numSvs / numSigs within the payload
+BLOCKS_OFFSET = 8           # Repeated blocks start after the 8 byte header
+
+SBAS = 1
+NUM_GNSS_IDS = 8
+
+NAV_SAT_BLOCK = np.dtype([
+    ("gnssId", "u1"), ("svId", "u1"), ("cno", "u1"), ("elev", "i1"),
+    ("azim", "<i2"), ("prRes", "<i2"), ("flags", "<u4"),
+])
+NAV_SIG_BLOCK = np.dtype([
+    ("gnssId", "u1"), ("svId", "u1"), ("sigId", "u1"), ("freqId", "u1"),
+    ("prRes", "<i2"), ("cno", "u1"), ("qualityInd", "u1"), ("corrSource", "u1"),
+    ("ionoModel", "u1"), ("sigFlags", "<u2"), ("reserved1", "V4"),
+])
+
+# Elevation bins (degrees) for the elevation distribution fields.
+ELEVATION_BINS = ((-90, 15, "lt_15"), (15, 30, "15_30"), (30, 60, "30_60"), (60, 91, "ge_60"))
+MEASUREMENT = "constellation_stats"     # Per-constellation and per-signal rows
+
+def _blocks(raw_data, dtype) -> np.ndarray:
+    """
+    Views the repeated blocks of a raw NAV-SAT or NAV-SIG frame as an array.
+    """
+    count = raw_data[UBX_HEADER_LEN + NUM_BLOCKS_OFFSET]
+    return np.frombuffer(raw_data, dtype=dtype, count=count, offset=UBX_HEADER_LEN + BLOCKS_OFFSET)
+
+def nav_sat_blocks(raw_data) -> np.ndarray:
+    """
+    Returns the per-satellite blocks of a raw NAV-SAT frame.
+    """
+    return _blocks(raw_data, NAV_SAT_BLOCK)
+
+def nav_sig_blocks(raw_data) -> np.ndarray:
+    """
+    Returns the per-signal blocks of a raw NAV-SIG frame.
+    """
+    return _blocks(raw_data, NAV_SIG_BLOCK)
+
+class SatelliteStats:
+    """
+    Turns raw NAV-SAT / NAV-SIG frames into satellite count rows.
+
+    Rows go to their own measurement, so they never mix with the overall
+    counts of the app's telemetry measurement, which use the same field
+    names. They are tagged with that measurement as "source", the tags
+    given at construction, a "constellation" tag, and a "signal" tag for
+    NAV-SIG rows.
+    """
+
+    def __init__(self, source: str, tags: dict | None = None, measurement: str = MEASUREMENT):
+        """
+        Args:
+            source (str): The app's telemetry measurement, e.g. "station_telemetry".
+            tags (dict): Constant tags added to every row.
+            measurement (str): The measurement of the rows.
+        """
+        self.measurement = measurement
+        self.tags = {"source": source, **(tags or {})}
+        self.encoders = {}
+
+    def _encoder(self, **tags) -> LineProtocolEncoder:
+        key = tuple(sorted(tags.items()))
+        encoder = self.encoders.get(key)
+        if encoder is None:
+            encoder = self.encoders[key] = LineProtocolEncoder(self.measurement, {**self.tags, **tags})
+        return encoder
+
+    def nav_sat(self, raw_data) -> tuple[tuple[int, int, int, int], list[bytes]]:
+        """
+        Computes satellite statistics from a raw NAV-SAT frame.
+
+        Args:
+            raw_data (bytes): A complete NAV-SAT UBX frame.
+
+        Returns:
+            tuple: The overall (tracked, visible, code locked, carrier locked)
+                   counts, where SBAS is excluded from all but tracked, and
+                   one line protocol row per constellation.
+        """
+        sats = nav_sat_blocks(raw_data)
+        gnss = sats["gnssId"]
+        quality = sats["flags"] & 0x07
+        used = (sats["flags"] >> 3) & 0x01
+        cno = sats["cno"]
+        elev = sats["elev"].astype(np.int16)
+
+        def per_gnss(mask=None, weights=None) -> np.ndarray:
+            ids = gnss if mask is None else gnss[mask]
+            if weights is not None and mask is not None:
+                weights = weights[mask]
+            return np.bincount(ids, weights=weights, minlength=NUM_GNSS_IDS)
+
+        tracked = per_gnss()
+        visible = per_gnss(quality >= 2)
+        code_locked = per_gnss(quality >= 4)
+        carrier_locked = per_gnss(quality >= 5)
+        num_used = per_gnss(used == 1)
+        has_cno = cno > 0
+        cno_count = per_gnss(has_cno)
+        cno_sum = per_gnss(has_cno, cno.astype(np.float64))
+        elev_sum = per_gnss(None, elev.astype(np.float64))
+        elev_bins = [per_gnss((elev >= low) & (elev < high)) for low, high, _ in ELEVATION_BINS]
+
+        non_sbas = np.arange(len(tracked)) != SBAS
+        totals = (
+            int(tracked.sum()),
+            int(visible[non_sbas].sum()),
+            int(code_locked[non_sbas].sum()),
+            int(carrier_locked[non_sbas].sum()),
+        )
+
+        rows = []
+        for gnss_id in np.flatnonzero(tracked):
+            fields = {
+                "num_sats_tracked": int(tracked[gnss_id]),
+                "num_sats_visible": int(visible[gnss_id]),
+                "num_sats_code_locked": int(code_locked[gnss_id]),
+                "num_sats_carrier_locked": int(carrier_locked[gnss_id]),
+                "num_sats_used": int(num_used[gnss_id]),
+                "elev_mean_deg": float(elev_sum[gnss_id] / tracked[gnss_id]),
+            }
+            if cno_count[gnss_id]:
+                fields["cno_mean_dbhz"] = float(cno_sum[gnss_id] / cno_count[gnss_id])
+            for counts, (_, _, label) in zip(elev_bins, ELEVATION_BINS):
+                fields[f"num_sats_elev_{label}"] = int(counts[gnss_id])
+            constellation = GNSSLIST.get(int(gnss_id), str(gnss_id))
+            rows.append(self._encoder(constellation=constellation).encode_dict(fields))
+        return totals, rows
+
+    def nav_sig(self, raw_data) -> list[bytes]:
+        """
+        Computes per-signal statistics from a raw NAV-SIG frame.
+
+        Args:
+            raw_data (bytes): A complete NAV-SIG UBX frame.
+
+        Returns:
+            list: One line protocol row per constellation and signal.
+        """
+        sigs = nav_sig_blocks(raw_data)
+        if not len(sigs):
+            return []
+        # Combine gnssId and sigId into one key so a single bincount covers both.
+        key = sigs["gnssId"].astype(np.int32) * 256 + sigs["sigId"]
+        quality = sigs["qualityInd"]
+        pr_used = (sigs["sigFlags"] >> 3) & 0x01
+        cr_used = (sigs["sigFlags"] >> 4) & 0x01
+        cno = sigs["cno"].astype(np.float64)
+
+        keys, index = np.unique(key, return_inverse=True)
+        def per_signal(values) -> np.ndarray:
+            return np.bincount(index, weights=values, minlength=len(keys))
+
+        tracked = per_signal(None)
+        code_locked = per_signal((quality >= 4).astype(np.float64))
+        carrier_locked = per_signal((quality >= 5).astype(np.float64))
+        num_pr_used = per_signal(pr_used.astype(np.float64))
+        num_cr_used = per_signal(cr_used.astype(np.float64))
+        cno_sum = per_signal(cno)
+
+        rows = []
+        for i, combined in enumerate(keys):
+            gnss_id, sig_id = divmod(int(combined), 256)
+            encoder = self._encoder(
+                constellation=GNSSLIST.get(gnss_id, str(gnss_id)),
+                signal=sigid2str(gnss_id, sig_id),
+            )
+            rows.append(encoder.encode_dict({
+                "num_sigs_tracked": int(tracked[i]),
+                "num_sigs_code_locked": int(code_locked[i]),
+                "num_sigs_carrier_locked": int(carrier_locked[i]),
+                "num_sigs_pr_used": int(num_pr_used[i]),
+                "num_sigs_cr_used": int(num_cr_used[i]),
+                "cno_mean_dbhz": float(cno_sum[i] / tracked[i]),
+            }))
+        return rows
@@ -0,0 +1,506 @@
+"""
+Replay harness and end-to-end benchmark for the rover and base station.
+
+Streams a recorded UBX/RTCM3 capture through a file-backed fake serial port
+(`ReplaySerial`) into the unchanged `read_messages_thread` of either app, at
+the capture's own pace, N times faster, or as fast as possible. A local
+stub stands in for the Lighthouse `write_lp` endpoint and runs in its own
+process, so its CPU time is not counted against the app. For the base
+station the in-process `NTRIPCaster` is started as well and a local NTRIP
+client measures the RTCM path from the serial port to the socket.
+
+The report is printed and optionally written as JSON:
+
+    python replay_harness.py ./shared/raw_ubx/station-000000-*.ubx --app base --speed 10 --report report.json
+
+Latencies are measured from the moment a frame's bytes become readable on
+the fake serial port. Serial-to-Influx latency is tracked for NAV-PVT
+epochs, matched by the line the app writes for them, and RTCM latency for
+every frame, matched by its bytes.
+"""
+
+import argparse
+import gzip
+import importlib.util
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from base64 import b64encode
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+from pyubx2 import UBXReader, VALNONE, UBX_PROTOCOL, RTCM3_PROTOCOL
+
+try:
+    from common.ubx_framer import UBXFramer
+    from common.influx_client import InfluxWriter
+    from common.line_protocol import RoverMetricsEncoder, StationTelemetryEncoder
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+    from ubx_framer import UBXFramer
+    from influx_client import InfluxWriter
+    from line_protocol import RoverMetricsEncoder, StationTelemetryEncoder
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROVER_APP = os.path.join(REPO_ROOT, "rover", "ntrip-client", "app.py")
+BASE_APP = os.path.join(REPO_ROOT, "base-station", "ntrip-caster", "app.py")
+
+NAV_PVT = b"\x01\x07"
+REPLAY_DEVICE = "replay"    # Device tag of the rover rows written during a replay
+SETTLE_TIME = 1.0           # Seconds to let the app drain its queues after the last byte
+
+def load_capture(path) -> tuple[list[tuple[float, int, bytes]], float]:
+    """
+    Frames a capture and assigns every frame its offset from the start of
+    the recording, taken from the iTOW of the most recent NAV-PVT. Frames
+    before the first NAV-PVT are released at offset 0.
+
+    Args:
+        path (str): A raw UBX/RTCM3 capture, e.g. a RawLogger segment.
+
+    Returns:
+        tuple: A list of (offset in seconds, protocol, raw bytes) and the
+               duration of the capture in seconds.
+    """
+    frames = []
+    first_itow = None
+    offset = 0.0
+    with open(path, "rb") as f:
+        framer = UBXFramer(f, protocols=UBX_PROTOCOL | RTCM3_PROTOCOL)
+        while (frame := framer.read()) is not None:
+            prot, raw_data = frame
+            if prot == UBX_PROTOCOL and raw_data[2:4] == NAV_PVT:
+                itow = int.from_bytes(raw_data[6:10], "little")
+                if first_itow is None:
+                    first_itow = itow
+                # Clamp at the previous offset so a week rollover or a gap in
+                # the recording never moves time backwards.
+                offset = max(offset, (itow - first_itow) / 1000)
+            frames.append((offset, prot, raw_data))
+    return frames, offset
+
+class ReplaySerial:
+    """
+    A serial port stand-in that releases a recorded capture frame by frame
+    at the time each frame was originally received, scaled by `speed`.
+
+    Only what `UBXFramer` and `UBXConfig` use is implemented: `read()`,
+    `in_waiting`, `write()` (discarded) and `close()`.
+    """
+
+    def __init__(self, frames, speed=1.0, timeout=0.1):
+        """
+        Args:
+            frames (list): (offset, protocol, raw bytes) from `load_capture()`.
+            speed (float): Replay speed factor; 0 releases everything at once.
+            timeout (float): Seconds `read()` waits for data, like pyserial.
+        """
+        self.data = b"".join(raw_data for _, _, raw_data in frames)
+        self.ends = np.cumsum([len(raw_data) for _, _, raw_data in frames])
+        self.offsets = [offset / speed if speed else 0.0 for offset, _, _ in frames]
+        self.timeout = timeout
+        self.start_time = None
+        self.released = 0           # Number of frames made readable so far
+        self.released_bytes = 0
+        self.pos = 0
+        self.bytes_written = 0
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+
+    def start(self):
+        """
+        Starts the clock; nothing is readable before this is called.
+        """
+        self.start_time = time.time()
+        self.started.set()
+
+    def release_time(self, index) -> float:
+        """
+        Returns the wall clock time at which frame `index` became readable.
+        """
+        return self.start_time + self.offsets[index]
+
+    @property
+    def exhausted(self) -> bool:
+        return self.pos >= len(self.data)
+
+    def _release(self) -> float | None:
+        """
+        Makes every frame that is due readable.
+
+        Returns:
+            float: Wall clock time of the next release, or None if all
+                   frames have been released.
+        """
+        if self.start_time is None:
+            return time.time() + self.timeout
+        now = time.time()
+        while self.released < len(self.offsets) and self.start_time + self.offsets[self.released] <= now:
+            self.released += 1
+        if self.released:
+            self.released_bytes = int(self.ends[self.released - 1])
+        if self.released < len(self.offsets):
+            return self.start_time + self.offsets[self.released]
+        return None
+
+    @property
+    def in_waiting(self) -> int:
+        with self.lock:
+            self._release()
+            return self.released_bytes - self.pos
+
+    def read(self, size=1) -> bytes:
+        deadline = time.time() + self.timeout
+        while True:
+            with self.lock:
+                next_release = self._release()
+                available = self.released_bytes - self.pos
+                if available:
+                    data = self.data[self.pos:self.pos + min(size, available)]
+                    self.pos += len(data)
+                    return data
+            now = time.time()
+            if now >= deadline:
+                return b""
+            wait = deadline if next_release is None else min(deadline, next_release)
+            time.sleep(max(0.0, wait - now))
+
+    def write(self, data) -> int:
+        self.bytes_written += len(data)
+        return len(data)
+
+    def close(self):
+        pass
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        arrived = time.time()
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        self.server.arrivals.put((arrived, body))
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def run_influx_stub(ports, arrivals):
+    """
+    Serves a `write_lp` stand-in that accepts every write with 204 and
+    reports (arrival time, uncompressed body) for each POST. Runs in a
+    separate process.
+
+    Args:
+        ports (Queue): Receives the port the stub listens on.
+        arrivals (Queue): Receives one (time, body) tuple per POST.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.arrivals = arrivals
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+class NTRIPProbe(threading.Thread):
+    """
+    Minimal NTRIP 1.0 client that records the arrival time of every RTCM3
+    frame it receives from the caster.
+    """
+
+    def __init__(self, port, mountpoint, stop_event):
+        self.port = port
+        self.mountpoint = mountpoint
+        self.stop_event = stop_event
+        self.arrivals = []          # (time, raw bytes)
+        self.connected = threading.Event()
+        self.cpu_time = 0.0
+        self.error = None
+        super().__init__(name="ntrip_probe", daemon=True)
+
+    def _connect(self) -> socket.socket:
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                return socket.create_connection(("127.0.0.1", self.port), timeout=1)
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+
+    def run(self):
+        try:
+            sock = self._connect()
+            credentials = b64encode(b"polaris:none").decode()
+            sock.sendall(
+                f"GET /{self.mountpoint} HTTP/1.0\r\nUser-Agent: NTRIP replay_harness\r\n"
+                f"Authorization: Basic {credentials}\r\n\r\n".encode()
+            )
+            buf = bytearray()
+            while b"\r\n\r\n" not in buf:
+                buf += sock.recv(4096)
+            header, _, rest = bytes(buf).partition(b"\r\n\r\n")
+            if not header.startswith(b"ICY 200"):
+                raise ConnectionError(header.decode(errors="replace"))
+            buf = bytearray(rest)
+            self.connected.set()
+            sock.settimeout(0.5)
+            while not self.stop_event.is_set():
+                try:
+                    data = sock.recv(65536)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                now = time.time()
+                buf += data
+                # The caster only forwards validated frames, so the length
+                # field is enough to split them.
+                while len(buf) >= 3:
+                    total = (((buf[1] & 0x03) << 8) | buf[2]) + 6
+                    if len(buf) < total:
+                        break
+                    self.arrivals.append((now, bytes(buf[:total])))
+                    del buf[:total]
+            sock.close()
+        except Exception as e:
+            self.error = str(e)
+            print(f"{'replay_harness':<20}: NTRIP probe error: {e}")
+        finally:
+            self.connected.set()
+            self.cpu_time = time.thread_time()
+
+def _load_app(name, path):
+    """
+    Imports an app module from its file without running its `main()`.
+    """
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+def start_rover(serial, stop_event) -> tuple[list, dict]:
+    """
+    Runs the rover's `read_messages_thread` on the replay port.
+
+    Returns:
+        tuple: The started threads and extra objects for the report.
+    """
+    app = _load_app("rover_app", ROVER_APP)
+    gps = SimpleNamespace(ser=serial, gps_type=REPLAY_DEVICE, serial_number=None)
+    ubx_config = SimpleNamespace(set_ack=lambda *args: None, set_nack=lambda *args: None, set_valget=lambda *args: None)
+    save_event = threading.Event()
+    save_event.set()
+    reader = threading.Thread(target=app.read_messages_thread, args=(gps, ubx_config, save_event, stop_event))
+    reader.start()
+    return [reader], {}
+
+def start_base(serial, stop_event, raw_dir) -> tuple[list, dict]:
+    """
+    Runs the base station's `read_messages_thread` and `NTRIPCaster` on the
+    replay port, with an `NTRIPProbe` connected to the caster.
+
+    Returns:
+        tuple: The started threads and extra objects for the report.
+    """
+    app = _load_app("base_app", BASE_APP)
+    from ntrip_caster import NTRIPCaster
+    from raw_logger import RawLogger
+
+    pipeline = app.SerialPipeline(serial, stop_event, protocols=UBX_PROTOCOL | RTCM3_PROTOCOL)
+    pipeline.start()
+    raw_logger = RawLogger(raw_dir)
+    ubx_config = SimpleNamespace(set_ack=lambda *args: None, set_nack=lambda *args: None, set_valget=lambda *args: None)
+    reader = threading.Thread(
+        target=app.read_messages_thread,
+        args=(pipeline, ubx_config, raw_logger, queue.Queue(maxsize=1), threading.Event(), stop_event),
+    )
+    reader.start()
+    port = _free_port()
+    caster = NTRIPCaster(pipeline.ring(RTCM3_PROTOCOL), stop_event, host="127.0.0.1", port=port)
+    caster.start()
+    probe = NTRIPProbe(port, "pygnssutils", stop_event)
+    probe.start()
+    probe.connected.wait(10)
+    return [reader, caster, probe], {"pipeline": pipeline, "raw_logger": raw_logger, "caster": caster, "probe": probe}
+
+def expected_nav_pvt_lines(app, frames) -> dict:
+    """
+    Maps the line each NAV-PVT epoch produces, without its timestamp, to the
+    indices of the frames that produce it, in capture order.
+    """
+    if app == "rover":
+        encoder = RoverMetricsEncoder(REPLAY_DEVICE)
+        encode = lambda parsed_data: _strip_timestamp(encoder.nav_pvt(parsed_data, True))
+    else:
+        encoder = StationTelemetryEncoder()
+        encode = encoder.nav_pvt
+    expected = defaultdict(deque)
+    for index, (_, prot, raw_data) in enumerate(frames):
+        if prot == UBX_PROTOCOL and raw_data[2:4] == NAV_PVT:
+            expected[encode(UBXReader.parse(raw_data, validate=VALNONE))].append(index)
+    return expected
+
+def _strip_timestamp(line) -> bytes:
+    """
+    Drops the trailing timestamp of a "measurement,tags fields timestamp" line.
+    """
+    return line.rsplit(b" ", 1)[0] if line.count(b" ") >= 2 else line
+
+def replay(capture, app="rover", speed=1.0, duration=None) -> dict:
+    """
+    Replays a capture through one of the apps and measures it.
+
+    Args:
+        capture (str): Path to the recorded UBX/RTCM3 capture.
+        app (str): "rover" or "base".
+        speed (float): Replay speed factor; 0 replays as fast as possible.
+        duration (float): Optional cap on the wall clock replay time.
+
+    Returns:
+        dict: The benchmark report.
+    """
+    frames, capture_duration = load_capture(capture)
+    expected = expected_nav_pvt_lines(app, frames)
+    serial = ReplaySerial(frames, speed)
+
+    ctx = multiprocessing.get_context("spawn")
+    ports, arrivals = ctx.Queue(), ctx.Queue()
+    stub = ctx.Process(target=run_influx_stub, args=(ports, arrivals), daemon=True)
+    stub.start()
+    os.environ["INFLUX_WRITE_URL"] = f"http://127.0.0.1:{ports.get(timeout=10)}/influx/api/v3/write_lp?db=GPS&precision=nanosecond"
+    os.environ.setdefault("LIGHTHOUSE_ADMIN_PASSWORD", "replay")
+
+    stop_event = threading.Event()
+    raw_dir = tempfile.mkdtemp(prefix="replay_raw_")
+    try:
+        if app == "rover":
+            threads, extra = start_rover(serial, stop_event)
+        else:
+            threads, extra = start_base(serial, stop_event, raw_dir)
+
+        cpu_start = time.process_time()
+        serial.start()
+        deadline = None if duration is None else serial.start_time + duration
+        while not serial.exhausted and (deadline is None or time.time() < deadline):
+            time.sleep(0.05)
+        elapsed = time.time() - serial.start_time
+        time.sleep(SETTLE_TIME)
+        InfluxWriter.flush(timeout=10)
+        cpu = time.process_time() - cpu_start
+        stop_event.set()
+        for thread in threads:
+            thread.join(5)
+    finally:
+        stop_event.set()
+
+    posts = []
+    while True:
+        try:
+            posts.append(arrivals.get(timeout=1))
+        except queue.Empty:
+            break
+    stub.terminate()
+
+    influx_latencies = []
+    lines = 0
+    for arrived, body in posts:
+        for line in body.split(b"\n"):
+            if not line:
+                continue
+            lines += 1
+            pending = expected.get(_strip_timestamp(line))
+            if pending:
+                influx_latencies.append(arrived - serial.release_time(pending.popleft()))
+
+    replayed = serial.released
+    report = {
+        "app": app,
+        "capture": os.path.abspath(capture),
+        "speed": speed,
+        "capture_duration_s": round(capture_duration, 3),
+        "replay_duration_s": round(elapsed, 3),
+        "frames_replayed": replayed,
+        "ubx_frames": sum(1 for _, prot, _ in frames[:replayed] if prot == UBX_PROTOCOL),
+        "rtcm_frames": sum(1 for _, prot, _ in frames[:replayed] if prot == RTCM3_PROTOCOL),
+        "messages_per_s": round(replayed / elapsed, 1) if elapsed else None,
+        "cpu_s": round(cpu, 3),
+        "cpu_per_message_us": round(cpu / replayed * 1e6, 2) if replayed else None,
+        "influx": {
+            "posts": len(posts),
+            "lines": lines,
+            "nav_pvt_expected": sum(1 for _, prot, raw_data in frames[:replayed]
+                                    if prot == UBX_PROTOCOL and raw_data[2:4] == NAV_PVT),
+            "serial_to_influx": _percentiles(influx_latencies),
+            "writer": InfluxWriter.get_stats(),
+        },
+    }
+
+    if app == "base":
+        probe = extra["probe"]
+        # The probe's own framing runs in this process; keep it out of the app's CPU time.
+        report["cpu_s"] = round(cpu - probe.cpu_time, 3)
+        report["cpu_per_message_us"] = round((cpu - probe.cpu_time) / replayed * 1e6, 2) if replayed else None
+        released = defaultdict(deque)
+        for index, (_, prot, raw_data) in enumerate(frames[:replayed]):
+            if prot == RTCM3_PROTOCOL:
+                released[raw_data].append(index)
+        rtcm_latencies = []
+        for arrived, raw_data in probe.arrivals:
+            pending = released.get(raw_data)
+            if pending:
+                rtcm_latencies.append(arrived - serial.release_time(pending.popleft()))
+        report["rtcm"] = {
+            "frames_received": len(probe.arrivals),
+            "receiver_to_socket": _percentiles(rtcm_latencies),
+            "probe_error": probe.error,
+            "caster": extra["caster"].get_stats(),
+        }
+        report["pipeline"] = extra["pipeline"].get_stats()
+        report["raw_log"] = extra["raw_logger"].get_stats()
+        extra["raw_logger"].close(remove=True)
+    shutil.rmtree(raw_dir, ignore_errors=True)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a UBX/RTCM3 capture through the rover or base station app.")
+    parser.add_argument("capture", help="Recorded UBX/RTCM3 capture")
+    parser.add_argument("--app", choices=("rover", "base"), default="rover")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor, 0 for as fast as possible")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds of wall clock time")
+    parser.add_argument("--report", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = replay(args.capture, args.app, args.speed, args.duration)
+    text = json.dumps(report, indent=2, default=str)
+    print(text)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,164 @@
+import time
+import sys
+import os
+from collections import deque
+from threading import Condition, Lock, Thread
+
+from pyubx2 import NMEA_PROTOCOL, UBX_PROTOCOL, RTCM3_PROTOCOL
+
+try:
+    from common.ubx_framer import UBXFramer
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+    from ubx_framer import UBXFramer
+
+class FrameRing:
+    """
+    A bounded ring buffer of raw frames shared between the serial reader and
+    one consumer. When the ring is full the oldest frame is discarded so the
+    reader never blocks on a slow consumer.
+    """
+
+    def __init__(self, max_frames=2048):
+        """
+        Args:
+            max_frames (int): Maximum number of frames held in the ring.
+        """
+        self.frames = deque(maxlen=max_frames)
+        self.cond = Condition()
+        self.dropped_frames = 0
+        self.max_depth = 0
+
+    def put(self, frame):
+        """
+        Appends a frame, discarding the oldest one if the ring is full.
+
+        Args:
+            frame (tuple): (receive time, raw bytes).
+        """
+        with self.cond:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped_frames += 1
+            self.frames.append(frame)
+            self.max_depth = max(self.max_depth, len(self.frames))
+            self.cond.notify()
+
+    def get(self, timeout=1.0) -> tuple[float, bytes] | None:
+        """
+        Removes the oldest frame, waiting up to `timeout` seconds for one.
+
+        Returns:
+            tuple: (receive time, raw bytes), or None on timeout.
+        """
+        with self.cond:
+            if not self.frames and not self.cond.wait_for(lambda: self.frames, timeout):
+                return None
+            return self.frames.popleft()
+
+    def depth(self) -> int:
+        return len(self.frames)
+
+class SerialPipeline:
+    """
+    Decouples draining the serial port from handling its messages.
+
+    A dedicated reader thread only frames raw bytes from the receiver with a
+    `UBXFramer` (sync and checksum validation, no payload decoding) and
+    pushes each frame, tagged with its receive time, into a bounded ring per
+    protocol. Consumers pull frames from the ring for their protocol and do
+    the parsing, file I/O and telemetry on their own threads, so a stall
+    there cannot overrun the OS serial buffer.
+    """
+
+    STATS_WINDOW = 1.0  # Seconds over which the serial byte rate is measured
+
+    def __init__(self, ser, stop_event, protocols=UBX_PROTOCOL, max_frames=2048):
+        """
+        Args:
+            ser (Serial): The serial port connected to the u-blox receiver.
+            stop_event (Event): Signals the reader thread to stop.
+            protocols (int): Bitmask of protocols to keep (UBX, NMEA, RTCM3).
+            max_frames (int): Capacity of each protocol's ring.
+        """
+        self.framer = UBXFramer(ser, protocols)
+        self.stop_event = stop_event
+        self.protocols = protocols
+        self.rings = {
+            prot: FrameRing(max_frames)
+            for prot in (UBX_PROTOCOL, NMEA_PROTOCOL, RTCM3_PROTOCOL)
+            if protocols & prot
+        }
+        self.stats_lock = Lock()
+        self.frames_read = 0
+        self.read_errors = 0
+        self.bytes_per_s = 0.0
+        self.reader_thread = None
+
+    def ring(self, prot) -> FrameRing:
+        """
+        Returns the ring that receives frames of the given protocol.
+
+        Args:
+            prot (int): UBX_PROTOCOL, NMEA_PROTOCOL or RTCM3_PROTOCOL.
+        """
+        return self.rings[prot]
+
+    def start(self):
+        """
+        Starts the reader thread.
+        """
+        self.reader_thread = Thread(target=self._read_loop, name="serial_reader", daemon=True)
+        self.reader_thread.start()
+
+    def _read_loop(self):
+        """
+        Frames raw messages from the serial port until `stop_event` is set.
+        """
+        print(f"{'serial_reader':<20}: Starting...")
+        window_start = time.monotonic()
+        window_bytes = 0
+        while not self.stop_event.is_set():
+            try:
+                frame = self.framer.read()
+            except Exception as e:
+                with self.stats_lock:
+                    self.read_errors += 1
+                print(f"{'serial_reader':<20}: Read error: {e}")
+                time.sleep(0.1)
+                continue
+            now = time.monotonic()
+            if frame is not None:
+                self.rings[frame[0]].put((now, frame[1]))
+                with self.stats_lock:
+                    self.frames_read += 1
+            if now - window_start >= self.STATS_WINDOW:
+                with self.stats_lock:
+                    self.bytes_per_s = (self.framer.bytes_read - window_bytes) / (now - window_start)
+                window_start = now
+                window_bytes = self.framer.bytes_read
+        print(f"{'serial_reader':<20}: Exiting.")
+
+    def get_stats(self) -> dict:
+        """
+        Returns the reader and queue counters.
+
+        Returns:
+            dict: Frames and bytes read, the current serial byte rate,
+                  framing errors, and per-protocol queue depth, peak depth
+                  and dropped frames.
+        """
+        with self.stats_lock:
+            stats = {
+                "serial_frames_read": self.frames_read,
+                "serial_read_errors": self.read_errors,
+                "serial_bytes": self.framer.bytes_read,
+                "serial_bytes_per_s": float(self.bytes_per_s),
+                "serial_checksum_errors": self.framer.checksum_errors,
+                "serial_discarded_bytes": self.framer.discarded_bytes,
+            }
+        names = {UBX_PROTOCOL: "ubx", NMEA_PROTOCOL: "nmea", RTCM3_PROTOCOL: "rtcm"}
+        for prot, ring in self.rings.items():
+            stats[f"serial_{names[prot]}_queue_depth"] = ring.depth()
+            stats[f"serial_{names[prot]}_queue_max_depth"] = ring.max_depth
+            stats[f"serial_{names[prot]}_dropped_frames"] = ring.dropped_frames
+        return stats
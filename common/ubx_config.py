@@ -1,17 +1,77 @@
-from threading import Condition, Event
+from collections import defaultdict
+from threading import Condition, RLock
+import time
+import sys
+import os
 from pyubx2 import (
     UBXMessage,
     SET_LAYER_RAM,
     SET_LAYER_FLASH,
     SET_LAYER_BBR,
     TXN_NONE,
-    ATTTYPE,
-    atttyp,
-    UBX_CONFIG_DATABASE,
+    POLL_LAYER_RAM,
+    POLL_LAYER_BBR,
+    POLL_LAYER_FLASH,
+    cfgname2key,
 )
+try:
+    from common.config_compiler import (
+        CompiledConfig,
+        ConfigValue,
+        build_valset_frames,
+        compile_config,
+        compile_config_file,
+        MAX_VALSET_KEYS,
+        MAX_VALSET_PAYLOAD,
+    )
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+    from config_compiler import (
+        CompiledConfig,
+        ConfigValue,
+        build_valset_frames,
+        compile_config,
+        compile_config_file,
+        MAX_VALSET_KEYS,
+        MAX_VALSET_PAYLOAD,
+    )
+
+# Per-key results of `UBXConfig.send_valset()`.
+APPLIED = "applied"     # Acknowledged (and committed, in a transaction)
+REJECTED = "rejected"   # The receiver NAKed the CFG-VALSET holding the key
+ABORTED = "aborted"     # Valid, but the transaction failed elsewhere and was not committed
+NO_ACK = "no-ack"       # The receiver did not answer in time
+UNCHANGED = "unchanged" # Already held by the receiver in every layer, not written
+
+CFG_CLASS = 0x06
+VALGET_ID = 0x8B
+# Value size in bytes by the size field (bits 28-30) of a configuration key ID
+VALUE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8}
+POLL_LAYERS = {SET_LAYER_RAM: POLL_LAYER_RAM, SET_LAYER_BBR: POLL_LAYER_BBR, SET_LAYER_FLASH: POLL_LAYER_FLASH}
+UART_BAUDRATE_KEY = "CFG_UART1_BAUDRATE"
+
+class _PendingReply:
+    """
+    A sent message waiting for the ACK-ACK/ACK-NAK that names its class/ID.
+    """
+
+    __slots__ = ("key", "deadline", "keys", "done", "acked")
+
+    def __init__(self, key, deadline, keys=None):
+        self.key = key
+        self.deadline = deadline
+        self.keys = keys        # Configuration key IDs the message writes
+        self.done = False
+        self.acked = None
 
 class UBXConfig:
     
+    MAX_VALSET_KEYS = MAX_VALSET_KEYS
+    MAX_VALSET_PAYLOAD = MAX_VALSET_PAYLOAD
+    PIPELINE_DEPTH = 4          # Messages sent ahead of the oldest unacknowledged one
+    MAX_VALGET_KEYS = 64        # Keys per CFG-VALGET poll
+    BAUD_SWITCH_DELAY = 0.1     # Seconds for the receiver to change its UART rate
+
     def __init__(self, ser, ACK_TIMEOUT=1):
         """
         Initializes the UBXConfig with the provided serial port.
@@ -23,59 +83,399 @@ class UBXConfig:
         
         self.ser = ser
         self.ACK_TIMEOUT = ACK_TIMEOUT
-        self.ack_event = Event()
-        self.nack_event = Event()
         self.reply = Condition()
+        self.pending = defaultdict(list)    # (class, ID) -> replies awaited, oldest first
+        self.transaction_lock = RLock()     # The receiver has a single transaction context
+        self.unmatched_replies = 0
+        # Values read back with CFG-VALGET: poll layer -> key ID -> raw value bytes
+        self.values = {layer: {} for layer in POLL_LAYERS.values()}
+        # The last fixed position or survey-in sent, restored after a replug
+        self.station_mode = None
         
-    def set_ack(self) -> None:
+    def set_ack(self, parsed_data) -> None:
         """
-        Sets the ACK event to indicate a successful configuration acknowledgement.
+        Completes the oldest pending message with the acknowledged class/ID.
+
+        Args:
+            parsed_data (UBXMessage): The parsed ACK-ACK message.
         """
-        with self.reply:
-            self.ack_event.set()
-            self.reply.notify()
+        self._complete(parsed_data, True)
             
-    def set_nack(self):
+    def set_nack(self, parsed_data) -> None:
         """
-        Sets the NACK event to indicate a failed configuration acknowledgement.
+        Fails the oldest pending message with the rejected class/ID.
+
+        Args:
+            parsed_data (UBXMessage): The parsed ACK-NAK message.
         """
+        self._complete(parsed_data, False)
+
+    def _complete(self, parsed_data, acked):
+        # The receiver answers messages of one class/ID in the order it got them.
+        key = (parsed_data.clsID, parsed_data.msgID)
         with self.reply:
-            self.nack_event.set()
-            self.reply.notify()
-            
-    def _wait_for_reply(self, timeout) -> bool:
+            waiting = self.pending.get(key)
+            if not waiting:
+                self.unmatched_replies += 1
+                return
+            entry = waiting.pop(0)
+            entry.done = True
+            entry.acked = acked
+            if acked and key[0] == CFG_CLASS and key[1] != VALGET_ID:
+                self._invalidate(entry.keys)
+            self.reply.notify_all()
+
+    def _invalidate(self, keys):
         """
-        Waits for either an ACK or NACK event to be set.
+        Forgets read-back values the receiver has just acknowledged writing.
+        Must be called with `reply` held.
+
+        Args:
+            keys (list): Key IDs, or None for a message that may have changed
+                         any key (e.g. a legacy CFG-MSG).
+        """
+        for values in self.values.values():
+            if keys is None:
+                values.clear()
+            else:
+                for key in keys:
+                    values.pop(key, None)
+
+    def forget_values(self) -> None:
+        """
+        Drops every read-back value, e.g. after the receiver was power
+        cycled and its RAM configuration reverted.
         """
         with self.reply:
-            self.reply.wait(timeout)
-            if self.ack_event.is_set():
-                self.ack_event.clear()
-                return True, "Configuration applied successfully."
-            if self.nack_event.is_set():
-                self.nack_event.clear()
-                return False, "Invalid configuration received."
-        return False, "No acknowledgement received within timeout."
+            self._invalidate(None)
+
+    def set_valget(self, raw_data) -> None:
+        """
+        Caches the values of a CFG-VALGET response. The receiver sends the
+        response before the ACK of the poll, so they are in place by the
+        time `read_values()` sees the poll acknowledged.
+
+        Args:
+            raw_data (bytes): The raw CFG-VALGET response frame.
+        """
+        payload = memoryview(raw_data)[6:-2]
+        layer = payload[1]
+        values = {}
+        i = 4
+        while i + 4 <= len(payload):
+            key = int.from_bytes(payload[i:i + 4], "little")
+            size = VALUE_SIZES.get((key >> 28) & 0x07)
+            if size is None:
+                break
+            values[key] = bytes(payload[i + 4:i + 4 + size])
+            i += 4 + size
+        with self.reply:
+            self.values.setdefault(layer, {}).update(values)
+
+    def _write(self, ubx_msg, keys=None) -> _PendingReply:
+        """
+        Registers the expected reply and writes the message. Both happen under
+        the reply lock, so the pending order matches the order on the wire
+        even with several threads configuring the receiver.
+        """
+        if isinstance(ubx_msg, bytes):
+            # An already serialized frame, e.g. from a compiled configuration
+            key, data = (ubx_msg[2], ubx_msg[3]), ubx_msg
+        else:
+            key, data = (ubx_msg.msg_cls[0], ubx_msg.msg_id[0]), ubx_msg.serialize()
+        entry = _PendingReply(key, time.monotonic() + self.ACK_TIMEOUT, keys)
+        with self.reply:
+            self.pending[entry.key].append(entry)
+            self.ser.write(data)
+        return entry
+
+    def _wait(self, entry) -> bool | None:
+        """
+        Waits for the reply to a message.
+
+        Returns:
+            bool: True for ACK-ACK, False for ACK-NAK, None on timeout.
+        """
+        with self.reply:
+            while not entry.done:
+                remaining = entry.deadline - time.monotonic()
+                if remaining <= 0:
+                    # Give up on it so that later replies match later messages
+                    self.pending[entry.key].remove(entry)
+                    entry.done = True
+                    break
+                self.reply.wait(remaining)
+            return entry.acked
+
+    def send_messages(self, ubx_msgs, keys=None) -> list[bool | None]:
+        """
+        Sends several messages, keeping up to `PIPELINE_DEPTH` of them in
+        flight instead of waiting for each acknowledgement in turn.
+
+        Args:
+            ubx_msgs (list): UBX messages (or serialized frames) that the
+                             receiver acknowledges.
+            keys (list): Per message, the configuration key IDs it writes,
+                         so their cached values are dropped on its ACK.
+
+        Returns:
+            list: Per message, True for ACK-ACK, False for ACK-NAK, None on timeout.
+        """
+        entries = []
+        for i, ubx_msg in enumerate(ubx_msgs):
+            if i >= self.PIPELINE_DEPTH:
+                self._wait(entries[i - self.PIPELINE_DEPTH])
+            entries.append(self._write(ubx_msg, keys[i] if keys else None))
+        return [self._wait(entry) for entry in entries]
             
     def send_config(self, ubx_msg) -> tuple[bool, str]:
         """
         A function to send a UBX-CFG message and verify acknowledgement.
 
         Args:
-            ubx_msg (UBXMessage): The UBX-CFG message to be sent.
+            ubx_msg (UBXMessage | list | CompiledConfig): The UBX-CFG message
+                to be sent, or a configuration to send with `send_compiled()`:
+                a compiled u-center file or (key, value) pairs for every layer.
 
         Returns:
             bool: True if the message was acknowledged, False otherwise.
             str: A message indicating the result of the operation.
         """
-        
-        # print("Sending Config Message...")
-        self.ser.write(ubx_msg.serialize())
-        self.ser.flush()
+        if isinstance(ubx_msg, (list, CompiledConfig)):
+            if isinstance(ubx_msg, list):
+                ubx_msg = CompiledConfig.from_cfg_data(ubx_msg)
+            success, msg, _ = self.send_compiled(ubx_msg)
+            return success, msg
+        acked = self.send_messages([ubx_msg])[0]
+        if acked:
+            return True, "Configuration applied successfully."
+        if acked is False:
+            return False, "Invalid configuration received."
+        return False, "No acknowledgement received within timeout."
+
+    def send_valset(self, cfg_data, layers=(SET_LAYER_RAM | SET_LAYER_FLASH | SET_LAYER_BBR)) -> tuple[bool, str, dict]:
+        """
+        Writes configuration keys with CFG-VALSET and reports the outcome per key.
 
-        # print("Waiting for ACK...")
-        return self._wait_for_reply(self.ACK_TIMEOUT)
+        Keys are split into size-limited messages. More than one message is
+        sent as a u-blox configuration transaction (begin, continue, commit),
+        so the receiver applies all keys or none. The messages before the
+        commit are pipelined; the commit is only sent once all of them were
+        acknowledged.
+
+        Args:
+            cfg_data (list): (key name, value) pairs.
+            layers (int): The layers to write, e.g. SET_LAYER_RAM | SET_LAYER_FLASH.
+
+        Returns:
+            bool: True if every key was applied.
+            str: A message indicating the result of the operation.
+            dict: Key name -> APPLIED, REJECTED, ABORTED or NO_ACK.
+        """
+        values = [ConfigValue.from_key(key, value) for key, value in cfg_data]
+        results = self._send_frames(build_valset_frames(values, layers, self.MAX_VALSET_KEYS, self.MAX_VALSET_PAYLOAD))
+        return self._summarize(results)
+
+    def _send_frames(self, frames) -> dict:
+        """
+        Sends CFG-VALSET frames from `build_valset_frames()`.
+
+        Returns:
+            dict: Key name -> APPLIED, REJECTED, ABORTED or NO_ACK.
+        """
+        keys = [[value.key_id for value in chunk] for _, chunk in frames]
+        results = {}
+        if len(frames) == 1:
+            acked = self.send_messages([frames[0][0]], keys)[0]
+            status = APPLIED if acked else REJECTED if acked is False else NO_ACK
+            results = {value.name: status for value in frames[0][1]}
+        elif frames:
+            with self.transaction_lock:
+                replies = self.send_messages([frame for frame, _ in frames[:-1]], keys[:-1])
+                if all(replies):
+                    replies.append(self.send_messages([frames[-1][0]], keys[-1:])[0])
+                else:
+                    # A failed transaction is never committed; the next start discards it.
+                    replies.append(None)
+                committed = replies[-1]
+                commit_sent = all(replies[:-1])
+                for i, ((_, chunk), acked) in enumerate(zip(frames, replies)):
+                    if committed:
+                        status = APPLIED
+                    elif acked is False:
+                        status = REJECTED
+                    elif acked is None and (i < len(frames) - 1 or commit_sent):
+                        status = NO_ACK
+                    else:
+                        status = ABORTED
+                    results.update({value.name: status for value in chunk})
+        return results
+
+    @staticmethod
+    def _summarize(results) -> tuple[bool, str, dict]:
+        failed = [key for key, status in results.items() if status not in (APPLIED, UNCHANGED, ABORTED)]
+        aborted = sum(status == ABORTED for status in results.values())
+        if not failed and not aborted:
+            return True, "Configuration applied successfully.", results
+        summary = ", ".join(f"{key} ({results[key]})" for key in failed)
+        if aborted:
+            summary += f"; {aborted} other keys aborted with the transaction"
+        return False, f"{len(failed) + aborted} of {len(results)} keys not applied: {summary}", results
     
+    @staticmethod
+    def _key_id(key) -> int:
+        return cfgname2key(key)[0] if isinstance(key, str) else key
+
+    def read_values(self, keys, layer=POLL_LAYER_RAM) -> dict[int, bytes]:
+        """
+        Returns the receiver's current values for configuration keys.
+
+        Cached values are used where available; the rest are polled with
+        pipelined CFG-VALGET messages of up to `MAX_VALGET_KEYS` keys. A
+        key missing from the result is unknown to the receiver or, for the
+        BBR and Flash layers, not stored there.
+
+        Args:
+            keys (list): Key names or IDs.
+            layer (int): POLL_LAYER_RAM, POLL_LAYER_BBR or POLL_LAYER_FLASH.
+
+        Returns:
+            dict: Key ID -> raw little-endian value bytes.
+        """
+        key_ids = [self._key_id(key) for key in keys]
+        with self.reply:
+            cached = self.values.setdefault(layer, {})
+            missing = [key_id for key_id in key_ids if key_id not in cached]
+        polls = [
+            UBXMessage.config_poll(layer, 0, missing[i:i + self.MAX_VALGET_KEYS])
+            for i in range(0, len(missing), self.MAX_VALGET_KEYS)
+        ]
+        self.send_messages(polls)
+        with self.reply:
+            cached = self.values[layer]
+            return {key_id: cached[key_id] for key_id in key_ids if key_id in cached}
+
+    def send_changed(self, cfg_data, layers=(SET_LAYER_RAM | SET_LAYER_FLASH | SET_LAYER_BBR)) -> tuple[bool, str, dict]:
+        """
+        Writes (key, value) pairs to `layers`, skipping the keys the receiver
+        already holds. See `send_compiled()`.
+        """
+        return self.send_compiled(CompiledConfig.from_cfg_data(cfg_data, layers))
+
+    def send_compiled(self, compiled: CompiledConfig) -> tuple[bool, str, dict]:
+        """
+        Writes only the keys whose value differs from what the receiver holds.
+
+        The current values are read back per layer with `read_values()`. A
+        layer group of the configuration that differs entirely (e.g. on a
+        fresh receiver) is sent as its precompiled CFG-VALSET frames;
+        otherwise the differing keys are grouped by the layers in which they
+        differ and written with `send_valset()` to just those layers, so an
+        unchanged Flash value is never rewritten. On a UART link, a RAM
+        value of CFG-UART1-BAUDRATE above the current rate is written last
+        with `set_baudrate()`, which moves the host port along with the
+        receiver. A lower one is skipped, so the configured rate is only a
+        floor for the rate the `DeviceManager` negotiated.
+
+        Args:
+            compiled (CompiledConfig): From `compile_config()` or
+                                       `CompiledConfig.from_cfg_data()`.
+
+        Returns:
+            bool: True if every key is now applied.
+            str: A message indicating the result, including how many keys were written.
+            dict: Key name -> UNCHANGED, APPLIED, REJECTED, ABORTED or NO_ACK.
+        """
+        current = {
+            layer: self.read_values([value.key_id for value in values.values()], POLL_LAYERS[layer])
+            for layer, values in compiled.layers.items()
+        }
+        sends = []
+        baudrate = None
+        for mask, values in compiled.groups.items():
+            stale = defaultdict(list)
+            for value in values:
+                stale_layers = 0
+                for layer in POLL_LAYERS:
+                    if mask & layer and current[layer].get(value.key_id) != value.raw:
+                        stale_layers |= layer
+                if value.name == UART_BAUDRATE_KEY and stale_layers & SET_LAYER_RAM and getattr(self.ser, "uart", False):
+                    stale_layers &= ~SET_LAYER_RAM
+                    # A higher rate the host negotiated on attach wins over the configured one
+                    if value.value > self.ser.baudrate:
+                        baudrate = value
+                stale[stale_layers].append(value)
+            if list(stale) == [mask]:
+                sends.append(compiled.valset_frames(mask, self.MAX_VALSET_KEYS, self.MAX_VALSET_PAYLOAD))
+                continue
+            for stale_layers, stale_values in stale.items():
+                if stale_layers:
+                    sends.append(build_valset_frames(stale_values, stale_layers, self.MAX_VALSET_KEYS, self.MAX_VALSET_PAYLOAD))
+
+        # A key with different values per layer is in several groups; report its worst outcome.
+        rank = {UNCHANGED: 0, APPLIED: 1, ABORTED: 2, NO_ACK: 3, REJECTED: 4}
+        results = {name: UNCHANGED for values in compiled.layers.values() for name in values}
+        written = set()
+        for frames in sends:
+            for name, status in self._send_frames(frames).items():
+                written.add(name)
+                if rank[status] > rank[results[name]]:
+                    results[name] = status
+        if baudrate is not None:
+            status = self.set_baudrate(baudrate.value)
+            written.add(baudrate.name)
+            if rank[status] > rank[results[baudrate.name]]:
+                results[baudrate.name] = status
+        success, msg, results = self._summarize(results)
+        if success:
+            msg = f"Configuration applied successfully ({len(written)} of {len(results)} keys written)."
+        return success, msg, results
+
+    def set_baudrate(self, baud) -> str:
+        """
+        Changes the receiver's UART1 rate (RAM layer) and then the host port
+        to match, and checks that the receiver still answers. If it does not,
+        the host goes back to the old rate; if the receiver is lost at both,
+        the port is detached so the `DeviceManager` finds the rate again.
+
+        The switch is not acknowledged reliably, since the receiver may
+        change rate before its ACK is out, so it is confirmed by reading the
+        key back at the new rate instead.
+
+        Args:
+            baud (int): The new rate.
+
+        Returns:
+            str: APPLIED, REJECTED (the receiver kept the old rate) or NO_ACK.
+        """
+        ser = self.ser
+        if baud in getattr(ser, "failed_bauds", ()):
+            return REJECTED
+        old = ser.baudrate
+        value = ConfigValue(UART_BAUDRATE_KEY, baud)
+        frame = UBXMessage.config_set(SET_LAYER_RAM, TXN_NONE, [(UART_BAUDRATE_KEY, baud)]).serialize()
+        with self.transaction_lock:
+            with self.reply:
+                ser.write(frame)
+            ser.flush()
+            time.sleep(self.BAUD_SWITCH_DELAY)
+            ser.baudrate = baud
+            with self.reply:
+                self._invalidate([value.key_id])
+            if self.read_values([value.key_id]).get(value.key_id) == value.raw:
+                print(f"{'ubx_config':<20}: Switched UART1 from {old} to {baud} baud")
+                return APPLIED
+            if hasattr(ser, "failed_bauds"):
+                ser.failed_bauds.add(baud)
+            ser.baudrate = old
+            if self.read_values([value.key_id]):
+                print(f"{'ubx_config':<20}: No reply at {baud} baud, staying at {old}")
+                return REJECTED
+        print(f"{'ubx_config':<20}: Lost the receiver switching to {baud} baud")
+        if hasattr(ser, "detach"):
+            ser.detach(f"no reply at {old} or {baud} baud")
+        return NO_ACK
+
     def send_fixed(self, lat_deg: float, lon_deg: float, height_m: float) -> tuple[bool, str]:
         """
         Sends a fixed position configuration to the u-blox receiver.
@@ -96,12 +496,8 @@ class UBXConfig:
             ('CFG_TMODE_LON', int(lon_deg * 1e7)),      # Longitude in 1e-7 degrees
             ('CFG_TMODE_HEIGHT', int(height_m * 100)),  # Height in cm
         ]
-        msg = UBXMessage.config_set(
-            layers=(SET_LAYER_RAM | SET_LAYER_FLASH | SET_LAYER_BBR),
-            transaction=TXN_NONE,
-            cfgData=cfg_data,
-        )
-        return self.send_config(msg)
+        self.station_mode = cfg_data
+        return self.send_config(cfg_data)
     
     def send_survey(self) -> tuple[bool, str]:
         """
@@ -118,26 +514,49 @@ class UBXConfig:
             ('CFG_MSGOUT_UBX_NAV_SVIN_USB', 1),    # Enable UBX_NAV_SVIN on USB
             ('CFG_MSGOUT_UBX_NAV_SVIN_UART1', 1),  # Enable UBX_NAV_SVIN on UART1
         ]
-        msg = UBXMessage.config_set(
-            layers=(SET_LAYER_RAM | SET_LAYER_FLASH | SET_LAYER_BBR),
-            transaction=TXN_NONE,
-            cfgData=cfg_data,
-        )
-        return self.send_config(msg)
+        self.station_mode = cfg_data
+        return self.send_config(cfg_data)
+
+    def restore_station_mode(self) -> tuple[bool, str] | None:
+        """
+        Sends the last `send_fixed()` or `send_survey()` configuration again,
+        e.g. after the receiver was replugged. Keys it still holds are not
+        rewritten.
+
+        Returns:
+            tuple: The result of `send_config()`, or None if neither was sent yet.
+        """
+        if self.station_mode is None:
+            return None
+        return self.send_config(self.station_mode)
 
     @staticmethod
-    def _signed_64(value) -> int:
+    def parse_u_center_config_from_string(config_data_str: str) -> list[tuple[str, object]]:
         """
-        Converts a 64-bit hexadecimal string to a signed integer.
+        Parses a u-center configuration string into (key, value) pairs for
+        `send_valset()`. Use `compile_config()` to keep every layer.
 
         Args:
-            value (str): The hexadecimal string to convert.
+            config_data_str (str): The u-center configuration as a string.
 
         Returns:
-            int: The signed integer representation of the hexadecimal value.
+            list: (key name, value) pairs of the Flash layer.
+
+        Raises:
+            ConfigError: If the configuration is invalid.
         """
-        value = int(value, base=16)
-        return -(value & 0x8000000000000000) | (value & 0x7fffffffffffffff)
+        return compile_config(config_data_str).cfg_data(SET_LAYER_FLASH)
+
+    @staticmethod
+    def parse_u_center_config(config_file) -> list[tuple[str, object]]:
+        """
+        Parses a u-center configuration file (.txt) into (key, value) pairs
+        for `send_valset()`. Use `compile_config_file()` to keep every layer.
+
+        Args:
+            config_file (str): The path to the u-center configuration file.
+        """
+        return compile_config_file(config_file).cfg_data(SET_LAYER_FLASH)
 
     @staticmethod
     def convert_u_center_config_from_string(config_data_str: str) -> UBXMessage:
@@ -145,41 +564,21 @@ class UBXConfig:
         Converts a u-center configuration string to a pyubx2 UBXMessage.
         This allows a configuration generated by the u-center software to be
         programmatically sent to a u-blox receiver from a string.
+
+        A single CFG-VALSET holds at most 64 keys; larger configurations
+        must be sent with `send_compiled()`.
+
         Args:
             config_data_str (str): The u-center configuration as a string.
         Returns:
             UBXMessage: A UBX-CFG-VALSET message containing the configuration data.
         """
-        cfg_data = []
-
-        # Parse the u-center config string line by line.
-        for line in config_data_str.splitlines():
-            striped_line = line.strip()
-            if striped_line.startswith('#'):
-                continue
-            split_line = striped_line.split()
-            if split_line:
-                layer = split_line[0]
-                # Only process Flash layer for now
-                if layer == 'Flash':
-                    ubx_id = split_line[1].replace('-', '_') # ID's must use _
-                    (key, ubx_attribute_type) = UBX_CONFIG_DATABASE[ubx_id] # Get the attribute string name
-                    attribute_type = ATTTYPE[atttyp(ubx_attribute_type)] # Get the class of attribute
-                    if attribute_type is bytes:
-                        temp_msg = (ubx_id, int(split_line[2], 0).to_bytes(length=1, byteorder='big')) # Must convert to bytes if ID requires it
-                    elif ubx_id == 'CFG_TMODE_LON':
-                        temp_msg = (ubx_id, UBXConfig._signed_64(split_line[2])) # Negative numbers in hex work weird
-                    else:
-                        temp_msg = (ubx_id, int(split_line[2], 0))
-                    cfg_data.append(temp_msg)
-
         # Create a UBX-CFG-VALSET message with the parsed configuration data.
         msg = UBXMessage.config_set(
             layers=(SET_LAYER_RAM | SET_LAYER_FLASH | SET_LAYER_BBR),
             transaction=TXN_NONE,
-            cfgData=cfg_data,
+            cfgData=UBXConfig.parse_u_center_config_from_string(config_data_str),
         )
-        # print(msg)
         return msg
 
     @staticmethod
@@ -0,0 +1,302 @@
+"""
+Lightweight UBX/RTCM3/NMEA framing and selective UBX parsing.
+
+`UBXReader.read()` fully decodes every message it frames, including the large
+RXM-RAWX and RXM-SFRBX payloads that the base station only appends to its raw
+log and NAV-SAT blocks with dozens of repeated groups. `UBXFramer` instead
+reads the serial port in chunks, validates sync bytes and checksums, and
+hands back raw frames. `UBXDispatcher` looks at the class/ID in the UBX
+header and only runs the full pyubx2 parse for message types that have a
+registered handler; everything else stays raw bytes.
+
+Run this module with a recorded capture to benchmark both approaches:
+
+    python ubx_framer.py ./shared/raw_ubx/station-000000-*.ubx
+"""
+
+import re
+from itertools import accumulate
+
+from pyubx2 import UBXReader, UBX_MSGIDS, VALNONE, NMEA_PROTOCOL, UBX_PROTOCOL, RTCM3_PROTOCOL
+
+MAX_UBX_PAYLOAD = 8192      # Larger lengths are treated as a corrupt header
+MAX_NMEA_LENGTH = 164       # Longest sentence incl. CRLF with some margin
+READ_CHUNK = 4096           # Bytes per read when the stream cannot report a backlog
+
+_SYNC = re.compile(rb"[\xb5\xd3$]")
+
+def _crc24q_table() -> list[int]:
+    table = []
+    for i in range(256):
+        crc = i << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= 0x1864CFB
+        table.append(crc & 0xFFFFFF)
+    return table
+
+_CRC24Q_TABLE = _crc24q_table()
+
+def crc24q(data) -> int:
+    """
+    Computes the RTCM3 CRC-24Q of `data`.
+    """
+    crc = 0
+    table = _CRC24Q_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ byte]
+    return crc
+
+def ubx_checksum(data) -> bytes:
+    """
+    Computes the 8-bit Fletcher checksum of a UBX class/ID/length/payload.
+
+    CK_B is the sum of all running CK_A values, which `accumulate` produces
+    without a Python-level loop.
+    """
+    return bytes((sum(data) & 0xFF, sum(accumulate(data)) & 0xFF))
+
+def ubx_key(identity: str) -> bytes:
+    """
+    Returns the two byte class/ID for a pyubx2 message identity such as "NAV-PVT".
+
+    Raises:
+        KeyError: If the identity is unknown to pyubx2.
+    """
+    for key, name in UBX_MSGIDS.items():
+        if name == identity:
+            return key
+    raise KeyError(identity)
+
+class UBXFramer:
+    """
+    Splits a byte stream into validated UBX, RTCM3 and NMEA frames without
+    decoding their payloads.
+    """
+
+    def __init__(self, stream, protocols=UBX_PROTOCOL | NMEA_PROTOCOL | RTCM3_PROTOCOL):
+        """
+        Args:
+            stream: A serial port or file-like object with a `read()` method.
+            protocols (int): Bitmask of protocols to return; others are
+                             framed and discarded.
+        """
+        self.stream = stream
+        self.protocols = protocols
+        self.buf = bytearray()
+        self.bytes_read = 0
+        self.checksum_errors = 0
+        self.discarded_bytes = 0
+
+    def _fill(self) -> int:
+        """
+        Reads whatever the stream has available (at least one byte, subject
+        to the stream's timeout).
+
+        Returns:
+            int: The number of bytes read. 0 means timeout or end of stream.
+        """
+        size = getattr(self.stream, "in_waiting", READ_CHUNK) or 1
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        self.buf += data
+        return len(data)
+
+    def _discard(self, count):
+        del self.buf[:count]
+        self.discarded_bytes += count
+
+    def _resync(self):
+        """
+        Drops bytes up to the next possible sync character.
+        """
+        match = _SYNC.search(self.buf, 1)
+        self._discard(match.start() if match else len(self.buf))
+
+    def _next_frame(self) -> tuple[int, bytes] | None:
+        """
+        Extracts the next complete frame from the buffer.
+
+        Returns:
+            tuple: (protocol, raw bytes), or None if more data is needed.
+        """
+        buf = self.buf
+        while buf:
+            n = len(buf)
+            first = buf[0]
+            if first == 0xB5:
+                if n < 6:
+                    return None
+                length = buf[4] | (buf[5] << 8)
+                if buf[1] != 0x62 or length > MAX_UBX_PAYLOAD:
+                    self._resync()
+                    continue
+                total = length + 8
+                if n < total:
+                    return None
+                with memoryview(buf) as view:
+                    valid = ubx_checksum(view[2:total - 2]) == view[total - 2:total]
+                if not valid:
+                    self.checksum_errors += 1
+                    self._resync()
+                    continue
+                frame = bytes(buf[:total])
+                del buf[:total]
+                return UBX_PROTOCOL, frame
+            if first == 0xD3:
+                if n < 3:
+                    return None
+                if buf[1] & 0xFC:
+                    self._resync()
+                    continue
+                total = (((buf[1] & 0x03) << 8) | buf[2]) + 6
+                if n < total:
+                    return None
+                with memoryview(buf) as view:
+                    valid = crc24q(view[:total - 3]) == int.from_bytes(view[total - 3:total], "big")
+                if not valid:
+                    self.checksum_errors += 1
+                    self._resync()
+                    continue
+                frame = bytes(buf[:total])
+                del buf[:total]
+                return RTCM3_PROTOCOL, frame
+            if first == 0x24:
+                end = buf.find(b"\n", 0, MAX_NMEA_LENGTH)
+                if end < 0:
+                    if n >= MAX_NMEA_LENGTH:
+                        self._resync()
+                        continue
+                    return None
+                frame = bytes(buf[:end + 1])
+                del buf[:end + 1]
+                return NMEA_PROTOCOL, frame
+            self._resync()
+        return None
+
+    def read(self) -> tuple[int, bytes] | None:
+        """
+        Returns the next frame of a wanted protocol.
+
+        Returns:
+            tuple: (protocol, raw bytes), or None if the stream timed out or
+                   ended before a complete frame arrived.
+        """
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                if not self._fill():
+                    return None
+                continue
+            if frame[0] & self.protocols:
+                return frame
+
+class UBXDispatcher:
+    """
+    Routes raw UBX frames to handlers keyed by message identity. Only frames
+    with a registered handler are parsed; all others are counted and passed
+    through untouched.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.parsed = 0
+        self.passed_through = 0
+
+    def register(self, identity: str, handler, raw=False):
+        """
+        Registers a handler for a message type.
+
+        Args:
+            identity (str): The pyubx2 identity, e.g. "NAV-PVT".
+            handler (callable): Called with the parsed UBXMessage.
+            raw (bool): If True, the handler decodes the frame itself and is
+                        called with the raw bytes instead.
+        """
+        self.handlers[ubx_key(identity)] = (handler, raw)
+
+    def wants(self, raw_data) -> bool:
+        """
+        Returns True if the frame has a registered handler.
+        """
+        return raw_data[2:4] in self.handlers
+
+    def dispatch(self, raw_data) -> bool:
+        """
+        Parses the frame and calls its handler, if one is registered.
+        The checksum has already been validated by the framer.
+
+        Args:
+            raw_data (bytes): A complete UBX frame.
+
+        Returns:
+            bool: True if a handler ran.
+        """
+        entry = self.handlers.get(raw_data[2:4])
+        if entry is None:
+            self.passed_through += 1
+            return False
+        handler, raw = entry
+        if raw:
+            handler(raw_data)
+        else:
+            self.parsed += 1
+            handler(UBXReader.parse(raw_data, validate=VALNONE))
+        return True
+
+if __name__ == "__main__":
+    """
+    Replays a recorded capture through `UBXReader` (parse everything) and
+    through `UBXFramer` + `UBXDispatcher` (parse ACK and NAV-PVT only, with
+    NAV-SAT handled by the vectorized `SatelliteStats`), and reports the CPU
+    time saved per second of capture.
+    """
+    import glob
+    import sys
+    import time
+
+    from nav_sat import SatelliteStats
+
+    # By default the oldest segment of the base station's raw UBX log
+    segments = sys.argv[1:2] or sorted(glob.glob("./shared/raw_ubx/station-*.ubx"))[:1]
+    if not segments:
+        sys.exit("Usage: python ubx_framer.py <capture.ubx>")
+    capture = segments[0]
+    with open(capture, "rb") as f:
+        data = f.read()
+
+    def full_parse() -> tuple[int, float]:
+        import io
+        frames = 0
+        start = time.process_time()
+        for raw_data, _ in UBXReader(io.BytesIO(data), protfilter=UBX_PROTOCOL | RTCM3_PROTOCOL, quitonerror=0):
+            frames += 1
+        return frames, time.process_time() - start
+
+    epochs = []
+    def selective_parse() -> tuple[int, float]:
+        import io
+        dispatcher = UBXDispatcher()
+        for identity in ("ACK-ACK", "ACK-NAK"):
+            dispatcher.register(identity, lambda msg: None)
+        dispatcher.register("NAV-SAT", SatelliteStats("station_telemetry").nav_sat, raw=True)
+        dispatcher.register("NAV-PVT", lambda msg: epochs.append(msg.iTOW))
+        framer = UBXFramer(io.BytesIO(data), protocols=UBX_PROTOCOL | RTCM3_PROTOCOL)
+        frames = 0
+        start = time.process_time()
+        while (frame := framer.read()) is not None:
+            frames += 1
+            if frame[0] == UBX_PROTOCOL:
+                dispatcher.dispatch(frame[1])
+        return frames, time.process_time() - start
+
+    full_frames, full_cpu = full_parse()
+    selective_frames, selective_cpu = selective_parse()
+    duration = (epochs[-1] - epochs[0]) / 1000 + 1 if len(epochs) > 1 else 1.0
+
+    print(f"Capture            : {capture} ({len(data)} bytes, ~{duration:.0f} s of data)")
+    print(f"UBXReader          : {full_frames} frames, {full_cpu:.3f} s CPU")
+    print(f"Framer + dispatch  : {selective_frames} frames, {selective_cpu:.3f} s CPU")
+    print(f"CPU saved          : {(full_cpu - selective_cpu) / duration * 1000:.2f} ms per second of capture "
+          f"({full_cpu / selective_cpu if selective_cpu else float('inf'):.1f}x)")
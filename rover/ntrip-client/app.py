@@ -15,43 +15,119 @@ consists of the following main components:
 
 The script is configured via a `GPS_TYPE` variable and environment variables
 for InfluxDB credentials. It is designed to be terminated gracefully with CTRL-C.
+
+Setting `ROVER_RUNTIME=asyncio` runs the same components on a single asyncio
+event loop instead (`async_app`), which avoids a thread per concern on small
+single-board computers.
 """
 
-from datetime import datetime, timedelta, timezone
+from datetime import datetime
 from threading import Event, Thread
+from async_runtime import SerialReader, AsyncNTRIPClient, ConsoleControl
+import asyncio
+import signal
 import time
 import sys
 import os
 
 import dotenv
 import requests
-from pyubx2 import UBXReader
-from pyubx2.ubxhelpers import gnss2str
-from influxdb_client_3 import Point
+from pyubx2 import UBX_PROTOCOL
 from pygnssutils import GNSSNTRIPClient
 from pygnssutils.gnssntripclient import GGAFIXED
 
 
 try:
     from common.ubx_config import UBXConfig
+    from common.config_compiler import compile_config_file
+    from common.message_profiles import apply_profile, profile_override
     from common.gps_reader import GPSReader
-    from common.influx_client import InfluxWriter
-    from common.config_server import ConfigServer
+    from common.influx_client import InfluxWriter, AsyncInfluxWriter
+    from common.config_server import ConfigServer, AsyncConfigServer
+    from common.nav_sat import SatelliteStats
+    from common.line_protocol import RoverMetricsEncoder
+    from common.serial_pipeline import SerialPipeline
+    from common.ubx_framer import UBXDispatcher
 except ImportError:
     sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
     from ubx_config import UBXConfig
+    from config_compiler import compile_config_file
+    from message_profiles import apply_profile, profile_override
     from gps_reader import GPSReader
-    from influx_client import InfluxWriter
-    from config_server import ConfigServer
+    from influx_client import InfluxWriter, AsyncInfluxWriter
+    from config_server import ConfigServer, AsyncConfigServer
+    from nav_sat import SatelliteStats
+    from line_protocol import RoverMetricsEncoder
+    from serial_pipeline import SerialPipeline
+    from ubx_framer import UBXDispatcher
+
+def make_dispatcher(gps_type, ubx_config, save_event, write, serial_number=None) -> tuple[UBXDispatcher, RoverMetricsEncoder]:
+    """
+    Builds the UBX message handlers shared by the threaded and the asyncio
+    runtime. Only message types with a registered handler are parsed.
+
+    Args:
+        gps_type (str): The receiver type, used as the "device" tag.
+        ubx_config (UBXConfig): Receives the ACK/NAK replies to configuration messages.
+        save_event (Event): An event to control whether position data should be written.
+        write (callable): Buffers line protocol records for InfluxDB, e.g.
+                          `InfluxWriter.batch_write`.
+        serial_number (str): The receiver's serial number, used as the "serial" tag.
+
+    Returns:
+        tuple: The dispatcher and the encoder of the "metrics" rows.
+    """
+    encoder = RoverMetricsEncoder(gps_type, serial_number)
+    sat_stats = SatelliteStats("metrics", {"device": gps_type, "serial": serial_number})
+    last_rxm_rtcm_time = 0
+
+    def on_nav_pvt(parsed_data):
+        try:
+            # Position fields are only written while the fix is valid,
+            # and latitude/longitude only while saving is allowed.
+            write(encoder.nav_pvt(parsed_data, save_event.is_set()))
+        except Exception as e:
+            print(f"{'read_messages_thread':<20}: Ignoring error: {e}")
+
+    def on_nav_sat(raw_data):
+        # Overall counts (SBAS excluded) plus one row per constellation,
+        # computed straight from the raw satellite blocks.
+        totals, rows = sat_stats.nav_sat(raw_data)
+        write([encoder.sat_counts(*totals), *rows])
+
+    def on_nav_sig(raw_data):
+        # Only received when NAV-SIG output is enabled on the receiver.
+        write(sat_stats.nav_sig(raw_data))
+
+    def on_rxm_rtcm(parsed_data):
+        nonlocal last_rxm_rtcm_time
+        # print(f"{'read_messages_thread:':<20}: DEBUG: {parsed_data}")
+        RXM_RTCM_LOG_INTERVAL = 10  # seconds
+        if time.time() >= last_rxm_rtcm_time + RXM_RTCM_LOG_INTERVAL:
+            last_rxm_rtcm_time = time.time()
+            write(encoder.rtcm_received(int(time.time()*1e9)))
+
+    dispatcher = UBXDispatcher()
+    dispatcher.register('ACK-ACK', ubx_config.set_ack)
+    dispatcher.register('ACK-NAK', ubx_config.set_nack)
+    dispatcher.register('CFG-VALGET', ubx_config.set_valget, raw=True)
+    dispatcher.register('NAV-PVT', on_nav_pvt)
+    dispatcher.register('NAV-SAT', on_nav_sat, raw=True)
+    dispatcher.register('NAV-SIG', on_nav_sig, raw=True)
+    dispatcher.register('RXM-RTCM', on_rxm_rtcm)
+    return dispatcher, encoder
 
 def read_messages_thread(gps, ubx_config, save_event, stop_event):
     """
     Reads parsed UBX NAV-PVT data from the GPS and writes it to InfluxDB.
 
-    This function continuously reads from the GPS device. When a `NAV-PVT`
-    (Position, Velocity, Time) message is received, it extracts key metrics,
-    formats them as a data point, and writes them to the InfluxDB "GPS"
-    database using line protocol.
+    A `SerialPipeline` reader thread drains the serial port and frames raw
+    UBX messages into a bounded ring. This function consumes that ring and
+    only parses message types with a registered handler: when
+    a `NAV-PVT` (Position, Velocity, Time) message is received, it extracts
+    key metrics, formats them as a data point, and writes them to the
+    InfluxDB "GPS" database using line protocol. Pipeline counters (queue
+    depth, dropped frames, serial bytes/s) are published periodically.
 
     Args:
         gps (GPSReader): The GPS reader object.
@@ -61,101 +137,86 @@ def read_messages_thread(gps, ubx_config, save_event, stop_event):
     """
 
     print(f"{'read_messages_thread':<20}: Starting...")
-    ubr = UBXReader(gps.ser)
-    last_rxm_rtcm_time = 0
-    
-    def get_repeated_field(parsed_data, field_name, index):
-        return getattr(parsed_data, f"{field_name}_{index+1:02d}")
+    pipeline = SerialPipeline(gps.ser, stop_event, protocols=UBX_PROTOCOL)
+    pipeline.start()
+    ubx_frames = pipeline.ring(UBX_PROTOCOL)
+    # Only messages with a handler are fully parsed, everything else is skipped.
+    dispatcher, encoder = make_dispatcher(gps.gps_type, ubx_config, save_event, InfluxWriter.batch_write, gps.serial_number)
+    PIPELINE_STATS_INTERVAL = 10  # seconds
+    last_stats_time = time.time()
     
     while not stop_event.is_set():
-        _, parsed_data = ubr.read()
-        if parsed_data:
-            match parsed_data.identity:
-                case 'ACK-ACK':
-                    ubx_config.set_ack()
-                case 'ACK-NAK':
-                    ubx_config.set_nack()
-                case 'NAV-PVT':
-                    try:
-                        point = Point("metrics").tag("device", gps.gps_type)
-                        # Only write position data if fix is valid
-                        if parsed_data.gnssFixOk:
-                            # Only save lat/lon if allowed
-                            if save_event.is_set():
-                                point.field("latitude", parsed_data.lat) \
-                                    .field("longitude", parsed_data.lon)
-                            point.field("altitude_m", parsed_data.hMSL/1000) \
-                                .field("ground_speed_ms", parsed_data.gSpeed / 1000) \
-                                .field("ground_heading_deg", parsed_data.headMot) \
-                                .field("horizontal_accuracy_m", parsed_data.hAcc/1000) \
-                                .field("vertical_accuracy_m", parsed_data.vAcc/1000) \
-                                .field("speed_accuracy_ms", parsed_data.sAcc/1000) \
-                                .field("heading_accuracy_deg", parsed_data.headAcc)
-                            # print(f"{'read_messages_thread':<20}: Latitude: {parsed_data.lat}")
-                            # print(f"{'read_messages_thread':<20}: Longitude: {parsed_data.lon}")
-                        
-                        # Common fields
-                        point.field("fix_type_int", int(parsed_data.fixType)) \
-                            .field("fix_ok_int", int(parsed_data.gnssFixOk)) \
-                            .field('carrier_phase_range_int', int(parsed_data.carrSoln)) \
-                            .field('last_correction_age_int', int(parsed_data.lastCorrectionAge))
-
-                        # Use the provided timestamp if available, otherwise use current time
-                        if parsed_data.validTime and parsed_data.validDate:
-                            nano = parsed_data.nano
-                            seconds_to_subtract = 0
-                            if nano < 0:
-                                seconds_to_subtract = 1
-                                nano += int(1e9)
-                            dt = datetime(
-                                year=parsed_data.year, month=parsed_data.month, day=parsed_data.day,
-                                hour=parsed_data.hour, minute=parsed_data.min, second=parsed_data.second,
-                                microsecond=int(nano/1e3), tzinfo=timezone.utc
-                            )
-                            dt = dt - timedelta(seconds=seconds_to_subtract)
-                            point.time(int(dt.timestamp()*1e9))
-                            # print(f"{'read_messages_thread':<20}: GPS Timestamp: {dt.isoformat()}")
-                        else:
-                            point.time(int(time.time()*1e9))
-                        InfluxWriter.batch_write(point)
-                    except Exception as e:
-                        print(f"{'read_messages_thread':<20}: Ignoring error: {e}")
-                case 'NAV-SAT':
-                        # Use for debugging purposes            
-                        num_sats = 0
-                        num_sats_visible = 0
-                        num_sats_code_locked = 0
-                        num_sats_carrier_locked = 0
-                        for i in range(parsed_data.numSvs):
-                            constellation = gnss2str(get_repeated_field(parsed_data, "gnssId", i))
-                            qualityInd = get_repeated_field(parsed_data, "qualityInd", i)
-                            if constellation != "SBAS":
-                                if qualityInd >= 5:
-                                    num_sats_carrier_locked += 1
-                                if qualityInd >= 4:
-                                    num_sats_code_locked += 1
-                                if qualityInd >= 2:
-                                    num_sats_visible += 1
-                            num_sats += 1
-                        point = Point("metrics").tag("device", gps.gps_type) \
-                            .field("num_sats_tracked", int(num_sats)) \
-                            .field("num_sats_visible", int(num_sats_visible)) \
-                            .field("num_sats_code_locked", int(num_sats_code_locked)) \
-                            .field("num_sats_carrier_locked", int(num_sats_carrier_locked))
-                        InfluxWriter.batch_write(point)
-                case 'RXM-RTCM':
-                    # print(f"{'read_messages_thread:':<20}: DEBUG: {parsed_data}")
-                    RXM_RTCM_LOG_INTERVAL = 10  # seconds
-                    if time.time() >= last_rxm_rtcm_time + RXM_RTCM_LOG_INTERVAL:
-                        last_rxm_rtcm_time = time.time()
-                        point = Point("metrics") \
-                                .tag("device", gps.gps_type) \
-                                .field("ntrip_client_rtcm_received_int", 1) \
-                                .time(int(time.time()*1e9))
-                        InfluxWriter.batch_write(point)
-            # print(f"{'read_messages_thread:':<20}: DEBUG: {parsed_data}")
+        if time.time() >= last_stats_time + PIPELINE_STATS_INTERVAL:
+            last_stats_time = time.time()
+            stats = pipeline.get_stats()
+            if hasattr(gps.ser, "get_stats"):
+                stats.update(gps.ser.get_stats())
+            InfluxWriter.batch_write(encoder.encode_dict(stats, int(last_stats_time*1e9)))
+        frame = ubx_frames.get(timeout=1)
+        if frame is None:
+            continue
+        try:
+            dispatcher.dispatch(frame[1])
+        except Exception as e:
+            print(f"{'read_messages_thread':<20}: Ignoring unparsable frame: {e}")
     print(f"{'read_messages_thread':<20}: Exiting.")
 
+def receiver_config(gps):
+    """
+    Returns the configuration sent to a receiver at startup, by receiver type.
+    """
+    match gps.gps_type:
+        case "BUDGET":
+            return gps.get_nav_pvt_config()
+        case "PREMIUM":
+            return gps.get_nav_pvt_config(uart=True)
+        case "SPARKFUN":
+            return compile_config_file('R_Config.txt')
+
+def configure_receiver(gps, ubx_config, config_msg):
+    """
+    Sends the startup configuration and, on SparkFun receivers, the output
+    rate profile. Also called when a receiver comes back after being
+    unplugged, since its RAM configuration may have been reset.
+    """
+    success, msg = ubx_config.send_config(config_msg)
+    if success:
+        print(f"\n\nBase station configured successfully: {msg}\n\n")
+    else:
+        print(f"\n\nFailed to configure base station: {msg}\n\n")
+    if gps.gps_type == "SPARKFUN":
+        # Only output what the rover reports
+        apply_profile(ubx_config, profile_override() or "operational")
+
+def reconfigure_on_reconnect(gps, ubx_config, config_msg):
+    """
+    Registers a handler that configures the receiver again whenever the
+    device manager reopens it.
+    """
+    def on_reconnect(device):
+        ubx_config.forget_values()
+        Thread(target=configure_receiver, args=(gps, ubx_config, config_msg), daemon=True).start()
+    gps.ser.add_listener(on_reconnect)
+
+def start_receiver(receiver, config_msg, save_event, stop_event) -> tuple[UBXConfig, Thread]:
+    """
+    Starts reading a receiver on its own thread and configures it, again
+    whenever it is replugged.
+
+    Returns:
+        UBXConfig: The receiver's configuration interface.
+        Thread: Its started reader thread.
+    """
+    ubx_config = UBXConfig(receiver.ser)
+    read_thread = Thread(
+        target=read_messages_thread,
+        args=(receiver, ubx_config, save_event, stop_event),
+    )
+    read_thread.start()
+    configure_receiver(receiver, ubx_config, config_msg)
+    reconfigure_on_reconnect(receiver, ubx_config, config_msg)
+    return ubx_config, read_thread
+
 def input_thread(save_event, stop_event):
     """
     Thread to handle user input for timing and controlling data saving.
@@ -186,6 +247,91 @@ def input_thread(save_event, stop_event):
             save_event.set()
     print(f"{'input_thread':<20}: Exiting.")
 
+async def async_app(gps, config_msg, ntrip, save_event):
+    """
+    Runs the rover on one asyncio event loop.
+
+    The serial port is read with `SerialReader` instead of a `SerialPipeline`
+    thread, corrections come from `AsyncNTRIPClient` instead of the
+    pygnssutils client thread, telemetry is posted by `AsyncInfluxWriter` over
+    one connection and `AsyncConfigServer` replaces the Flask thread. On
+    CTRL-C or SIGTERM the NTRIP client, config endpoint and serial reader
+    are stopped in that order before the Influx buffer is flushed.
+
+    Args:
+        gps (GPSReader): The GPS reader object.
+        config_msg (UBXMessage): The configuration sent to the receiver at startup.
+        ntrip (tuple): (server, mountpoint, user) of the caster, or None.
+        save_event (Event): An event to control whether data should be written to InfluxDB.
+    """
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    writer = AsyncInfluxWriter()
+    writer.enable_spool("./shared/influx_spool")
+    writer_task = asyncio.create_task(writer.run())
+    ubx_config = UBXConfig(gps.ser)
+    dispatcher, encoder = make_dispatcher(gps.gps_type, ubx_config, save_event, writer.batch_write, gps.serial_number)
+
+    async def resume_reader():
+        # Wait for the device manager to reopen the receiver, then configure it again
+        while not stop.is_set():
+            if await loop.run_in_executor(None, gps.ser.wait_connected, 1):
+                reader.start()
+                ubx_config.forget_values()
+                await loop.run_in_executor(None, configure_receiver, gps, ubx_config, config_msg)
+                return
+
+    reader = SerialReader(gps.ser, dispatcher, on_error=lambda: loop.create_task(resume_reader()))
+    reader.start()
+    console = ConsoleControl(save_event)
+    console.start()
+
+    # send_config() blocks until the ACK arrives, which is dispatched on this loop
+    await loop.run_in_executor(None, configure_receiver, gps, ubx_config, config_msg)
+
+    tasks = []
+    ntrip_client = None
+    if ntrip:
+        server, mountpoint, ntripuser = ntrip
+        ntrip_client = AsyncNTRIPClient(server, mountpoint, ntripuser, "none", gps.ser)
+        tasks.append(asyncio.create_task(ntrip_client.run()))
+    config_server = AsyncConfigServer(ubx_config)
+    try:
+        await config_server.start()
+    except OSError as e:
+        print(f"{'config_server':<20}: Could not start: {e}")
+
+    print(f"{'main_thread':<20}: Tasks started, press CTRL-C to terminate...")
+    STATS_INTERVAL = 10  # seconds
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), STATS_INTERVAL)
+        except asyncio.TimeoutError:
+            if reader.loop is not None and not gps.ser.connected:
+                # Closed by the device manager before the reader noticed
+                reader.stop()
+                loop.create_task(resume_reader())
+            stats = {**reader.get_stats(), **gps.ser.get_stats()}
+            if ntrip_client is not None:
+                stats.update(ntrip_client.get_stats())
+            writer.batch_write(encoder.encode_dict(stats, int(time.time()*1e9)))
+
+    print(f"\n{'main_thread':<20}: Termination signal received, shutting down...")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await config_server.close()
+    console.stop()
+    reader.stop()
+    await writer.close()
+    await writer_task
+
+def raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
 def app():
     """
     Main application function to set up and run the NTRIP client threads.
@@ -194,7 +340,7 @@ def app():
     1. Initializes the GPS reader based on the detected hardware.
     2. Creates and starts the necessary threads for fetching RTCM data,
        processing it, and logging GPS data to InfluxDB.
-    3. Waits for a `KeyboardInterrupt` (CTRL-C) to terminate the application.
+    3. Waits for a `KeyboardInterrupt` (CTRL-C or SIGTERM) to terminate the application.
     4. Sets a `stop_event` to signal all threads to shut down gracefully.
     5. Joins all threads to ensure they have finished before exiting.
     6. Closes the serial connection to the GPS device.
@@ -202,24 +348,26 @@ def app():
     
     print("Starting Polaris NTRIP Client...")
     
+    # `docker stop` sends SIGTERM, shut down like on CTRL-C so buffered data is written
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+    
     # Initialize variables
     thread_pool = []
     stop_event = Event()
     save_event = Event()
     save_event.set()
 
-    # Configure the GPS reader based on the detected hardware type
-    gps = GPSReader()
+    # Open every connected receiver. The first one receives the corrections,
+    # any others (e.g. heading or backup) only report telemetry.
+    receivers = GPSReader.all()
+    gps = receivers[0]
     gnc = None
     
     # Determine GPS type and set up configuration accordingly
+    config_msg = receiver_config(gps)
     match gps.gps_type:
-        case "BUDGET":
-            config_msg = gps.get_nav_pvt_config()
-        case "PREMIUM":
-            config_msg = gps.get_nav_pvt_config(uart=True)
         case "SPARKFUN":
-            config_msg = UBXConfig.convert_u_center_config('R_Config.txt')
+            # Corrections are only streamed to ZED-F9P receivers
             if len(sys.argv) > 1:
                 if sys.argv[1] == "personal":
                     dotenv.load_dotenv()
@@ -236,6 +384,19 @@ def app():
                 gnc = GNSSNTRIPClient()
                 print(f"{'ntrip_client':<20}: Using RTK caster at {server}")
     
+    if os.getenv("ROVER_RUNTIME") == "asyncio":
+        if len(receivers) > 1:
+            print(f"{'main_thread':<20}: The asyncio runtime only reads the first receiver, ignoring {len(receivers) - 1} more.")
+        try:
+            asyncio.run(async_app(gps, config_msg, (server, mountpoint, ntripuser) if gnc else None, save_event))
+        finally:
+            gps.close_serial()
+            print(f"{'main_thread':<20}: NTRIP Client terminated.")
+        return
+
+    # Spool telemetry to disk while the Lighthouse is unreachable
+    InfluxWriter.enable_spool("./shared/influx_spool")
+
     # Add thread for user input handling
     thread_pool.append(
         Thread(
@@ -245,21 +406,23 @@ def app():
         )
     )
     
-    # Start GPS message reading thread
-    ubx_config = UBXConfig(gps.ser)
-    read_thread = Thread(
-        target=read_messages_thread,
-        args=(gps, ubx_config, save_event, stop_event),
-    )
-    read_thread.start()
-    thread_pool.append(read_thread)
+    # Start a GPS message reading thread per receiver and configure it
+    for receiver in receivers:
+        receiver_msg = config_msg if receiver is gps else receiver_config(receiver)
+        receiver_ubx_config, read_thread = start_receiver(receiver, receiver_msg, save_event, stop_event)
+        thread_pool.append(read_thread)
+        if receiver is gps:
+            ubx_config = receiver_ubx_config
 
-    # Configure the receiver with the appropriate settings
-    success, msg = ubx_config.send_config(config_msg)
-    if success:
-        print("\n\nBase station configured successfully.\n\n")
-    else:
-        print(f"\n\nFailed to configure base station: {msg}\n\n")
+    # Receivers plugged in later only report telemetry
+    def on_new_receiver(receiver):
+        receivers.append(receiver)
+        Thread(
+            target=start_receiver,
+            args=(receiver, receiver_config(receiver), save_event, stop_event),
+            daemon=True
+        ).start()
+    GPSReader.watch(on_new_receiver, receivers)
 
     # Start remaining threads/processes
     for t in thread_pool:
@@ -288,7 +451,9 @@ def app():
         for t in thread_pool:
             t.join(timeout=1)
     finally:
-        gps.close_serial()
+        InfluxWriter.close()
+        for receiver in receivers:
+            receiver.close_serial()
         print(f"{'main_thread':<20}: NTRIP Client terminated.")
 
 if __name__ == "__main__":
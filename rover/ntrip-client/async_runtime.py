@@ -0,0 +1,249 @@
+"""
+Building blocks of the rover's optional asyncio runtime.
+
+Everything here runs on a single event loop: the serial port is watched
+with `loop.add_reader()` instead of a blocking reader thread, RTCM3
+corrections are streamed from the caster with asyncio streams and written
+straight to the receiver, and the stopwatch/pause console is read without
+an input thread.
+"""
+
+from base64 import b64encode
+from datetime import datetime
+import asyncio
+import time
+import sys
+import os
+
+from pyubx2 import UBX_PROTOCOL
+try:
+    from common.ubx_framer import UBXFramer
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../common")
+    from ubx_framer import UBXFramer
+
+class SerialReader:
+    """
+    Frames and dispatches UBX messages whenever the serial port becomes
+    readable. The port is switched to non-blocking reads, so each callback
+    only consumes what the OS has already buffered.
+    """
+
+    def __init__(self, ser, dispatcher, on_error=None):
+        """
+        Args:
+            ser (Serial): The serial port connected to the u-blox receiver.
+            dispatcher (UBXDispatcher): Handlers for the parsed message types.
+            on_error (callable): Called once if the port fails, e.g. when the
+                                 receiver is unplugged. `start()` may be
+                                 called again once it is back.
+        """
+        self.ser = ser
+        self.dispatcher = dispatcher
+        self.on_error = on_error
+        self.framer = UBXFramer(ser, protocols=UBX_PROTOCOL)
+        self.loop = None
+        self.fd = None
+        self.frames_read = 0
+        self.read_errors = 0
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.ser.timeout = 0
+        self.fd = self.ser.fileno()
+        self.loop.add_reader(self.fd, self._on_readable)
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.fd)
+            self.loop = None
+
+    def _on_readable(self):
+        try:
+            while (frame := self.framer.read()) is not None:
+                self.frames_read += 1
+                try:
+                    self.dispatcher.dispatch(frame[1])
+                except Exception as e:
+                    print(f"{'serial_reader':<20}: Ignoring unparsable frame: {e}")
+            if not getattr(self.ser, "connected", True):
+                # A `ManagedSerial` closed the port, its descriptor is gone
+                raise ConnectionError("Receiver disconnected")
+        except Exception as e:
+            # A failed port stays readable, so stop watching it rather than spin.
+            self.read_errors += 1
+            print(f"{'serial_reader':<20}: Read error: {e}")
+            self.stop()
+            if self.on_error is not None:
+                self.on_error()
+
+    def get_stats(self) -> dict:
+        """
+        Returns the same serial counters as `SerialPipeline.get_stats()`,
+        without the queue fields since frames are handled as they arrive.
+        """
+        now = time.monotonic()
+        bytes_read = self.framer.bytes_read
+        bytes_per_s = (bytes_read - self.window_bytes) / (now - self.window_start) if now > self.window_start else 0.0
+        self.window_start, self.window_bytes = now, bytes_read
+        return {
+            "serial_frames_read": self.frames_read,
+            "serial_read_errors": self.read_errors,
+            "serial_bytes": bytes_read,
+            "serial_bytes_per_s": float(bytes_per_s),
+            "serial_checksum_errors": self.framer.checksum_errors,
+            "serial_discarded_bytes": self.framer.discarded_bytes,
+        }
+
+class AsyncNTRIPClient:
+    """
+    Streams RTCM3 corrections from an NTRIP caster to the receiver.
+
+    Sends an NTRIP 1.0 request, which both the Polaris caster and public
+    casters accept, and also handles an HTTP/1.1 (optionally chunked)
+    response. The received bytes are written to the serial port unchanged;
+    the receiver does its own RTCM3 framing. Lost connections are retried
+    with exponential backoff.
+    """
+
+    CONNECT_TIMEOUT = 10    # Seconds to connect and receive the response header
+    READ_TIMEOUT = 30       # Seconds without data before the connection is considered dead
+    BACKOFF_MIN = 1
+    BACKOFF_MAX = 60
+
+    def __init__(self, server, mountpoint, user, password, output, port=2101):
+        """
+        Args:
+            server (str): Caster host name or address.
+            mountpoint (str): Mountpoint to request.
+            user (str): NTRIP user name.
+            password (str): NTRIP password.
+            output (Serial): Where the RTCM3 stream is written.
+            port (int): Caster TCP port.
+        """
+        self.server = server
+        self.mountpoint = mountpoint
+        self.credentials = b64encode(f"{user}:{password}".encode()).decode()
+        self.output = output
+        self.port = port
+        self.bytes_received = 0
+        self.reconnects = 0
+
+    async def run(self):
+        """
+        Keeps a connection to the caster open until cancelled.
+        """
+        backoff = self.BACKOFF_MIN
+        while True:
+            received = self.bytes_received
+            try:
+                await self._stream()
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                print(f"{'ntrip_client':<20}: Connection to {self.server}:{self.port}/{self.mountpoint} lost: {e!r}")
+            if self.bytes_received > received:
+                backoff = self.BACKOFF_MIN
+            self.reconnects += 1
+            print(f"{'ntrip_client':<20}: Reconnecting in {backoff} s...")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.BACKOFF_MAX)
+
+    async def _stream(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.server, self.port), self.CONNECT_TIMEOUT)
+        try:
+            writer.write(
+                f"GET /{self.mountpoint} HTTP/1.0\r\nHost: {self.server}\r\nUser-Agent: NTRIP polaris-rover\r\n"
+                f"Authorization: Basic {self.credentials}\r\n\r\n".encode()
+            )
+            await writer.drain()
+            status = await asyncio.wait_for(reader.readline(), self.CONNECT_TIMEOUT)
+            chunked = False
+            if status.startswith(b"HTTP/") and status.split()[1:2] == [b"200"]:
+                while (line := await asyncio.wait_for(reader.readline(), self.CONNECT_TIMEOUT)) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"transfer-encoding" and value.strip().lower() == b"chunked":
+                        chunked = True
+            elif not status.startswith(b"ICY 200"):
+                raise ConnectionError(f"Caster refused the request: {status.decode(errors='replace').strip()}")
+            print(f"{'ntrip_client':<20}: Connected to {self.server}:{self.port}/{self.mountpoint}")
+
+            while True:
+                if chunked:
+                    size = int((await asyncio.wait_for(reader.readline(), self.READ_TIMEOUT)).split(b";")[0], 16)
+                    if size == 0:
+                        raise ConnectionError("Stream ended")
+                    data = await asyncio.wait_for(reader.readexactly(size + 2), self.READ_TIMEOUT)
+                    data = data[:-2]
+                else:
+                    data = await asyncio.wait_for(reader.read(4096), self.READ_TIMEOUT)
+                    if not data:
+                        raise ConnectionError("Caster closed the connection")
+                self.bytes_received += len(data)
+                self.output.write(data)
+        finally:
+            writer.close()
+
+    def get_stats(self) -> dict:
+        return {
+            "ntrip_client_bytes_received": self.bytes_received,
+            "ntrip_client_reconnects": self.reconnects,
+        }
+
+class ConsoleControl:
+    """
+    Event loop version of `input_thread`: 's' starts/stops a stopwatch and
+    Enter pauses/resumes writing positions to InfluxDB.
+    """
+
+    PROMPT = f"{'input_thread':<20}: Press 's' to start/stop stopwatch, Enter to pause/resume Influx writing"
+
+    def __init__(self, save_event):
+        """
+        Args:
+            save_event (Event): An event to control whether data should be written to InfluxDB.
+        """
+        self.save_event = save_event
+        self.state = "idle"
+        self.stopwatch_start = None
+        self.loop = None
+
+    def start(self):
+        if sys.stdin is None or sys.stdin.closed:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(sys.stdin.fileno(), self._on_line)
+        print(self.PROMPT)
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.remove_reader(sys.stdin.fileno())
+            self.loop = None
+
+    def _on_line(self):
+        line = sys.stdin.readline()
+        if not line:
+            # No console attached (e.g. a detached container)
+            self.stop()
+            return
+        line = line.rstrip("\r\n")
+        if self.state == "stopwatch":
+            finish_utc = datetime.now()
+            print(f'Start time: {self.stopwatch_start}')
+            print(f'Finish time: {finish_utc}')
+            print(f'Diff: {(finish_utc - self.stopwatch_start).total_seconds()}')
+            self.state = "idle"
+        elif self.state == "paused":
+            self.save_event.set()
+            self.state = "idle"
+        elif line == 's':
+            self.stopwatch_start = datetime.now()
+            print('Stopwatch started, press Enter to stop...')
+            self.state = "stopwatch"
+            return
+        elif line == '':
+            self.save_event.clear()
+            print('Press Enter to resume writing to influx...')
+            self.state = "paused"
+            return
+        print(self.PROMPT)